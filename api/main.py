@@ -1,19 +1,55 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Body, FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import sqlite3, time
+from fastapi.routing import APIRoute
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+import json, sqlite3, time
 from pathlib import Path
 
+import numpy as np
+import yaml
+
+from src import arrowio, export, metrics, profiling, proximity, rollups, spatial, trackcache, tracks
+
 DB_PATH = Path(__file__).resolve().parents[1] / "tanker.db"
+CFG_PATH = Path(__file__).resolve().parents[1] / "config.yaml"
+
+class ProfiledRoute(APIRoute):
+    """Routes whose handlers get a stack sampler when TRACKER_PROFILE=1 (see src.profiling)."""
+    def __init__(self, path, endpoint, **kwargs):
+        label = f"{','.join(sorted(kwargs.get('methods') or []))} {path}"
+        super().__init__(path, profiling.profiled(endpoint, label), **kwargs)
+
 app = FastAPI(title="Local Meta AIS API", version="0.2.0")
+app.router.route_class = ProfiledRoute
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+metrics.set_process("api")
+
+@app.middleware("http")
+async def _request_metrics(request: Request, call_next):
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # label by route template (/history/{mmsi}), not the raw path, to keep cardinality bounded
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        metrics.inc("tracker_http_requests_total", route=route, method=request.method, status=status)
+        metrics.observe("tracker_http_request_seconds", time.perf_counter() - t0, route=route)
 
 def _con():
     return sqlite3.connect(DB_PATH)
 
 @app.get("/health")
 def health():
-    return {"ok": True, "db_exists": DB_PATH.exists()}
+    cache = trackcache.default_cache()
+    return {"ok": True, "db_exists": DB_PATH.exists(), "track_cache": cache.stats() if cache else None}
+
+@app.get("/metrics")
+def metrics_text():
+    """Prometheus text format, merged over every process that wrote data/metrics recently."""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
 
 @app.get("/location/{mmsi}")
 def location(mmsi: int):
@@ -24,9 +60,253 @@ def location(mmsi: int):
     ts, lat, lon, sog, cog, src = row
     return {"mmsi": mmsi, "timestamp": ts, "latitude": lat, "longitude": lon, "speed": sog, "course": cog, "source": src}
 
-@app.get("/history/{mmsi}")
-def history(mmsi: int, limit: int = 200):
+@app.post("/locations")
+def locations(mmsis: list[int] = Body(...)):
+    """Latest position for many MMSIs in one round trip (body: JSON list of MMSIs)."""
     con = _con(); cur = con.cursor()
-    cur.execute("SELECT ts, lat, lon, sog, cog, source FROM positions WHERE mmsi=? ORDER BY ts DESC LIMIT ?", (mmsi, limit))
+    cur.execute("""
+        SELECT p.mmsi, p.ts, p.lat, p.lon, p.sog, p.cog, p.source
+          FROM json_each(?) j
+          JOIN positions p ON p.mmsi = j.value
+                          AND p.ts = (SELECT MAX(ts) FROM positions WHERE mmsi = j.value)
+    """, (json.dumps(mmsis),))
     rows = cur.fetchall(); con.close()
-    return [{"ts": r[0], "lat": r[1], "lon": r[2], "sog": r[3], "cog": r[4], "source": r[5]} for r in rows]
+    out = {}
+    for mmsi, ts, lat, lon, sog, cog, src in rows:
+        out.setdefault(mmsi, {"mmsi": mmsi, "timestamp": ts, "latitude": lat, "longitude": lon,
+                              "speed": sog, "course": cog, "source": src})
+    return list(out.values())
+
+HISTORY_SQL = "SELECT ts, lat, lon, sog, cog, source FROM positions WHERE mmsi=? ORDER BY ts DESC LIMIT ?"
+HISTORY_FIELDS = [("ts", "int"), ("lat", "float"), ("lon", "float"), ("sog", "float"), ("cog", "float"), ("source", "str")]
+
+def _arrow_response(sql, args, fields):
+    """Stream a query as Arrow IPC record batches; the connection lives as long as the response."""
+    def gen():
+        # Starlette iterates sync generators from a thread pool, so the connection may hop threads
+        con = sqlite3.connect(DB_PATH, check_same_thread=False)
+        try:
+            yield from arrowio.stream_cursor(con.execute(sql, args), arrowio.schema(fields))
+        finally:
+            con.close()
+    return StreamingResponse(gen(), media_type=arrowio.ARROW_STREAM)
+
+HISTORY_RANGE_SQL = "SELECT ts, lat, lon, sog, cog, source FROM positions WHERE mmsi=? AND ts BETWEEN ? AND ? ORDER BY ts"
+HISTORY_DEFAULT_RANGE_S = 7 * 86400
+HISTORY_MAX_POINTS = 2000
+
+def _history_rows(sql, args):
+    con = _con()
+    try:
+        return con.execute(sql, args).fetchall()
+    finally:
+        con.close()
+
+def _cached_newest(mmsi, limit):
+    """The newest `limit` fixes from the track cache, or None when it does not hold them."""
+    cache = trackcache.default_cache()
+    return cache.newest(mmsi, limit, lambda n: _history_rows(HISTORY_SQL, (mmsi, n))) if cache else None
+
+def _history_range(mmsi, start, end, resolution, max_points):
+    """Fixes between start and end, downsampled (src.tracks.downsample), newest first; plus the raw count."""
+    end = end if end is not None else int(time.time())
+    start = start if start is not None else end - HISTORY_DEFAULT_RANGE_S
+    cache = trackcache.default_cache()
+    rows = cache.between(mmsi, start, end, lambda n: _history_rows(HISTORY_SQL, (mmsi, n))) if cache else None
+    if rows is None:
+        rows = _history_rows(HISTORY_RANGE_SQL, (mmsi, start, end))
+    if not rows:
+        return [], 0
+    n = len(rows)
+    ts = np.fromiter((r[0] for r in rows), dtype=np.int64, count=n)
+    lat = np.fromiter((np.nan if r[1] is None else r[1] for r in rows), dtype=np.float64, count=n)
+    lon = np.fromiter((np.nan if r[2] is None else r[2] for r in rows), dtype=np.float64, count=n)
+    idx = tracks.downsample(ts, lat, lon, resolution=resolution, max_points=max_points or HISTORY_MAX_POINTS)
+    return [rows[i] for i in idx[::-1].tolist()], n
+
+@app.get("/history/{mmsi}")
+def history(mmsi: int, limit: int = 200, start: int | None = None, end: int | None = None,
+            resolution: int | None = Query(None, ge=1), max_points: int | None = Query(None, ge=3, le=100000),
+            accept: str | None = Header(None)):
+    """
+    Newest-first fixes; send Accept: application/vnd.apache.arrow.stream for an Arrow stream.
+    Without start/end/resolution/max_points: the newest `limit` raw rows. With any of them:
+    the range start..end (default: the last 7 days), thinned to one fix per `resolution`
+    seconds and then to at most max_points (default 2000) shape-preserving points.
+    X-Points-Total / X-Points-Returned report the reduction. Recent fixes come from the
+    in-process track cache (src.trackcache) when it covers the request.
+    """
+    if start is None and end is None and resolution is None and max_points is None:
+        rows = _cached_newest(mmsi, limit)
+        if arrowio.wants_arrow(accept):
+            if rows is None:
+                return _arrow_response(HISTORY_SQL, (mmsi, limit), HISTORY_FIELDS)
+            return StreamingResponse(arrowio.stream_rows(rows, arrowio.schema(HISTORY_FIELDS)),
+                                     media_type=arrowio.ARROW_STREAM)
+        if rows is None:
+            rows = _history_rows(HISTORY_SQL, (mmsi, limit))
+        return [{"ts": r[0], "lat": r[1], "lon": r[2], "sog": r[3], "cog": r[4], "source": r[5]} for r in rows]
+    rows, total = _history_range(mmsi, start, end, resolution, max_points)
+    headers = {"X-Points-Total": str(total), "X-Points-Returned": str(len(rows))}
+    if arrowio.wants_arrow(accept):
+        return StreamingResponse(arrowio.stream_rows(rows, arrowio.schema(HISTORY_FIELDS)),
+                                 media_type=arrowio.ARROW_STREAM, headers=headers)
+    return JSONResponse([{"ts": r[0], "lat": r[1], "lon": r[2], "sog": r[3], "cog": r[4], "source": r[5]} for r in rows],
+                        headers=headers)
+
+def _latest_dicts(rows):
+    return [dict(zip(spatial.LATEST_COLS, r)) for r in rows]
+
+@app.get("/area/bbox")
+def area_bbox(lat_min: float, lat_max: float, lon_min: float, lon_max: float, since: int | None = None):
+    """Latest fix of every vessel in the box (lon_min > lon_max crosses the antimeridian)."""
+    con = _con()
+    try:
+        rows = spatial.latest_in_bbox(con, lat_min, lat_max, lon_min, lon_max, since=since)
+    finally:
+        con.close()
+    return _latest_dicts(rows)
+
+@app.get("/area/radius")
+def area_radius(lat: float, lon: float, km: float, since: int | None = None):
+    con = _con()
+    try:
+        rows = spatial.latest_in_radius(con, lat, lon, km, since=since)
+    finally:
+        con.close()
+    return _latest_dicts(rows)
+
+@app.get("/area/tracks")
+def area_tracks(lat_min: float, lat_max: float, lon_min: float, lon_max: float,
+                start: int | None = None, end: int | None = None):
+    """Fixes inside the box between start and end (default: last 24h)."""
+    if end is None:
+        end = int(time.time())
+    if start is None:
+        start = end - 86400
+    con = _con()
+    try:
+        rows = spatial.track_points_in_bbox(con, lat_min, lat_max, lon_min, lon_max, start, end)
+    finally:
+        con.close()
+    return [{"mmsi": r[0], "ts": r[1], "lat": r[2], "lon": r[3], "sog": r[4], "cog": r[5], "source": r[6]} for r in rows]
+
+@app.get("/proximity")
+def proximity_pairs(min_minutes: float = 0, mmsi: int | None = None):
+    """Open ship-to-ship proximity episodes (see scripts/run_proximity.py), longest first."""
+    con = _con()
+    try:
+        rows = proximity.active_pairs(con, min_minutes=min_minutes, mmsi=mmsi)
+    except sqlite3.OperationalError:
+        rows = []  # no scan has run against this database yet
+    finally:
+        con.close()
+    return [{"mmsi_a": a, "mmsi_b": b, "first_seen": first, "last_seen": last,
+             "minutes": round((last - first) / 60, 1), "dist_m": round(d, 1), "min_dist_m": round(md, 1),
+             "lat": lat, "lon": lon, "alerted": bool(alerted)}
+            for a, b, first, last, d, md, lat, lon, alerted in rows]
+
+@app.get("/gaps")
+def ais_gaps(open_only: bool = True, since: int | None = None, mmsi: int | None = None, limit: int = 500):
+    """AIS gaps from scripts/run_gaps.py: open ones (vessel still dark) or all since `since`."""
+    sql = "SELECT mmsi, start_ts, start_lat, start_lon, end_ts, end_lat, end_lon, threshold_s FROM ais_gaps WHERE 1=1"
+    args = []
+    if open_only:
+        sql += " AND end_ts IS NULL"
+    if since is not None:
+        sql += " AND start_ts >= ?"; args.append(since)
+    if mmsi is not None:
+        sql += " AND mmsi = ?"; args.append(mmsi)
+    con = _con()
+    try:
+        rows = con.execute(sql + " ORDER BY start_ts DESC LIMIT ?", (*args, limit)).fetchall()
+    except sqlite3.OperationalError:
+        rows = []  # gap detection has not run against this database yet
+    finally:
+        con.close()
+    keys = ("mmsi", "start_ts", "start_lat", "start_lon", "end_ts", "end_lat", "end_lon", "threshold_s")
+    return [dict(zip(keys, r)) for r in rows]
+
+def _area(region, lat_min, lat_max, lon_min, lon_max):
+    """bbox of a config.yaml region name (404 if unknown) or of the four bounds; None for neither."""
+    if region is not None:
+        regions = (yaml.safe_load(open(CFG_PATH, "r", encoding="utf-8")) or {}).get("regions") or {}
+        if region not in regions:
+            raise HTTPException(404, f"Unknown region {region!r}")
+        return regions[region]
+    if None not in (lat_min, lat_max, lon_min, lon_max):
+        return (lat_min, lat_max, lon_min, lon_max)
+    return None
+
+@app.get("/rollups")
+def rollup_series(res: str = "h", start: int | None = None, end: int | None = None, region: str | None = None,
+                  lat_min: float | None = None, lat_max: float | None = None,
+                  lon_min: float | None = None, lon_max: float | None = None,
+                  vclass: str | None = None, source: str | None = None, by: str = "class"):
+    """
+    Pre-aggregated series (src.rollups): per hourly ('h') or daily ('d') bucket and `by`
+    keys (comma list of class, source): fixes, mean_sog, distinct vessels. Area: a
+    config.yaml region name or a bbox; default start: 7 days back.
+    """
+    if res not in rollups.RESOLUTIONS:
+        raise HTTPException(400, f"res must be one of {sorted(rollups.RESOLUTIONS)}")
+    bbox = _area(region, lat_min, lat_max, lon_min, lon_max)
+    end = end or int(time.time())
+    start = start if start is not None else end - 7 * 86400
+    con = _con()
+    try:
+        return rollups.query(con, res, start, end, bbox=bbox, vclass=vclass, source=source,
+                             by=[k.strip() for k in by.split(",") if k.strip()])
+    except sqlite3.OperationalError:
+        return []  # database predates rollups; run scripts/build_rollups.py --rebuild
+    finally:
+        con.close()
+
+def _int_list(text, name):
+    if text is None:
+        return None
+    try:
+        return [int(v) for v in text.split(",") if v.strip()]
+    except ValueError:
+        raise HTTPException(400, f"{name} must be a comma list of integers")
+
+def _export_response(kind, open_cursor, fmt, compression):
+    """Stream open_cursor(con) as an export file; the connection lives as long as the response."""
+    try:
+        export.check(fmt, compression)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    def gen():
+        con = sqlite3.connect(DB_PATH, check_same_thread=False)
+        try:
+            cur, fields = open_cursor(con)
+            yield from export.stream(cur, fields, fmt, compression)
+        finally:
+            con.close()
+    headers = {"Content-Disposition": f'attachment; filename="{export.filename(kind, fmt, compression)}"'}
+    return StreamingResponse(gen(), media_type=export.media_type(fmt, compression), headers=headers)
+
+@app.get("/export/positions")
+def export_positions(fmt: str = Query("csv", alias="format"), compression: str | None = None,
+                     start: int | None = None, end: int | None = None, mmsi: str | None = None,
+                     region: str | None = None, lat_min: float | None = None, lat_max: float | None = None,
+                     lon_min: float | None = None, lon_max: float | None = None):
+    """
+    Every fix in start..end (default: all), optionally for `mmsi` (comma list) and an area
+    (config.yaml region or bbox), as csv, ndjson or parquet; compression gzip or zstd.
+    Streamed in (mmsi, ts) order with flat memory (src.export).
+    """
+    mmsis = _int_list(mmsi, "mmsi")
+    bbox = _area(region, lat_min, lat_max, lon_min, lon_max)
+    return _export_response("positions", lambda con: export.positions_cursor(con, start, end, mmsis, bbox),
+                            fmt, compression)
+
+@app.get("/export/alerts")
+def export_alerts(fmt: str = Query("csv", alias="format"), compression: str | None = None,
+                  start: int | None = None, end: int | None = None, mmsi: str | None = None,
+                  kind: str | None = None):
+    """Alerts in start..end, optionally for `mmsi` and `kind` (comma lists), in id order."""
+    mmsis = _int_list(mmsi, "mmsi")
+    kinds = [k.strip() for k in kind.split(",") if k.strip()] if kind else None
+    return _export_response("alerts", lambda con: export.alerts_cursor(con, start, end, mmsis, kinds),
+                            fmt, compression)
@@ -1,18 +1,18 @@
-import pandas as pd, sqlite3, time, glob, os
-from pathlib import Path
-from src.db import ensure_tables
-
-DB_PATH = Path(__file__).resolve().parents[1] / "tanker.db"
+import pandas as pd, time, glob, os
+from src import metrics
+from src.db import POSITION_COLS
+from src.ingest.writer_client import get_client
 
 def ingest_folder(folder="data/us_ais"):
     paths = glob.glob(os.path.join(folder, "*.csv"))
     if not paths:
         print("[us_mc] no CSVs in", folder); return
-    con = sqlite3.connect(DB_PATH); ensure_tables(con)
+    writer = get_client("us_csv")
     for p in paths:
         try:
             print("[us_mc] ingesting", p)
             df = pd.read_csv(p)
+            metrics.inc("tracker_messages_received_total", len(df), source="us_csv")
             rename = {"MMSI":"mmsi","LAT":"lat","LON":"lon","BaseDateTime":"ts","SOG":"sog","COG":"cog"}
             df = df.rename(columns={k:v for k,v in rename.items() if k in df.columns})
             if "ts" in df.columns:
@@ -27,7 +27,11 @@ def ingest_folder(folder="data/us_ais"):
                 if k not in df.columns: df[k] = None
             out = df[keep].copy()
             out["heading"]=None; out["draught"]=None; out["nav_status"]=None; out["source"]="us_csv"
-            out.to_sql("positions", con, if_exists="append", index=False)
+            out = out.dropna(subset=["mmsi","lat","lon"]).sort_values(["mmsi","ts"])
+            out = out.astype(object).where(out.notna(), None)
+            n = writer.write_positions(list(out[list(POSITION_COLS)].itertuples(index=False, name=None)))
+            print("[us_mc] stored", n, "of", len(out), "rows")
         except Exception as e:
             print("[us_mc] failed", p, e)
-    con.close(); print("[us_mc] done")
+            metrics.inc("tracker_fetch_errors_total", source="us_csv")
+    print("[us_mc] done;", writer.sent, "rows via the writer service,", writer.direct, "written directly")
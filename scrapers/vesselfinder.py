@@ -1,25 +1,21 @@
-import time, sqlite3
+import time
 from pathlib import Path
 import requests
 from bs4 import BeautifulSoup
 import yaml
-from src.db import ensure_tables
+from src import metrics
+from src.ingest.writer_client import get_client
 
-DB_PATH = Path(__file__).resolve().parents[1] / "tanker.db"
 CFG_PATH = Path(__file__).resolve().parents[1] / "config.yaml"
 
 def _cfg():
     return yaml.safe_load(open(CFG_PATH, "r", encoding="utf-8"))
 
 def _insert(mmsi, lat, lon):
-    con = sqlite3.connect(DB_PATH)
-    ensure_tables(con)
-    con.execute("INSERT OR IGNORE INTO ships(mmsi, ship_type) VALUES(?,?)", (mmsi, "Tanker"))
-    con.execute("""INSERT OR IGNORE INTO positions
-        (mmsi, ts, lat, lon, sog, cog, heading, draught, nav_status, source)
-        VALUES (?,?,?,?,?,?,?,?,?,?)""",
-        (mmsi, int(time.time()), float(lat), float(lon), None, None, None, None, None, "vesselfinder"))
-    con.commit(); con.close()
+    # the page has no report time, so an unmoved vessel is only re-stored on the filter's heartbeat
+    metrics.inc("tracker_messages_received_total", source="vesselfinder")
+    get_client("vesselfinder").write_positions([(mmsi, int(time.time()), float(lat), float(lon), None, None, None, None, None, "vesselfinder")],
+        ships=[(mmsi, "Tanker", None)])
 
 def scrape_ship(mmsi: int):
     url = f"https://www.vesselfinder.com/vessels?mmsi={mmsi}"
@@ -27,6 +23,7 @@ def scrape_ship(mmsi: int):
         r = requests.get(url, timeout=20, headers={"User-Agent": "Mozilla/5.0"})
         if r.status_code != 200:
             print(f"[vesselfinder] {mmsi} HTTP {r.status_code}")
+            metrics.inc("tracker_fetch_errors_total", source="vesselfinder")
             return False
         soup = BeautifulSoup(r.text, "lxml")
         # Attempt 1: map_canvas data attributes
@@ -42,9 +39,11 @@ def scrape_ship(mmsi: int):
             _insert(mmsi, mlat["content"], mlon["content"]); print(f"[vesselfinder] {mmsi} -> {mlat['content']},{mlon['content']}")
             return True
         print(f"[vesselfinder] {mmsi} no coords found")
+        metrics.inc("tracker_fetch_errors_total", source="vesselfinder")
         return False
     except Exception as e:
         print(f"[vesselfinder] {mmsi} error {e}")
+        metrics.inc("tracker_fetch_errors_total", source="vesselfinder")
         return False
 
 def run_loop():
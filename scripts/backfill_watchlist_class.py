@@ -3,25 +3,9 @@ import sqlite3
 from pathlib import Path
 import pandas as pd
 
-DB = Path(__file__).resolve().parents[1] / "tanker.db"
+from src.classify import classify_series
 
-def classify(val):
-    # Accept string categories or AIS numeric codes
-    if isinstance(val, str):
-        s = val.strip().lower()
-        if "tanker" in s: return "Tanker"
-        if "cargo" in s:  return "Cargo"
-        # handle some common variants
-        if "lng" in s or "lpg" in s or "oil" in s: return "Tanker"
-        if "container" in s or "bulk" in s: return "Cargo"
-        return None
-    try:
-        t = int(val)
-        if 80 <= t <= 89: return "Tanker"
-        if 70 <= t <= 79: return "Cargo"
-    except Exception:
-        pass
-    return None
+DB = Path(__file__).resolve().parents[1] / "tanker.db"
 
 def main():
     con = sqlite3.connect(DB)
@@ -35,22 +19,20 @@ def main():
         return
 
     ships["mmsi"] = pd.to_numeric(ships["mmsi"], errors="coerce").astype("Int64")
-    ships["class_guess"] = ships["ship_type"].apply(classify)
+    ships["class_guess"] = classify_series(ships["ship_type"])
 
-    updates = ships.dropna(subset=["mmsi","class_guess"]).values.tolist()
-    if not updates:
+    guesses = ships.dropna(subset=["mmsi","class_guess"])
+    if guesses.empty:
         print("[backfill] no class guesses were produced (ship_type missing or unrecognized).")
         return
 
-    # Update only rows with NULL class in watchlist
+    # Update only rows with NULL class in watchlist (one statement, one transaction)
     cur = con.cursor()
-    n = 0
-    for mmsi, ship_type, cls in updates:
-        cur.execute(
-            "UPDATE watchlist SET class = COALESCE(class, ?) WHERE mmsi = ?",
-            (cls, int(mmsi))
-        )
-        n += cur.rowcount
+    cur.executemany(
+        "UPDATE watchlist SET class = ? WHERE mmsi = ? AND class IS NULL",
+        zip(guesses["class_guess"].tolist(), guesses["mmsi"].astype(int).tolist())
+    )
+    n = cur.rowcount
     con.commit()
 
     # show summary
@@ -0,0 +1,102 @@
+# scripts/bench_backend.py
+"""
+The dashboard's window-wide queries (src/backend.py) on each query engine: positions in
+the window, latest fix per MMSI, alert deltas and a rollup series. Runs on a synthetic
+database, or on a copy of a real one with --db. Engines that cannot run (duckdb not
+installed, sqlite extension unavailable) are reported and skipped.
+"""
+import argparse, json, os, shutil, sqlite3, tempfile, time
+
+import numpy as np
+
+from src import backend, db, rollups
+
+WINDOWS = {"12h": 12 * 3600, "3d": 3 * 86400, "all": None}
+
+
+def synth(path, vessels, points, seed=5):
+    """`points` fixes per vessel, one a minute up to now, written straight to the compact layout."""
+    rnd = np.random.default_rng(seed)
+    con = sqlite3.connect(path)
+    rollups.register(con)
+    con.executescript(db.SCHEMA)
+    now = int(time.time())
+    t0 = now - points * 60
+    mmsi = np.repeat(200000000 + np.arange(vessels), points)
+    ts = np.tile(t0 + np.arange(points) * 60, vessels)
+    lat = np.repeat(rnd.uniform(-60, 60, vessels), points) + rnd.normal(0, 0.001, len(ts)).cumsum() % 1
+    lon = np.repeat(rnd.uniform(-180, 179, vessels), points) + rnd.normal(0, 0.001, len(ts)).cumsum() % 1
+    sog = rnd.uniform(0, 18, len(ts)).round(1)
+    cog = rnd.uniform(0, 359.9, len(ts)).round(1)
+    src = rnd.choice(["aisstream", "position_api", "us_csv"], len(ts))
+    con.executemany("INSERT OR IGNORE INTO ships(mmsi, ship_type) VALUES (?,?)",
+                    [(200000000 + v, str(rnd.choice([70, 80, 60]))) for v in range(vessels)])
+    for i in range(0, len(ts), 200000):
+        s = slice(i, i + 200000)
+        rows = list(zip(mmsi[s].tolist(), ts[s].tolist(), lat[s].tolist(), lon[s].tolist(), sog[s].tolist(),
+                        cog[s].tolist(), [None] * len(ts[s]), [None] * len(ts[s]), [0] * len(ts[s]), src[s].tolist()))
+        con.executemany(f"INSERT OR IGNORE INTO positions_c({', '.join(db.COMPACT_COLS)}) VALUES "
+                        f"({','.join('?' * len(db.COMPACT_COLS))})", db.compact_rows(con, rows))
+        rollups.update(con, rows)
+    con.commit()
+    con.close()
+    return len(ts)
+
+
+def run(engine, path, repeat, threads=None):
+    b = backend.get_backend(engine, path=path, threads=threads)
+    if b.name != engine:
+        return None
+    now = int(time.time())
+    queries = {f"{name} {w}": (lambda f=getattr(b, name), s=(now - sec if sec else None): f(s))
+               for w, sec in WINDOWS.items() for name in ("window", "latest", "deltas")}
+    queries["rollups h 7d"] = lambda: b.rollups("h", now - 7 * 86400, now)
+    queries["rollups d all"] = lambda: b.rollups("d", None, now, by=("class", "source"))
+    out = {}
+    for label, q in queries.items():
+        times, n = [], 0
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            n = len(q())
+            times.append(time.perf_counter() - t0)
+        out[label] = {"ms": 1000 * float(np.median(times)), "rows": n}
+    return out
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--vessels", type=int, default=2000)
+    ap.add_argument("--points", type=int, default=500, help="Fixes per vessel (one a minute)")
+    ap.add_argument("--db", default=None, help="Bench a copy of this database instead of synthetic data")
+    ap.add_argument("--engines", default="sqlite,duckdb")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--threads", type=int, default=None, help="duckdb threads (default: backend.threads)")
+    ap.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = ap.parse_args()
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, "bench.db")
+    try:
+        if args.db:
+            shutil.copy(args.db, path)
+            n = sqlite3.connect(path).execute("SELECT COUNT(*) FROM positions").fetchone()[0]
+        else:
+            t0 = time.time()
+            n = synth(path, args.vessels, args.points)
+            if not args.json:
+                print(f"[bench] {n} positions, {args.vessels} vessels (built in {time.time()-t0:.1f}s)")
+        res = {e: run(e, path, args.repeat, args.threads) for e in args.engines.split(",")}
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    if args.json:
+        print(json.dumps({"positions": n, "engines": res}, indent=2))
+        raise SystemExit(0)
+    ran = {e: r for e, r in res.items() if r}
+    for e in res:
+        if not res[e]:
+            print(f"[bench] {e}: not available here, skipped")
+    base = ran.get("sqlite")
+    for label in next(iter(ran.values()), {}):
+        cells = "  ".join(f"{e} {r[label]['ms']:9.1f} ms" for e, r in ran.items())
+        speed = "".join(f"  {e}/sqlite {base[label]['ms'] / r[label]['ms']:5.1f}x"
+                        for e, r in ran.items() if base and e != "sqlite")
+        print(f"[bench] {label:14s} {next(iter(ran.values()))[label]['rows']:9d} rows  {cells}{speed}")
@@ -0,0 +1,86 @@
+# scripts/bench_geofence.py
+"""
+Geofence throughput: N random polygons, a batch of fixes clustered around them.
+Times the grid lookup alone and the full engine (state + alerts into a scratch DB),
+and checks the lookup against brute-force point-in-polygon on a sample.
+"""
+import argparse, math, random, sqlite3, time
+
+import numpy as np
+
+from src import geofence
+from src.db import SCHEMA
+
+
+def synth_fences(n, seed=3):
+    rnd = random.Random(seed)
+    fences = []
+    for i in range(n):
+        clat, clon = rnd.uniform(-50, 60), rnd.uniform(-170, 170)
+        k, r = rnd.randint(8, 40), rnd.uniform(0.05, 0.6)
+        ring = []
+        for j in range(k):  # star-shaped, so simple
+            a = 2 * math.pi * j / k
+            rr = r * rnd.uniform(0.4, 1.0)
+            ring.append([clon + rr * math.cos(a) / max(0.2, math.cos(math.radians(clat))), clat + rr * math.sin(a)])
+        fences.append(geofence.Fence(f"fence {i}", [ring], dwell_s=3600))
+    return fences
+
+
+def synth_points(fences, n, seed=4):
+    rnd = np.random.default_rng(seed)
+    centres = np.array([f.rings[0][:-1].mean(axis=0) for f in fences])
+    pick = rnd.integers(0, len(fences), n)
+    lon = centres[pick, 0] + rnd.normal(0, 0.4, n)
+    lat = np.clip(centres[pick, 1] + rnd.normal(0, 0.4, n), -89.9, 89.9)
+    return lat, lon
+
+
+def brute(fences, lat, lon):
+    out = set()
+    for fi, f in enumerate(fences):
+        ins = geofence._inside(lon, lat, f.edges())
+        out.update((int(p), fi) for p in np.nonzero(ins)[0])
+    return out
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--fences", type=int, default=1000)
+    ap.add_argument("--points", type=int, default=50000)
+    ap.add_argument("--cell-deg", type=float, default=0.25)
+    ap.add_argument("--check", type=int, default=5000, help="Points verified against brute force")
+    args = ap.parse_args()
+
+    fences = synth_fences(args.fences)
+    t0 = time.perf_counter()
+    engine = geofence.GeofenceEngine(fences, args.cell_deg)
+    print(f"[bench] index: {args.fences} fences, {len(engine.index.cells)} cells, "
+          f"{len(engine.index.edges)} boundary edges, built in {time.perf_counter() - t0:.2f}s")
+
+    lat, lon = synth_points(fences, args.points)
+    engine.index.hits(lat[:1000], lon[:1000])  # warm-up
+    t0 = time.perf_counter()
+    pi, fi = engine.index.hits(lat, lon)
+    dt = time.perf_counter() - t0
+    print(f"[bench] lookup: {args.points} fixes in {dt * 1000:.1f} ms = {args.points / dt:,.0f} fixes/s "
+          f"({len(pi)} inside)")
+
+    n = min(args.check, args.points)
+    got = {(int(p), int(f)) for p, f in zip(pi, fi) if p < n}
+    want = brute(fences, lat[:n], lon[:n])
+    print(f"[bench] check: {len(want)} memberships in first {n} fixes, "
+          f"{len(got ^ want)} mismatches")
+
+    con = sqlite3.connect(":memory:")
+    con.executescript(SCHEMA)
+    t_base = int(time.time()) - 86400
+    mmsi = np.random.default_rng(5).integers(200000000, 200000000 + args.points // 10, args.points)
+    rows = [(int(m), t_base + i // 10, float(a), float(o), None, None, None, None, None, "bench")
+            for i, (m, a, o) in enumerate(zip(mmsi, lat, lon))]
+    t0 = time.perf_counter()
+    events = engine.evaluate(con, rows)
+    con.commit()
+    dt = time.perf_counter() - t0
+    print(f"[bench] engine: {len(rows)} fixes in {dt * 1000:.1f} ms = {len(rows) / dt:,.0f} fixes/s, "
+          f"{len(events)} events {dict(engine.events)}")
@@ -0,0 +1,68 @@
+# scripts/bench_history_formats.py
+"""
+Bytes on the wire and server CPU per 100k rows for /history as JSON vs Arrow IPC.
+Runs against a throwaway database filled with one synthetic track.
+"""
+import argparse, os, random, sqlite3, tempfile, time
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+import api.main as api
+from src import arrowio
+from src.db import SCHEMA
+
+
+def fill(path, n, mmsi):
+    con = sqlite3.connect(path)
+    con.executescript(SCHEMA)
+    t0, lat, lon = int(time.time()) - n * 30, 25.0, 55.0
+    rows = []
+    for i in range(n):
+        lat += random.uniform(-0.001, 0.001); lon += random.uniform(-0.001, 0.001)
+        rows.append((mmsi, t0 + i * 30, lat, lon, round(random.uniform(0, 15), 1),
+                     round(random.uniform(0, 360), 1), None, None, "0", "aisstream"))
+    con.executemany("INSERT INTO positions(mmsi, ts, lat, lon, sog, cog, heading, draught, nav_status, source)"
+                    " VALUES (?,?,?,?,?,?,?,?,?,?)", rows)
+    con.commit(); con.close()
+
+
+def measure(client, url, headers, repeat):
+    best_cpu, size = None, 0
+    for _ in range(repeat):
+        c0 = time.process_time()
+        r = client.get(url, headers=headers)
+        cpu = time.process_time() - c0
+        r.raise_for_status()
+        size = len(r.content)
+        best_cpu = cpu if best_cpu is None else min(best_cpu, cpu)
+    return size, best_cpu
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=100_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+    if not arrowio.available():
+        print("[bench] pyarrow is not installed; nothing to compare"); raise SystemExit(1)
+
+    mmsi = 999000001
+    fd, path = tempfile.mkstemp(suffix=".db"); os.close(fd)
+    try:
+        fill(path, args.rows, mmsi)
+        api.DB_PATH = Path(path)
+        client = TestClient(api.app)
+        url = f"/history/{mmsi}?limit={args.rows}"
+        per = 100_000 / args.rows
+        results = {
+            "json": measure(client, url, {"Accept": "application/json"}, args.repeat),
+            "arrow": measure(client, url, {"Accept": arrowio.ARROW_STREAM}, args.repeat),
+        }
+        print(f"[bench] {args.rows} rows, best of {args.repeat}, scaled to 100k rows")
+        for fmt, (size, cpu) in results.items():
+            print(f"[bench] {fmt:5s} {size * per / 1e6:7.2f} MB  {cpu * per * 1000:7.0f} ms CPU")
+        (js, jc), (ars, arc) = results["json"], results["arrow"]
+        print(f"[bench] arrow/json: {ars / js:.2f}x bytes, {arc / jc:.2f}x CPU")
+    finally:
+        os.remove(path)
@@ -0,0 +1,78 @@
+# scripts/bench_positions_layout.py
+"""
+Original vs compact positions layout on the same synthetic data: bytes per row
+(table + its indexes, from dbstat), insert rate through write_positions, and
+per-vessel range-scan speed through the `positions` name readers use.
+"""
+import argparse, os, random, sqlite3, tempfile, time
+
+from src import db
+
+LAYOUT_TABLES = {
+    "legacy": ("positions", "idx_positions_mmsi_ts", "sqlite_autoindex_positions_1"),
+    "compact": ("positions_c", "sources"),
+}
+
+
+def synth(vessels, points, seed=7):
+    rnd = random.Random(seed)
+    t0 = int(time.time()) - points * 60
+    rows = []
+    for v in range(vessels):
+        mmsi = 200000000 + v
+        lat, lon = rnd.uniform(-60, 60), rnd.uniform(-180, 180)
+        for i in range(points):
+            lat += rnd.uniform(-0.01, 0.01); lon += rnd.uniform(-0.01, 0.01)
+            rows.append((mmsi, t0 + i * 60, round(lat, 6), round(lon, 6), round(rnd.uniform(0, 20), 1),
+                         round(rnd.uniform(0, 359.9), 1), float(rnd.randint(0, 359)), None, rnd.randint(0, 8),
+                         rnd.choice(("aisstream", "position_api", "us_csv"))))
+    rows.sort(key=lambda r: r[1])  # arrival order: interleaved vessels, like a live feed
+    return rows
+
+
+def run(layout, rows, batch, scans):
+    fd, path = tempfile.mkstemp(suffix=".db"); os.close(fd)
+    try:
+        con = sqlite3.connect(path)
+        con.executescript(db.LEGACY_SCHEMA if layout == "legacy" else db.SCHEMA)
+        t0 = time.perf_counter()
+        for i in range(0, len(rows), batch):
+            db.write_positions(con, rows[i:i + batch], dedupe=False)
+        insert_s = time.perf_counter() - t0
+        con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        names = LAYOUT_TABLES[layout]
+        size = con.execute(f"SELECT SUM(pgsize) FROM dbstat WHERE name IN ({','.join('?' * len(names))})",
+                           names).fetchone()[0]
+        mmsis = [m for (m,) in con.execute("SELECT DISTINCT mmsi FROM latest_positions")]
+        rnd = random.Random(1)
+        t0, got = time.perf_counter(), 0
+        for _ in range(scans):
+            m = rnd.choice(mmsis)
+            got += len(con.execute("SELECT ts, lat, lon, sog, cog, source FROM positions "
+                                   "WHERE mmsi = ? ORDER BY ts", (m,)).fetchall())
+        scan_s = time.perf_counter() - t0
+        con.close()
+        return {"bytes_per_row": size / len(rows), "insert_rows_s": len(rows) / insert_s,
+                "scan_rows_s": got / scan_s, "scan_ms": 1000 * scan_s / scans}
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--vessels", type=int, default=500)
+    ap.add_argument("--points", type=int, default=400, help="Fixes per vessel")
+    ap.add_argument("--batch", type=int, default=500, help="Rows per write_positions call")
+    ap.add_argument("--scans", type=int, default=300, help="Per-vessel range scans")
+    args = ap.parse_args()
+    rows = synth(args.vessels, args.points)
+    print(f"[bench] {len(rows)} rows, {args.vessels} vessels, batches of {args.batch}")
+    res = {layout: run(layout, rows, args.batch, args.scans) for layout in ("legacy", "compact")}
+    for layout, r in res.items():
+        print(f"[bench] {layout:7s} {r['bytes_per_row']:6.1f} B/row  {r['insert_rows_s']:9.0f} rows/s insert  "
+              f"{r['scan_rows_s']:10.0f} rows/s scan ({r['scan_ms']:.2f} ms/vessel)")
+    a, b = res["legacy"], res["compact"]
+    print(f"[bench] compact/legacy: {b['bytes_per_row'] / a['bytes_per_row']:.2f}x size, "
+          f"{b['insert_rows_s'] / a['insert_rows_s']:.2f}x insert, {b['scan_rows_s'] / a['scan_rows_s']:.2f}x scan")
@@ -0,0 +1,54 @@
+# scripts/bench_proximity.py
+"""
+Proximity pair search on a synthetic fleet: spatial hashing (src.proximity.close_pairs)
+vs brute force on a subset, plus the full-fleet timing the scanner needs.
+"""
+import argparse, time
+
+import numpy as np
+
+from src.proximity import close_pairs, EARTH_M
+
+
+def synth(n, hubs=300, seed=11):
+    """Fleet clustered around anchorages/ports, with a uniform open-sea share."""
+    rnd = np.random.default_rng(seed)
+    hub_lat, hub_lon = rnd.uniform(-50, 60, hubs), rnd.uniform(-179, 179, hubs)
+    k = int(n * 0.7)
+    h = rnd.integers(0, hubs, k)
+    lat = np.concatenate([hub_lat[h] + rnd.normal(0, 0.05, k), rnd.uniform(-60, 70, n - k)])
+    lon = np.concatenate([hub_lon[h] + rnd.normal(0, 0.05, k), rnd.uniform(-180, 180, n - k)])
+    return np.clip(lat, -89.9, 89.9), (lon + 180) % 360 - 180
+
+
+def brute(lat, lon, max_m):
+    la, lo = np.radians(lat), np.radians(lon)
+    out = set()
+    for i in range(len(lat)):
+        dl, dn = la[i + 1:] - la[i], lo[i + 1:] - lo[i]
+        a = np.sin(dl / 2) ** 2 + np.cos(la[i]) * np.cos(la[i + 1:]) * np.sin(dn / 2) ** 2
+        d = 2 * EARTH_M * np.arcsin(np.sqrt(np.minimum(1, a)))
+        out.update((i, i + 1 + j) for j in np.nonzero(d <= max_m)[0])
+    return out
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--vessels", type=int, default=100000)
+    ap.add_argument("--meters", type=float, default=500)
+    ap.add_argument("--check", type=int, default=4000, help="Vessels verified against brute force")
+    args = ap.parse_args()
+    lat, lon = synth(args.vessels)
+    close_pairs(lat[:1000], lon[:1000], args.meters)  # warm-up
+    t0 = time.perf_counter()
+    i, j, d = close_pairs(lat, lon, args.meters)
+    dt = time.perf_counter() - t0
+    print(f"[bench] hashing: {args.vessels} vessels, {len(i)} pairs within {args.meters:.0f} m in {dt * 1000:.0f} ms")
+    n = min(args.check, args.vessels)
+    t0 = time.perf_counter()
+    want = brute(lat[:n], lon[:n], args.meters)
+    bt = time.perf_counter() - t0
+    si, sj, _ = close_pairs(lat[:n], lon[:n], args.meters)
+    got = set(zip(si.tolist(), sj.tolist()))
+    print(f"[bench] check on {n}: {len(want)} pairs, {len(got ^ want)} mismatches; "
+          f"brute force {bt * 1000:.0f} ms (~{bt * (args.vessels / n) ** 2:.0f} s extrapolated to the full fleet)")
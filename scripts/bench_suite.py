@@ -0,0 +1,187 @@
+# scripts/bench_suite.py
+"""
+End-to-end benchmark at several fleet sizes, on scratch databases.
+
+Per scale (vessels x days of src/synth.py traffic):
+  ingest       the fleet through write_positions (track filter, spatial index, rollups,
+               geofences), as a direct-mode writer client
+  dashboard    streamlit_app.py run in-process (Streamlit AppTest), window "All" with
+               individual paths; the per-stage times of its StageTimer, cold and warm
+  api          median latency of the API endpoints (FastAPI TestClient)
+  maintenance  spatial index and rollup rebuilds, a proximity scan and gap-detector startup
+
+Results go to data/bench/<time>.json (or --out) so runs can be compared over time.
+
+    python scripts/bench_suite.py --scales 200x1,1000x3,2000x7
+"""
+import argparse, contextlib, io, json, os, platform, runpy, shutil, statistics, subprocess, sys, tempfile, time
+from pathlib import Path
+
+from src import db, gaps, proximity
+from src.ingest.writer_client import WriterClient
+from src.ingest.writer_service import run_statements
+from src.synth import Fleet, REGIONS, ingest
+
+ROOT = Path(__file__).resolve().parents[1]
+OUT_DIR = ROOT / "data" / "bench"
+
+
+def _ms(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return round(1000 * statistics.median(times), 2)
+
+
+def _quiet(fn, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+def bench_dashboard(workdir):
+    """Stage times (ms) of a cold and a warm dashboard rerun."""
+    try:
+        import streamlit as st
+        from streamlit.testing.v1 import AppTest
+    except ImportError as e:
+        return {"skipped": str(e)}
+    from src.profiling import StageTimer
+    cwd = os.getcwd()
+    os.chdir(workdir)  # the dashboard opens ./tanker.db and ./config.yaml
+    try:
+        st.cache_data.clear(); st.cache_resource.clear()
+        at = AppTest.from_file(str(ROOT / "streamlit_app.py"), default_timeout=600)
+        _quiet(at.run)
+        next(w for w in at.sidebar.selectbox if w.label == "Time window").set_value("All")
+        next(w for w in at.sidebar.radio if w.label == "Map points").set_value("Individual")
+        st.cache_data.clear()
+        out = {}
+        for run in ("cold", "warm"):
+            t0 = time.perf_counter()
+            _quiet(at.run)
+            if at.exception:
+                return {"error": at.exception[0].value}
+            stages = {}
+            for name, s in StageTimer.latest.stages:
+                stages[name] = round(stages.get(name, 0.0) + 1000 * s, 2)
+            out[run] = {"total_ms": round(1000 * (time.perf_counter() - t0), 2), "stages_ms": stages}
+        return out
+    finally:
+        os.chdir(cwd)
+
+
+def bench_api(path, mmsis, end, repeat):
+    try:
+        from fastapi.testclient import TestClient
+        import api.main as api
+    except ImportError as e:
+        return {"skipped": str(e)}
+    api.DB_PATH = path
+    c = TestClient(api.app)
+    m = mmsis[len(mmsis) // 2]
+    gulf = REGIONS["Gulf"]
+    box = dict(lat_min=min(p[1] for p in gulf) - 1, lat_max=max(p[1] for p in gulf) + 1,
+               lon_min=min(p[2] for p in gulf) - 1, lon_max=max(p[2] for p in gulf) + 1)
+    q = "&".join(f"{k}={v}" for k, v in box.items())
+    urls = {
+        "location": f"/location/{m}",
+        "history raw": f"/history/{m}",
+        "history max_points=500": f"/history/{m}?start={end - 30 * 86400}&max_points=500",
+        "area/bbox": f"/area/bbox?{q}",
+        "area/radius 50km": "/area/radius?lat=1.26&lon=103.84&km=50",
+        "area/tracks 24h": f"/area/tracks?{q}",
+        "proximity": "/proximity",
+        "gaps": "/gaps",
+        "rollups h region": "/rollups?res=h&region=Strait of Hormuz",
+        "rollups d by source": f"/rollups?res=d&start={end - 30 * 86400}&by=class,source",
+    }
+    out = {}
+    for label, url in urls.items():
+        r = c.get(url)
+        out[label] = {"status": r.status_code, "items": len(r.json()) if r.status_code == 200 else None,
+                      "ms": _ms(lambda: c.get(url), repeat)}
+    return out
+
+
+def bench_maintenance(path, end):
+    out = {}
+    for label, script, argv in (("build_spatial_index", "build_spatial_index.py", []),
+                                ("build_rollups --rebuild", "build_rollups.py", ["--rebuild"])):
+        sys.argv = [script] + argv
+        t0 = time.perf_counter()
+        _quiet(runpy.run_path, str(ROOT / "scripts" / script), run_name="__main__")
+        out[label] = {"ms": round(1000 * (time.perf_counter() - t0), 2)}
+    con = db.get_conn()
+    try:
+        t0 = time.perf_counter()
+        statements, stats = proximity.ProximityTracker(**proximity.load_config()).scan(con, end)
+        run_statements(con, statements); con.commit()
+        out["proximity scan"] = {"ms": round(1000 * (time.perf_counter() - t0), 2), **stats}
+        t0 = time.perf_counter()
+        det = gaps.GapDetector(**dict(gaps.load_config(), watchlist_only=False))
+        events = det.prime(con, end) + det.tick(end)
+        run_statements(con, gaps.statements(events)); con.commit()
+        out["gap detector start"] = {"ms": round(1000 * (time.perf_counter() - t0), 2),
+                                     "vessels": det.n, "events": len(events)}
+    finally:
+        con.close()
+    return out
+
+
+def bench_scale(k, vessels, days, args):
+    work = Path(tempfile.mkdtemp(prefix="bench_"))
+    path = work / "tanker.db"
+    shutil.copy(ROOT / "config.yaml", work / "config.yaml")
+    db.DB_PATH = path  # everything in-process, including the scripts run below
+    try:
+        _quiet(db.init_db)
+        fleet = Fleet(vessels, days=days, report_s=args.report_s, seed=args.seed + k,
+                      mmsi_base=200000000 + k * 1000000)  # fresh MMSIs: in-process caches stay valid
+        writer = WriterClient(f"bench{k}", enabled=False)
+        r = _quiet(ingest, fleet, writer)
+        writer.close()
+        res = {"vessels": vessels, "days": days, "generated": r["generated"], "stored": r["stored"],
+               "ingest": {"seconds": round(r["seconds"], 2), "reports_s": round(r["generated"] / r["seconds"])}}
+        res["db_mb"] = round(sum(p.stat().st_size for p in work.glob("tanker.db*")) / 1e6, 1)
+        print(f"[bench] {vessels}x{days:g}: {r['generated']} reports, {r['stored']} stored "
+              f"in {r['seconds']:.1f}s", file=sys.stderr)
+        res["maintenance"] = bench_maintenance(path, fleet.end)
+        res["api"] = bench_api(path, fleet.mmsi.tolist(), fleet.end, args.repeat)
+        res["dashboard"] = bench_dashboard(work)
+        return res
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def _git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scales", default="200x1,1000x2", help="Comma list of VESSELSxDAYS")
+    ap.add_argument("--report-s", type=int, default=60, help="Seconds between reports under way")
+    ap.add_argument("--repeat", type=int, default=5, help="Requests per API endpoint")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", default=None, help="JSON file (default data/bench/<time>.json; '-' for stdout)")
+    args = ap.parse_args()
+    scales = [(int(v), float(d)) for v, d in (s.lower().split("x") for s in args.scales.split(","))]
+    result = {"started": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "git": _git_rev(),
+              "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+              "report_s": args.report_s, "scales": []}
+    for k, (vessels, days) in enumerate(scales):
+        result["scales"].append(bench_scale(k, vessels, days, args))
+    text = json.dumps(result, indent=2)
+    if args.out == "-":
+        print(text)
+    else:
+        out = Path(args.out) if args.out else OUT_DIR / (time.strftime("%Y%m%d-%H%M%S") + ".json")
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(text, encoding="utf-8")
+        print(f"[bench] results in {out}", file=sys.stderr)
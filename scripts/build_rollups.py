@@ -0,0 +1,46 @@
+# scripts/build_rollups.py
+"""Backfill src.rollups from positions (databases that predate it) and/or prune old hourly buckets."""
+import argparse, time
+
+import yaml
+
+from src import rollups
+from src.db import get_conn, init_db
+
+if __name__ == "__main__":
+    try:
+        cfg = yaml.safe_load(open("config.yaml", "r", encoding="utf-8")).get("rollups") or {}
+    except Exception:
+        cfg = {}
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rebuild", action="store_true", help="Recompute rollups from positions")
+    ap.add_argument("--days", type=float, default=None, help="With --rebuild: only the last N days")
+    ap.add_argument("--prune", action="store_true", help="Drop hourly buckets older than rollups.hourly_days")
+    args = ap.parse_args()
+    init_db()
+    con = get_conn()
+    if args.rebuild:
+        t0 = time.time()
+        since = int(time.time() - args.days * 86400) if args.days else None
+        if since is not None:  # whole days only, so daily buckets are not half-counted
+            since -= since % 86400
+        con.execute("DELETE FROM rollups" + (" WHERE bucket >= ?" if since else ""), (since,) if since else ())
+        cur = con.execute(
+            "SELECT mmsi, ts, lat, lon, sog, cog, heading, draught, nav_status, source FROM positions"
+            + (" WHERE ts >= ?" if since else "") + " ORDER BY ts", (since,) if since else ())
+        n = 0
+        while True:
+            chunk = cur.fetchmany(50000)
+            if not chunk:
+                break
+            rollups.update(con, chunk)
+            n += len(chunk)
+        con.commit()
+        rows = con.execute("SELECT COUNT(*) FROM rollups").fetchone()[0]
+        print(f"[rollups] folded {n} positions into {rows} rollup rows in {time.time()-t0:.1f}s")
+    if args.prune:
+        days = float(cfg.get("hourly_days", 90))
+        n = rollups.prune(con, "h", time.time() - days * 86400)
+        con.commit()
+        print(f"[rollups] pruned {n} hourly rows older than {days:g} days")
+    con.close()
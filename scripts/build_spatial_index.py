@@ -0,0 +1,29 @@
+# scripts/build_spatial_index.py
+"""Rebuild latest_positions / track_cells from positions (needed once for older databases) and/or prune old track_cells hours."""
+import argparse, time
+
+from src.db import get_conn, init_db
+from src import spatial
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--days", type=float, default=None, help="Only index positions from the last N days")
+    ap.add_argument("--prune", action="store_true", help="Drop track_cells hours older than spatial.track_days")
+    ap.add_argument("--no-rebuild", action="store_true", help="With --prune: only prune")
+    args = ap.parse_args()
+    cutoff = spatial.horizon()
+    if args.prune and cutoff is None:
+        ap.error("--prune needs spatial.track_days in config.yaml")
+    init_db()
+    con = get_conn()
+    if not args.no_rebuild:
+        t0 = time.time()
+        since = int(time.time() - args.days * 86400) if args.days else None
+        n = spatial.rebuild(con, since=since)
+        vessels = con.execute("SELECT COUNT(*) FROM latest_positions").fetchone()[0]
+        print(f"[spatial] indexed {n} positions, {vessels} vessels in {time.time()-t0:.1f}s")
+    if args.prune:
+        n = spatial.prune(con, cutoff)
+        con.commit()
+        print(f"[spatial] pruned {n} track_cells rows older than {spatial.load_config()['track_days']:g} days")
+    con.close()
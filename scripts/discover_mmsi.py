@@ -1,9 +1,18 @@
 # scripts/discover_mmsi.py
-import argparse, csv, os, re
+"""
+Incremental MMSI discovery from the ships table, seed CSVs and saved HTML pages.
+
+Discoveries live in a small keyed store (data/discovered.db, one row per MMSI) next
+to per-source watermarks, so a re-run only touches new inputs:
+  * ships      -> a hash of its (mmsi, name, ship_type) rows, so renames and re-typed vessels count too
+  * seeds/html -> (mtime, size) per file, plus a content hash to skip touched-but-identical files
+The CSV is re-exported only when the store changed; --export writes CSV/Parquet on demand.
+"""
+import argparse, csv, hashlib, json, re
 from pathlib import Path
 import sqlite3
-import glob
-import pandas as pd
+
+from src.db import init_db
 
 ROOT = Path(__file__).resolve().parents[1]
 DB   = ROOT / "tanker.db"
@@ -11,6 +20,8 @@ DATA = ROOT / "data"
 SEEDS_DIR = DATA / "seeds"
 HTML_DIR  = DATA / "html"
 OUT_CSV   = DATA / "discovered_mmsi.csv"
+OUT_PARQUET = DATA / "discovered_mmsi.parquet"
+STORE_DB  = DATA / "discovered.db"
 
 MMSI_RE = re.compile(r"\b([2-7]\d{8})\b")  # valid MMSI starts 2-7 and 9 digits
 
@@ -18,127 +29,198 @@ DATA.mkdir(exist_ok=True)
 SEEDS_DIR.mkdir(parents=True, exist_ok=True)
 HTML_DIR.mkdir(parents=True, exist_ok=True)
 
+STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS discovered(
+  mmsi INTEGER PRIMARY KEY,
+  name TEXT,
+  class TEXT,
+  source TEXT
+);
+CREATE TABLE IF NOT EXISTS watermarks(
+  key TEXT PRIMARY KEY,
+  value TEXT
+);
+"""
+
 def _conn():
     return sqlite3.connect(DB)
 
-def create_watchlist_if_needed():
-    with _conn() as con:
-        con.execute("""
-        CREATE TABLE IF NOT EXISTS watchlist (
-            mmsi INTEGER PRIMARY KEY,
-            name TEXT,
-            class TEXT,
-            favorite INTEGER DEFAULT 0
-        )""")
-        con.commit()
+def _store():
+    con = sqlite3.connect(STORE_DB)
+    con.executescript(STORE_SCHEMA)
+    return con
+
+# ------------------------------------------------------------
+# Watermarks
+# ------------------------------------------------------------
+def load_watermarks(store):
+    return {k: json.loads(v) for k, v in store.execute("SELECT key, value FROM watermarks")}
 
-def from_db_ships(target: str|None):
+def save_watermarks(store, marks):
+    store.executemany("INSERT OR REPLACE INTO watermarks(key, value) VALUES (?,?)",
+                      [(k, json.dumps(v)) for k, v in marks.items()])
+
+def _file_hash(path: Path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def changed_files(pattern_dir: Path, glob: str, prefix: str, marks: dict):
+    """Yield (path, key, mark) for files whose mtime/size moved and whose content hash changed."""
+    for path in sorted(pattern_dir.glob(glob)):
+        st = path.stat()
+        key = f"{prefix}:{path.name}"
+        prev = marks.get(key) or {}
+        if prev.get("mtime_ns") == st.st_mtime_ns and prev.get("size") == st.st_size:
+            continue
+        mark = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha1": _file_hash(path)}
+        if prev.get("sha1") == mark["sha1"]:
+            marks[key] = mark  # touched, same bytes: just move the watermark
+            continue
+        yield path, key, mark
+
+# ------------------------------------------------------------
+# Sources (each returns only rows from inputs newer than its watermark)
+# ------------------------------------------------------------
+def from_db_ships(target: str|None, marks: dict):
     """
     Harvest MMSIs we already learned via AISStream StaticData (ships table).
     target None = all; 'Cargo'/'Tanker' to filter.
+    StaticData updates names and types in place and ships has no change column, so the
+    watermark is a hash of the rows: when it moved, every row goes to merge_into_store,
+    which keeps only the new or changed MMSIs. The table is one row per vessel.
     """
-    rows = []
+    key = f"db_ships:{target or '*'}"
+    prev = marks.get(key) or {}
+    where, args = ("WHERE ship_type=?", (target,)) if target else ("", ())
     with _conn() as con:
-        if target:
-            q = "SELECT mmsi, COALESCE(name,''), COALESCE(ship_type,'') FROM ships WHERE ship_type=?"
-            args = (target,)
-        else:
-            q = "SELECT mmsi, COALESCE(name,''), COALESCE(ship_type,'') FROM ships"
-            args = ()
-        cur = con.execute(q, args)
-        for mmsi, name, sclass in cur.fetchall():
-            if not mmsi: 
-                continue
-            rows.append({"mmsi": int(mmsi), "name": name or None, "class": sclass or None, "source": "db_ships"})
-    return rows
+        try:
+            cur = con.execute(
+                f"SELECT mmsi, COALESCE(name,''), COALESCE(ship_type,'') FROM ships {where} ORDER BY mmsi", args)
+            found = cur.fetchall()
+        except sqlite3.OperationalError:
+            return []
+    h = hashlib.sha1()
+    for mmsi, name, sclass in found:
+        h.update(f"{mmsi}\t{name}\t{sclass}\n".encode("utf-8"))
+    mark = {"sha1": h.hexdigest(), "count": len(found)}
+    if prev == mark:
+        return []
+    marks[key] = mark
+    return [{"mmsi": int(mmsi), "name": name or None, "class": sclass or None, "source": "db_ships"}
+            for mmsi, name, sclass in found if mmsi]
+
+def _pick(df, *names):
+    for n in names:
+        if n in df.columns:
+            return df[n]
+    return None
 
-def from_seed_csvs():
+def from_seed_csvs(marks: dict):
     rows = []
-    for path in glob.glob(str(SEEDS_DIR / "*.csv")):
+    for path, key, mark in changed_files(SEEDS_DIR, "*.csv", "seed", marks):
+        import pandas as pd  # only when a seed actually changed
         try:
-            df = pd.read_csv(path)
+            df = pd.read_csv(path, dtype=str)
         except Exception:
             continue
-        for _, r in df.iterrows():
-            m = str(r.get("MMSI") or r.get("mmsi") or "").strip()
-            if not m.isdigit() or len(m) != 9: 
-                continue
-            rows.append({
-                "mmsi": int(m),
-                "name": (r.get("Name") or r.get("name") or None),
-                "class": (r.get("Class") or r.get("class") or None),
-                "source": f"seed_csv:{Path(path).name}",
-            })
+        mmsi = _pick(df, "MMSI", "mmsi")
+        if mmsi is None:
+            marks[key] = mark
+            continue
+        out = pd.DataFrame({"mmsi": mmsi.fillna("").str.strip()})
+        name, clazz = _pick(df, "Name", "name"), _pick(df, "Class", "class")
+        out["name"] = name if name is not None else None
+        out["class"] = clazz if clazz is not None else None
+        out = out[out["mmsi"].str.fullmatch(r"\d{9}")]
+        out = out.astype(object).where(out.notna(), None)
+        out["mmsi"] = out["mmsi"].astype(int)
+        out["source"] = f"seed_csv:{path.name}"
+        rows.extend(out.to_dict("records"))
+        marks[key] = mark
     return rows
 
-def from_saved_html():
+def from_saved_html(marks: dict):
     """
-    Parse any saved HTML pages in data/html/ and regex out MMSIs.
+    Parse new or changed HTML pages in data/html/ and regex out MMSIs.
     (Use for manual exports; avoids live scraping TOS issues.)
     """
     rows = []
-    for path in glob.glob(str(HTML_DIR / "*.html")):
+    for path, key, mark in changed_files(HTML_DIR, "*.html", "html", marks):
+        from src.classify import classify_text  # pulls in pandas; only when there is work
         try:
-            text = Path(path).read_text(encoding="utf-8", errors="ignore")
+            text = path.read_text(encoding="utf-8", errors="ignore")
         except Exception:
             continue
-        seen_here = set()
-        for mm in MMSI_RE.findall(text):
-            if mm in seen_here: 
-                continue
-            seen_here.add(mm)
-            # naive class hint based on nearby words
-            lower = text.lower()
+        lower = text.lower()
+        for mm in dict.fromkeys(MMSI_RE.findall(text)):
+            # class hint based on nearby words
             idx = lower.find(mm)
-            window = lower[max(0, idx-120): idx+120]
-            clazz = None
-            if "tanker" in window:
-                clazz = "Tanker"
-            elif "cargo" in window:
-                clazz = "Cargo"
             rows.append({
                 "mmsi": int(mm),
                 "name": None,
-                "class": clazz,
-                "source": f"html:{Path(path).name}",
+                "class": classify_text(lower[max(0, idx-120): idx+120]),
+                "source": f"html:{path.name}",
             })
+        marks[key] = mark
     return rows
 
-def merge_dedupe(*lists):
-    merged = {}
-    for lst in lists:
-        for r in lst:
-            m = int(r["mmsi"])
-            prev = merged.get(m, {})
-            merged[m] = {
-                "mmsi": m,
-                "name": r.get("name") or prev.get("name"),
-                "class": r.get("class") or prev.get("class"),
-                "source": (prev.get("source") or r.get("source")),
-            }
-    return list(merged.values())
-
-def write_csv(rows):
+# ------------------------------------------------------------
+# Store
+# ------------------------------------------------------------
+def merge_into_store(store, rows):
+    """
+    Upsert rows keyed by MMSI: newer name/class fill or replace, first source sticks.
+    Returns the MMSIs that were inserted or whose name/class changed.
+    """
+    if not rows:
+        return []
+    mmsis = list({int(r["mmsi"]) for r in rows})
+    before = {}
+    for i in range(0, len(mmsis), 900):
+        chunk = mmsis[i:i+900]
+        before.update({m: (n, c) for m, n, c in store.execute(
+            f"SELECT mmsi, name, class FROM discovered WHERE mmsi IN ({','.join('?'*len(chunk))})", chunk)})
+    store.executemany("""
+        INSERT INTO discovered(mmsi, name, class, source) VALUES (:mmsi, :name, :class, :source)
+        ON CONFLICT(mmsi) DO UPDATE SET
+          name  = COALESCE(excluded.name, name),
+          class = COALESCE(excluded.class, class)
+    """, rows)
+    changed = []
+    for i in range(0, len(mmsis), 900):
+        chunk = mmsis[i:i+900]
+        for m, n, c in store.execute(
+                f"SELECT mmsi, name, class FROM discovered WHERE mmsi IN ({','.join('?'*len(chunk))})", chunk):
+            if before.get(m) != (n, c):
+                changed.append({"mmsi": m, "name": n, "class": c})
+    return changed
+
+def export(store, fmt="csv"):
+    cur = store.execute("SELECT mmsi, name, class, source FROM discovered ORDER BY mmsi")
+    if fmt == "parquet":
+        import pandas as pd
+        pd.DataFrame(cur.fetchall(), columns=["mmsi","name","class","source"]).to_parquet(OUT_PARQUET, index=False)
+        return OUT_PARQUET
     with open(OUT_CSV, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=["mmsi","name","class","source"])
-        w.writeheader()
-        for r in rows:
-            w.writerow(r)
+        w = csv.writer(f)
+        w.writerow(["mmsi","name","class","source"])
+        w.writerows(cur)
+    return OUT_CSV
 
 def upsert_watchlist(rows, default_class=None):
-    create_watchlist_if_needed()
+    if not rows:
+        return
     with _conn() as con:
-        for r in rows:
-            m = int(r["mmsi"])
-            nm = r.get("name")
-            cl = r.get("class") or default_class
-            con.execute("INSERT OR IGNORE INTO watchlist(mmsi) VALUES (?)", (m,))
-            con.execute("""
-              UPDATE watchlist
-                 SET name = COALESCE(?, name),
-                     class = COALESCE(?, class)
-               WHERE mmsi = ?
-            """, (nm, cl, m))
+        con.executemany("INSERT OR IGNORE INTO watchlist(mmsi) VALUES (?)", [(int(r["mmsi"]),) for r in rows])
+        con.executemany("""
+          UPDATE watchlist
+             SET name = COALESCE(?, name),
+                 class = COALESCE(?, class)
+           WHERE mmsi = ?
+        """, [(r.get("name"), r.get("class") or default_class, int(r["mmsi"])) for r in rows])
         con.commit()
 
 def main():
@@ -151,27 +233,50 @@ def main():
                     help="Limit DB harvest to a class (Cargo/Tanker)")
     ap.add_argument("--limit", type=int, default=None)
     ap.add_argument("--dry-run", action="store_true")
+    ap.add_argument("--full", action="store_true", help="Forget watermarks and rebuild the store")
+    ap.add_argument("--export", choices=["csv", "parquet"], default=None,
+                    help="Export the whole store now (default: CSV only when it changed)")
     args = ap.parse_args()
+    init_db()
 
-    lists = []
+    store = _store()
+    if args.full:
+        # execute, not executescript: that would commit first and --dry-run could not roll it back
+        store.execute("DELETE FROM discovered")
+        store.execute("DELETE FROM watermarks")
+    marks = load_watermarks(store)
+
+    rows = []
     parts = [p.strip() for p in args.sources.split(",") if p.strip()]
     if "db" in parts:
-        lists.append(from_db_ships(args.target_class))
+        rows += from_db_ships(args.target_class, marks)
     if "seeds" in parts:
-        lists.append(from_seed_csvs())
+        rows += from_seed_csvs(marks)
     if "html" in parts:
-        lists.append(from_saved_html())
+        rows += from_saved_html(marks)
 
-    rows = merge_dedupe(*lists)
-    if args.limit:
+    # --limit caps this run; watermarks stay put so the remainder is picked up next time
+    limited = bool(args.limit) and len(rows) > args.limit
+    if limited:
         rows = rows[: args.limit]
+    changed = merge_into_store(store, rows)
+    print(f"[discover] scanned {len(rows)} new input rows; {len(changed)} new/changed MMSIs")
+    if args.dry_run:
+        store.rollback()
+    else:
+        if not limited:
+            save_watermarks(store, marks)
+        store.commit()
 
-    write_csv(rows)
-    print(f"[discover] wrote {len(rows)} to {OUT_CSV}")
+    if args.export or (changed and not args.dry_run) or not OUT_CSV.exists():
+        out = export(store, args.export or "csv")
+        n = store.execute("SELECT COUNT(*) FROM discovered").fetchone()[0]
+        print(f"[discover] wrote {n} to {out}")
+    store.close()
 
     if not args.dry_run:
-        upsert_watchlist(rows, default_class=args.force_class)
-        print(f"[discover] upserted {len(rows)} rows into watchlist")
+        upsert_watchlist(changed, default_class=args.force_class)
+        print(f"[discover] upserted {len(changed)} rows into watchlist")
     else:
         print("[discover] dry-run: not updating watchlist")
 
@@ -5,6 +5,9 @@ import sqlite3
 import httpx
 from bs4 import BeautifulSoup
 
+from src.classify import classify_text
+from src.db import init_db
+
 ROOT = Path(__file__).resolve().parents[1]
 DB   = ROOT / "tanker.db"
 DATA = ROOT / "data"
@@ -13,25 +16,10 @@ DATA.mkdir(exist_ok=True)
 
 MMSI_RE = re.compile(r"\b([2-7]\d{8})\b")  # 9 digits, starting 2–7 typically
 
-# Basic keywords to bias toward commercial cargo/tankers
-TANKER_WORDS = {"tanker","vlcc","suezmax","aframax","lr1","lr2","mr tanker","oil","crude","lng","lpg","chem","product tanker"}
-CARGO_WORDS  = {"cargo","bulk","bulker","container","feeder","handymax","panamax","kamsarmax","cape","ro-ro","general cargo","boxship"}
-
 # --- DB utils ---
 def _conn():
     return sqlite3.connect(DB)
 
-def ensure_watchlist():
-    with _conn() as con:
-        con.execute("""
-        CREATE TABLE IF NOT EXISTS watchlist(
-          mmsi INTEGER PRIMARY KEY,
-          name TEXT,
-          class TEXT,        -- 'Cargo' | 'Tanker' | 'Other' | NULL
-          favorite INTEGER DEFAULT 0
-        )""")
-        con.commit()
-
 def upsert_watchlist(rows):
     with _conn() as con:
         cur = con.cursor()
@@ -46,16 +34,6 @@ def upsert_watchlist(rows):
         con.commit()
 
 # --- classification helpers ---
-def classify_text(snippet: str):
-    s = (snippet or "").lower()
-    t_hits = sum(1 for w in TANKER_WORDS if w in s)
-    c_hits = sum(1 for w in CARGO_WORDS if w in s)
-    if t_hits > c_hits and t_hits > 0:
-        return "Tanker"
-    if c_hits > t_hits and c_hits > 0:
-        return "Cargo"
-    return None
-
 def maybe_ai_classify(snippet: str):
     """
     Optional: if OPENAI_API_KEY is set, ask the model to label as Tanker/Cargo/Other.
@@ -232,7 +210,7 @@ def main():
     if args.cargo and not args.tankers:
         base = [q for q in base if "cargo" in q.lower() or "container" in q.lower() or "bulk" in q.lower()]
 
-    ensure_watchlist()
+    init_db()
     rows = run_discovery(base, max_links=args.max_links, per_site_delay=args.delay, use_ai=args.use_ai)
     print(f"[discover] candidates: {len(rows)}")
     write_csv(rows)
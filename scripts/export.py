@@ -0,0 +1,72 @@
+# scripts/export.py
+"""
+Export positions or alerts from tanker.db to a file (or stdout) without loading them
+into memory; the same streams as the API's /export endpoints (src/export.py).
+
+    python scripts/export.py positions --start 2024-05-01 --end 2024-06-01 --format parquet -o may.parquet
+    python scripts/export.py positions --region "Strait of Hormuz" --compression zstd -o hormuz.csv.zst
+    python scripts/export.py alerts --mmsi 538001234,636012345 --format ndjson -o -
+
+A positions export filtered only by time reads the whole table (positions are keyed by
+MMSI first); --mmsi, --region or --bbox let it probe just the vessels concerned.
+"""
+import argparse, sqlite3, sys, time
+from datetime import datetime, timezone
+
+import yaml
+
+from src import db, export
+
+
+def _ts(text):
+    """Epoch seconds or an ISO date/time (UTC unless it carries an offset)."""
+    if text is None or text.isdigit():
+        return None if text is None else int(text)
+    dt = datetime.fromisoformat(text)
+    return int((dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)).timestamp())
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("what", choices=["positions", "alerts"])
+    ap.add_argument("--format", default="csv", choices=sorted(export.FORMATS))
+    ap.add_argument("--compression", default=None, choices=sorted(export.COMPRESSIONS))
+    ap.add_argument("--start", default=None, help="Epoch seconds or ISO date/time (UTC)")
+    ap.add_argument("--end", default=None, help="Epoch seconds or ISO date/time (UTC)")
+    ap.add_argument("--mmsi", default=None, help="Comma list of MMSIs")
+    ap.add_argument("--region", default=None, help="positions: a region from config.yaml")
+    ap.add_argument("--bbox", default=None, help="positions: LAT_MIN,LAT_MAX,LON_MIN,LON_MAX")
+    ap.add_argument("--kind", default=None, help="alerts: comma list of kinds")
+    ap.add_argument("-o", "--out", default=None, help="Output file ('-' for stdout; default: a name in the current directory)")
+    args = ap.parse_args()
+    try:
+        export.check(args.format, args.compression)
+    except ValueError as e:
+        ap.error(str(e))
+    start, end = _ts(args.start), _ts(args.end)
+    mmsis = [int(m) for m in args.mmsi.split(",") if m.strip()] if args.mmsi else None
+    bbox = [float(v) for v in args.bbox.split(",")] if args.bbox else None
+    if args.region:
+        regions = (yaml.safe_load(open("config.yaml", "r", encoding="utf-8")) or {}).get("regions") or {}
+        if args.region not in regions:
+            ap.error(f"unknown region {args.region!r} (config.yaml has: {', '.join(regions)})")
+        bbox = regions[args.region]
+    con = sqlite3.connect(db.DB_PATH)
+    if args.what == "positions":
+        cur, fields = export.positions_cursor(con, start, end, mmsis, bbox)
+    else:
+        kinds = [k.strip() for k in args.kind.split(",") if k.strip()] if args.kind else None
+        cur, fields = export.alerts_cursor(con, start, end, mmsis, kinds)
+    path = args.out or export.filename(args.what, args.format, args.compression)
+    out = sys.stdout.buffer if path == "-" else open(path, "wb")
+    t0, size = time.time(), 0
+    try:
+        for chunk in export.stream(cur, fields, args.format, args.compression):
+            out.write(chunk)
+            size += len(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+        con.close()
+    if path != "-":
+        print(f"[export] {args.what} -> {path}: {size / 1e6:.1f} MB in {time.time() - t0:.1f}s", file=sys.stderr)
@@ -0,0 +1,51 @@
+# scripts/gen_fleet.py
+"""
+Fill tanker.db with a synthetic fleet (src/synth.py) through the normal ingest path:
+the writer service when it runs, direct writes otherwise. For scale tests: the
+vessels are fake (MMSIs from --mmsi-base up), so point --db at a scratch database
+(written directly, bypassing the service). A database that already holds positions is
+refused unless --append.
+"""
+import argparse, time
+from pathlib import Path
+
+from src import db
+from src.ingest.writer_client import WriterClient, get_client
+from src.synth import Fleet, ingest
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--vessels", type=int, default=1000)
+    ap.add_argument("--days", type=float, default=1.0)
+    ap.add_argument("--report-s", type=int, default=60, help="Seconds between reports under way")
+    ap.add_argument("--tanker-share", type=float, default=0.5)
+    ap.add_argument("--cargo-share", type=float, default=0.35)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--mmsi-base", type=int, default=200000000)
+    ap.add_argument("--db", default=None, help="Scratch database to fill instead of tanker.db (direct writes)")
+    ap.add_argument("--append", action="store_true", help="Add to a database that already holds positions")
+    args = ap.parse_args()
+    if args.db:
+        db.DB_PATH = Path(args.db)
+    db.init_db()
+    con = db.get_conn()
+    try:
+        has_rows = con.execute("SELECT 1 FROM positions LIMIT 1").fetchone() is not None
+    finally:
+        con.close()
+    if has_rows and not args.append:
+        ap.error(f"{db.DB_PATH} already holds positions; use --db with a scratch database or pass --append")
+    fleet = Fleet(args.vessels, days=args.days, report_s=args.report_s, seed=args.seed,
+                  tanker_share=args.tanker_share, cargo_share=args.cargo_share, mmsi_base=args.mmsi_base)
+    last = [time.time()]
+
+    def progress(n):
+        if time.time() - last[0] >= 5:
+            last[0] = time.time()
+            print(f"[synth] {n} reports so far")
+
+    writer = WriterClient("synth", enabled=False) if args.db else get_client("synth")
+    r = ingest(fleet, writer, progress=progress)
+    stored = "?" if r["stored"] is None else r["stored"]
+    print(f"[synth] {args.vessels} vessels x {args.days:g} days: {r['generated']} reports, {stored} stored "
+          f"in {r['seconds']:.1f}s ({r['generated'] / max(r['seconds'], 1e-9):.0f} reports/s)")
@@ -1,6 +1,7 @@
-import time, requests, yaml
-from urllib.parse import urljoin
-from src.db import init_db, get_conn
+import time, yaml
+from src.db import init_db
+from src.locator import Locator, format_stats
+from src.scheduler import run_scheduled
 
 if __name__ == "__main__":
     init_db()
@@ -9,30 +10,29 @@ if __name__ == "__main__":
     base = lp.get("base_url", "http://localhost:5050")
     tmpl = lp.get("path_template", "/location/{mmsi}")
     poll_s = int(lp.get("poll_seconds", 60))
+    workers = int(lp.get("workers", 32))
     watch = cfg.get("watchlist") or []
     if not watch:
         print("No MMSIs in watchlist. Edit config.yaml"); raise SystemExit(0)
-    print(f"[ingest_api] polling {len(watch)} MMSIs every {poll_s}s from {base}")
+    watch = [int(m) for m in watch]
+    locator = Locator(base, path_template=tmpl, bulk_path=lp.get("bulk_path", "/locations"), workers=workers)
+    sched = lp.get("scheduler") or {}
+    if sched.get("enabled", True):
+        budget = float(sched.get("budget_per_min") or max(10, len(watch) * 60 / poll_s))
+        print(f"[ingest_api] adaptive polling of {len(watch)} MMSIs from {base}, budget {budget:.0f}/min")
+        run_scheduled(locator, lambda: watch, budget,
+                      min_interval=int(sched.get("min_interval", 60)),
+                      max_interval=int(sched.get("max_interval", 3600)),
+                      log_prefix="[ingest_api]", register_ships=True)
+    print(f"[ingest_api] polling {len(watch)} MMSIs every {poll_s}s from {base} ({workers} workers)")
     while True:
         t0 = time.time()
-        for m in watch:
-            try:
-                url = urljoin(base, tmpl.format(mmsi=m).lstrip("/"))
-                r = requests.get(url, timeout=15)
-                if r.status_code != 200:
-                    print("[ingest_api]", m, "HTTP", r.status_code); continue
-                d = r.json()
-                ts = int(d.get("timestamp", time.time()))
-                lat = float(d.get("latitude")); lon = float(d.get("longitude"))
-                sog = d.get("speed"); cog = d.get("course"); src = d.get("source", "local_api")
-                con = get_conn()
-                con.execute("INSERT OR IGNORE INTO ships(mmsi) VALUES(?)", (m,))
-                con.execute("""INSERT OR IGNORE INTO positions
-                    (mmsi, ts, lat, lon, sog, cog, heading, draught, nav_status, source)
-                    VALUES (?,?,?,?,?,?,?,?,?,?)""", (m, ts, lat, lon, sog, cog, None, None, None, src))
-                con.commit(); con.close()
-                print("[ingest_api] stored", m, ts, lat, lon, src)
-            except Exception as e:
-                print("[ingest_api] error", m, e)
+        try:
+            _, stats = locator.run_cycle(watch, register_ships=True)
+            for m, err in list(stats["errors"].items())[:10]:
+                print("[ingest_api] error", m, err)
+            print("[ingest_api] cycle", format_stats(stats))
+        except Exception as e:
+            print("[ingest_api] cycle error", e)
         dt = time.time()-t0
         time.sleep(max(1.0, poll_s - dt))
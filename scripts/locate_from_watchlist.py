@@ -1,8 +1,11 @@
 # scripts/locate_from_watchlist.py
-import argparse, time, json
+import argparse, time
 from pathlib import Path
 import sqlite3
-import requests
+
+from src.db import init_db
+from src.locator import Locator, format_stats
+from src.scheduler import run_scheduled
 
 ROOT = Path(__file__).resolve().parents[1]
 DB   = ROOT / "tanker.db"
@@ -10,84 +13,47 @@ DB   = ROOT / "tanker.db"
 def _conn():
     return sqlite3.connect(DB)
 
-def ensure_tables():
-    with _conn() as con:
-        con.execute("""CREATE TABLE IF NOT EXISTS ships(
-            mmsi INTEGER PRIMARY KEY, imo INTEGER, name TEXT, ship_type TEXT,
-            dwt REAL, max_draught REAL, company TEXT, cargo TEXT
-        )""")
-        con.execute("""CREATE TABLE IF NOT EXISTS positions(
-            mmsi INTEGER, ts INTEGER, lat REAL, lon REAL,
-            sog REAL, cog REAL, heading REAL, draught REAL,
-            nav_status TEXT, source TEXT,
-            PRIMARY KEY (mmsi, ts)
-        )""")
-        con.commit()
-
 def _watchlist():
     with _conn() as con:
         cur = con.execute("SELECT mmsi FROM watchlist ORDER BY mmsi")
         return [int(r[0]) for r in cur.fetchall() if r and r[0]]
 
-def _insert_position(mmsi, ts, lat, lon, sog, cog, heading=None, draught=None, nav_status=None, source="local_api"):
-    with _conn() as con:
-        con.execute("""INSERT OR IGNORE INTO positions
-            (mmsi, ts, lat, lon, sog, cog, heading, draught, nav_status, source)
-            VALUES (?,?,?,?,?,?,?,?,?,?)""",
-            (int(mmsi), int(ts), float(lat), float(lon),
-             None if sog is None else float(sog),
-             None if cog is None else float(cog),
-             None if heading is None else float(heading),
-             None if draught is None else float(draught),
-             nav_status, source))
-        con.commit()
-
-def fetch_one(base, mmsi, timeout=15):
-    url = f"{base.rstrip('/')}/location/{mmsi}"
-    r = requests.get(url, timeout=timeout)
-    r.raise_for_status()
-    return r.json()
-
-def normalize_and_store(mmsi, payload, source="local_api"):
-    """
-    Expecting payload like:
-      {"mmsi":..., "lat":..., "lon":..., "ts":..., "sog":..., "cog":...}
-    If your API returns a different shape, adjust here.
-    """
-    lat = payload.get("lat") or payload.get("latitude")
-    lon = payload.get("lon") or payload.get("longitude")
-    ts  = payload.get("ts") or payload.get("timestamp") or int(time.time())
-    sog = payload.get("sog"); cog = payload.get("cog")
-    heading = payload.get("heading"); draught = payload.get("draught")
-    nav_status = payload.get("nav_status")
-    if lat is None or lon is None:
-        return False
-    _insert_position(mmsi, ts, lat, lon, sog, cog, heading, draught, nav_status, source=source)
-    return True
-
-def run_once(base):
-    ensure_tables()
+def run_once(base, workers=32, locator=None):
     wl = _watchlist()
     if not wl:
         print("[locate] watchlist empty — add MMSIs first.")
         return
-    ok = 0; fail = 0
-    for m in wl:
+    own = locator is None
+    locator = locator or Locator(base, workers=workers, source="position_api")
+    try:
+        _, stats = locator.run_cycle(wl)
+    finally:
+        if own: locator.close()
+    for m, err in list(stats["errors"].items())[:10]:
+        print(f"[locate] {m}: error {err}")
+    print(f"[locate] cycle {format_stats(stats)}")
+    return stats
+
+def run_loop(base, every, workers=32):
+    locator = Locator(base, workers=workers, source="position_api")
+    while True:
+        t0 = time.time()
         try:
-            payload = fetch_one(base, m)
-            if normalize_and_store(m, payload, source="position_api"):
-                ok += 1
-            else:
-                fail += 1
+            run_once(base, locator=locator)
         except Exception as e:
-            print(f"[locate] {m}: error {e}")
-            fail += 1
-    print(f"[locate] stored ok={ok} fail={fail}")
+            print(f"[locate] cycle error {e}")
+        time.sleep(max(1.0, every - (time.time() - t0)))
 
-def run_loop(base, every):
-    while True:
-        run_once(base)
-        time.sleep(every)
+def run_adaptive(base, every, workers=32, budget=None):
+    """
+    Per-vessel adaptive polling. Without --budget, the request budget equals what the
+    fixed loop would spend (watchlist size per `every` seconds), just spent where it matters.
+    """
+    if budget is None:
+        budget = max(10, len(_watchlist()) * 60 / every)
+    print(f"[locate] adaptive polling, budget {budget:.0f} lookups/min")
+    locator = Locator(base, workers=workers, source="position_api")
+    run_scheduled(locator, _watchlist, budget, log_prefix="[locate]")
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
@@ -95,8 +61,14 @@ if __name__ == "__main__":
     ap.add_argument("--once", action="store_true")
     ap.add_argument("--loop", action="store_true")
     ap.add_argument("--interval", type=int, default=180, help="Seconds between loops")
+    ap.add_argument("--workers", type=int, default=32, help="Concurrent requests per cycle")
+    ap.add_argument("--fixed", action="store_true", help="Poll every MMSI each --interval instead of adaptively")
+    ap.add_argument("--budget", type=float, default=None, help="Adaptive mode: max lookups per minute")
     args = ap.parse_args()
+    init_db()
     if args.once or not args.loop:
-        run_once(args.base)
+        run_once(args.base, workers=args.workers)
+    elif args.fixed:
+        run_loop(args.base, args.interval, workers=args.workers)
     else:
-        run_loop(args.base, args.interval)
+        run_adaptive(args.base, args.interval, workers=args.workers, budget=args.budget)
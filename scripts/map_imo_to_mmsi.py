@@ -3,48 +3,18 @@ import sqlite3
 from pathlib import Path
 import pandas as pd
 
+from src.classify import classify_series
+from src.migrations import migrate
+
 DB  = Path("tanker.db")
 CSV = Path("data/discovered_imo.csv")
 
 def conn():
     return sqlite3.connect(DB)
 
-def ensure_watchlist_with_imo():
-    with conn() as con:
-        con.execute("""
-            CREATE TABLE IF NOT EXISTS watchlist(
-              mmsi INTEGER PRIMARY KEY,
-              name TEXT,
-              class TEXT,
-              favorite INTEGER DEFAULT 0,
-              imo INTEGER
-            )
-        """)
-        # if the table existed without imo, add it
-        con.execute("PRAGMA table_info(watchlist)")
-        cols = {r[1] for r in con.fetchall()}
-        if "imo" not in cols:
-            con.execute("ALTER TABLE watchlist ADD COLUMN imo INTEGER")
-        con.commit()
-
-def classify(ship_type):
-    if ship_type is None:
-        return None
-    s = str(ship_type).lower()
-    if "tanker" in s or "lng" in s or "lpg" in s or "chem" in s or "oil" in s or "product" in s:
-        return "Tanker"
-    if "cargo" in s or "bulk" in s or "container" in s or "ro-ro" in s or "general cargo" in s:
-        return "Cargo"
-    try:
-        code = int(ship_type)
-        if 80 <= code <= 89: return "Tanker"
-        if 70 <= code <= 79: return "Cargo"
-    except Exception:
-        pass
-    return None
-
 def main():
-    ensure_watchlist_with_imo()
+    with conn() as con:
+        migrate(con)  # watchlist.imo
 
     if not CSV.exists():
         print(f"[map] {CSV} not found. Run discover_web_imo.py first.")
@@ -67,10 +37,11 @@ def main():
 
     ships = ships.dropna(subset=["imo"])
     ships["imo"] = ships["imo"].astype(int)
-    matches = ships[ships["imo"].isin(imos)]
+    matches = ships[ships["imo"].isin(imos)].copy()
     if matches.empty:
         print("[map] No overlaps yet between discovered IMOs and AIS static IMOs.")
         return
+    matches["cls"] = classify_series(matches["ship_type"])
 
     with conn() as con:
         n = 0
@@ -78,7 +49,7 @@ def main():
             mmsi = int(r.mmsi) if pd.notna(r.mmsi) else None
             if not mmsi: 
                 continue
-            cls = classify(r.ship_type)
+            cls = r.cls
             con.execute("INSERT OR IGNORE INTO watchlist(mmsi) VALUES(?)", (mmsi,))
             con.execute("""
                 UPDATE watchlist
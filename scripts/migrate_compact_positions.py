@@ -0,0 +1,29 @@
+# scripts/migrate_compact_positions.py
+"""
+Convert tanker.db from the original positions table to the compact layout
+(positions_c WITHOUT ROWID + sources + decoding `positions` view). The conversion is
+a step of src/migrations.py, so any entry point's init_db() does it too; this script
+adds --keep-old and --vacuum. Already-compact databases are left alone.
+"""
+import argparse, time
+
+from src.db import get_conn, is_legacy
+from src.migrations import migrate
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--keep-old", action="store_true", help="Keep the old table as positions_legacy")
+    ap.add_argument("--vacuum", action="store_true", help="VACUUM afterwards to return the freed pages")
+    args = ap.parse_args()
+
+    con = get_conn()
+    if not is_legacy(con):
+        migrate(con)
+        print("[compact] positions is already compact (or the database is new); nothing to do")
+        raise SystemExit(0)
+    migrate(con, keep_legacy=args.keep_old)
+    if args.vacuum:
+        t1 = time.time()
+        con.execute("VACUUM")
+        print(f"[compact] vacuumed in {time.time()-t1:.1f}s")
+    con.close()
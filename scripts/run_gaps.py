@@ -0,0 +1,50 @@
+# scripts/run_gaps.py
+"""AIS gap detection (src/gaps.py): dark / reappeared alerts for watchlist vessels; --loop keeps ticking."""
+import argparse, time
+
+from src import metrics
+from src.db import get_conn, init_db
+from src.gaps import GapDetector, load_config, statements
+from src.ingest.writer_client import get_client
+
+WATCHLIST_EVERY_S = 300
+
+if __name__ == "__main__":
+    opts = load_config()
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--loop", action="store_true")
+    ap.add_argument("--interval", type=int, default=opts["interval_s"], help="Seconds between ticks")
+    args = ap.parse_args()
+    init_db()
+    metrics.set_process("gaps")
+    det = GapDetector(**opts)
+    writer = get_client("gaps")
+    con = get_conn()
+    now = int(time.time())
+    det.refresh_watchlist(con, now)
+    events = det.prime(con, now)
+    print(f"[gaps] tracking {det.n} vessels, {det.dark_count()} already dark")
+    last_wl = time.time()
+    while True:
+        now = int(time.time())
+        if time.time() - last_wl >= WATCHLIST_EVERY_S:
+            events += det.refresh_watchlist(con, now); last_wl = time.time()
+        events += det.poll(con)
+        events += det.tick(now)
+        con.rollback()  # end the read snapshot so the next poll sees new fixes
+        if events:
+            try:
+                writer.execute(statements(events))
+            except Exception as e:  # keep the events; the next tick writes them again
+                print(f"[gaps] write failed ({e}); retrying {len(events)} events next tick")
+                if not args.loop:
+                    raise
+            else:
+                for kind, mmsi, start_ts, *_ in events:
+                    print(f"[gaps] {kind:10s} {mmsi} (gap from {time.strftime('%Y-%m-%d %H:%M', time.gmtime(start_ts))} UTC)")
+                events = []
+        metrics.set_gauge("tracker_dark_vessels", det.dark_count())
+        if not args.loop:
+            break
+        time.sleep(args.interval)
+    con.close()
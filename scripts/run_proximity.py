@@ -0,0 +1,38 @@
+# scripts/run_proximity.py
+"""Scan latest positions for ship-to-ship proximity episodes (src/proximity.py); --loop keeps scanning."""
+import argparse, time
+
+from src.db import get_conn, init_db
+from src.ingest.writer_client import get_client
+from src.proximity import ProximityTracker, load_config
+
+if __name__ == "__main__":
+    opts = load_config()
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--loop", action="store_true")
+    ap.add_argument("--interval", type=int, default=opts["interval_s"], help="Seconds between scans")
+    args = ap.parse_args()
+    init_db()
+    tracker = ProximityTracker(**opts)
+    writer = get_client("proximity")
+    while True:
+        t0 = time.perf_counter()
+        con = get_conn()
+        try:
+            statements, stats = tracker.scan(con)
+        finally:
+            con.close()
+        scan_s = time.perf_counter() - t0
+        try:
+            if statements:
+                writer.execute(statements)
+            tracker.commit()
+        except Exception as e:  # episodes stay as they were; the next scan writes them again
+            print(f"[proximity] write failed ({e}); retrying next scan")
+            if not args.loop:
+                raise
+        print(f"[proximity] {stats['vessels']} slow vessels, {stats['pairs']} close pairs, "
+              f"{stats['active']} open episodes, {stats['alerts']} new alerts; scan {scan_s * 1000:.0f} ms")
+        if not args.loop:
+            break
+        time.sleep(max(0.0, args.interval - (time.perf_counter() - t0)))
@@ -0,0 +1,34 @@
+# scripts/run_writer_service.py
+"""Run the single-writer ingest service, or print its per-producer throughput (--stats)."""
+import argparse, json
+
+from src.db import init_db
+from src.ingest import writer_service
+from src.ingest.writer_client import WriterClient
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default=None)
+    ap.add_argument("--port", type=int, default=None)
+    ap.add_argument("--coalesce-ms", type=int, default=None, help="Wait for more requests before committing")
+    ap.add_argument("--max-batch-rows", type=int, default=None, help="Rows per transaction")
+    ap.add_argument("--stats", action="store_true", help="Query a running service and print its stats")
+    ap.add_argument("--json", action="store_true", help="With --stats: raw JSON")
+    args = ap.parse_args()
+    if args.stats:
+        snap = WriterClient("stats", host=args.host, port=args.port).stats()
+        if snap is None:
+            raise SystemExit("[writer] service not reachable")
+        if args.json:
+            print(json.dumps(snap, indent=2))
+        else:
+            print(f"[writer] up {snap['uptime_s']}s, {snap['txns']} txns, {snap['requests_per_txn']} requests/txn, "
+                  f"queue {snap['queue']}")
+            print(f"{'producer':14s} {'rows/s':>8s} {'requests':>9s} {'rows':>10s} {'stored':>10s} "
+                  f"{'suppressed':>10s} {'errors':>6s} {'idle s':>7s}")
+            for p, s in snap["producers"].items():
+                print(f"{p:14s} {s['rows_per_s']:8.1f} {s['requests']:9d} {s['rows']:10d} {s['stored']:10d} "
+                      f"{s['suppressed']:10d} {s['errors']:6d} {s['idle_s'] if s['idle_s'] is not None else '-':>7}")
+    else:
+        init_db()
+        writer_service.serve(args.host, args.port, coalesce_ms=args.coalesce_ms, max_batch_rows=args.max_batch_rows)
@@ -0,0 +1,111 @@
+# src/arrowio.py
+"""
+Arrow IPC streaming for bulk API reads.
+
+Rows are pulled from a SQLite cursor in chunks and each chunk is written as one
+record batch of an Arrow IPC stream, so the response starts before the query is
+exhausted and no per-row dicts are built. pyarrow is optional: without it every
+endpoint keeps answering JSON. stream_parquet does the same for Parquet files (one row
+group per chunk; the footer goes out last), used by the exports (src/export.py).
+"""
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # JSON only
+    pa = pq = None
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+BATCH_ROWS = 65536
+
+
+def available():
+    return pa is not None
+
+
+def wants_arrow(accept):
+    """True when the Accept header asks for an Arrow stream and pyarrow is installed."""
+    if pa is None or not accept:
+        return False
+    for part in accept.split(","):
+        mime, _, params = part.strip().partition(";")
+        if mime.strip().lower() == ARROW_STREAM:
+            return "q=0" not in params.replace(" ", "").split(";")
+    return False
+
+
+def schema(fields):
+    """pa.schema from [(name, 'int'|'float'|'str'), ...]."""
+    types = {"int": pa.int64(), "float": pa.float64(), "str": pa.string()}
+    return pa.schema([(name, types[kind]) for name, kind in fields])
+
+
+class _Chunks:
+    """Minimal writable sink: collects what the IPC writer emits until drained."""
+
+    def __init__(self):
+        self.parts = []
+        self.closed = False
+
+    def write(self, b):
+        self.parts.append(bytes(b))
+        return len(b)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        out = b"".join(self.parts)
+        self.parts.clear()
+        return out
+
+
+def _batch(rows, sch):
+    cols = list(zip(*rows))
+    return pa.record_batch([pa.array(col, type=f.type) for col, f in zip(cols, sch)], schema=sch)
+
+
+def stream_cursor(cur, sch, batch_rows=BATCH_ROWS):
+    """Yield Arrow IPC stream bytes (schema, one message per batch, end marker) for cur."""
+    sink = _Chunks()
+    with pa.ipc.new_stream(sink, sch) as writer:
+        yield sink.drain()
+        while True:
+            rows = cur.fetchmany(batch_rows)
+            if not rows:
+                break
+            writer.write_batch(_batch(rows, sch))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def stream_parquet(cur, sch, compression=None, batch_rows=BATCH_ROWS):
+    """Yield the bytes of a Parquet file for cur, one row group per batch; compression is the codec."""
+    sink = _Chunks()
+    with pq.ParquetWriter(sink, sch, compression=compression or "snappy") as writer:
+        while True:
+            rows = cur.fetchmany(batch_rows)
+            if not rows:
+                break
+            writer.write_batch(_batch(rows, sch))
+            yield sink.drain()
+    yield sink.drain()
+
+
+class _Rows:
+    """fetchmany() over rows already in memory."""
+
+    def __init__(self, rows):
+        self.rows, self.pos = rows, 0
+
+    def fetchmany(self, n):
+        chunk = self.rows[self.pos:self.pos + n]
+        self.pos += n
+        return chunk
+
+
+def stream_rows(rows, sch, batch_rows=BATCH_ROWS):
+    """stream_cursor for a list of row tuples (e.g. a downsampled track)."""
+    return stream_cursor(_Rows(rows), sch, batch_rows)
@@ -0,0 +1,208 @@
+# src/backend.py
+"""
+Query backends for the dashboard's window-wide reads.
+
+SQLite stays the store every writer goes through. The analytical reads are: the
+positions of a time window, the latest fix per vessel, each vessel's last two fixes
+(the alert deltas) and rollup series. They can run on either engine:
+
+    sqlite   pandas over the tanker.db connection (window functions, one thread)
+    duckdb   an in-memory DuckDB that ATTACHes tanker.db read-only (sqlite extension)
+             and optionally reads older positions from a Parquet archive; scans,
+             window functions and groupbys run vectorized on all cores
+
+Both engines answer from the same SQL over a `positions` relation with the
+src.db.POSITION_COLS columns. Under DuckDB that relation decodes positions_c itself,
+so SQLite only hands over integer columns. backend.engine in config.yaml picks the
+engine. duckdb is an optional dependency: without it, or if tanker.db cannot be
+attached, get_backend() falls back to SQLite and says why.
+"""
+import sqlite3
+from pathlib import Path
+
+import pandas as pd
+import yaml
+
+from . import rollups
+from .db import DB_PATH, POSITION_COLS, is_legacy
+from .spatial import cell_ranges
+
+try:
+    import duckdb
+except ImportError:  # SQLite only
+    duckdb = None
+
+ROOT = Path(__file__).resolve().parents[1]
+CFG_PATH = ROOT / "config.yaml"
+
+DEFAULTS = {
+    "engine": "sqlite",   # sqlite | duckdb
+    "threads": 0,         # duckdb: 0 = all cores
+    "archive": None,      # duckdb: Parquet glob with older positions (POSITION_COLS), relative to the repo
+}
+
+COLS = ", ".join(POSITION_COLS)
+
+WINDOW_SQL = f"SELECT {COLS} FROM positions WHERE ts >= ? ORDER BY mmsi, ts"
+
+LATEST_SQL = f"""
+SELECT {COLS} FROM (
+  SELECT *, row_number() OVER (PARTITION BY mmsi ORDER BY ts DESC) AS rn
+    FROM positions WHERE ts >= ?
+) WHERE rn = 1 ORDER BY mmsi
+"""
+
+DELTAS_SQL = """
+SELECT mmsi, ts, lat, lon, sog, cog, prev_sog, prev_cog FROM (
+  SELECT mmsi, ts, lat, lon, sog, cog,
+         lag(sog) OVER w AS prev_sog, lag(cog) OVER w AS prev_cog,
+         row_number() OVER (PARTITION BY mmsi ORDER BY ts DESC) AS rn,
+         count(*) OVER (PARTITION BY mmsi) AS n
+    FROM positions WHERE ts >= ?
+  WINDOW w AS (PARTITION BY mmsi ORDER BY ts)
+) WHERE rn = 1 AND n >= 2 ORDER BY mmsi
+"""
+
+DELTA_COLS = ["mmsi", "ts", "lat", "lon", "sog", "cog", "prev_sog", "prev_cog"]
+
+
+def load_config():
+    opts = dict(DEFAULTS)
+    try:
+        opts.update(yaml.safe_load(open(CFG_PATH, "r", encoding="utf-8")).get("backend") or {})
+    except Exception:
+        pass
+    return opts
+
+
+class SqliteBackend:
+    name = "sqlite"
+
+    def __init__(self, path=None):
+        self.path = Path(path or DB_PATH)
+
+    def _df(self, sql, params=(), columns=None):
+        con = sqlite3.connect(self.path)
+        try:
+            return pd.read_sql_query(sql, con, params=params)
+        except (sqlite3.Error, pd.errors.DatabaseError):  # table missing / empty database
+            return pd.DataFrame(columns=columns)
+        finally:
+            con.close()
+
+    def window(self, since=None):
+        """Every fix with ts >= since, ordered (mmsi, ts)."""
+        return self._df(WINDOW_SQL, (int(since or 0),), list(POSITION_COLS))
+
+    def latest(self, since=None):
+        """Latest fix per vessel within the window."""
+        return self._df(LATEST_SQL, (int(since or 0),), list(POSITION_COLS))
+
+    def deltas(self, since=None):
+        """Last fix plus the previous SOG/COG of vessels with two or more fixes in the window."""
+        return self._df(DELTAS_SQL, (int(since or 0),), DELTA_COLS)
+
+    def rollups(self, res="h", start=None, end=None, bbox=None, by=("class",)):
+        con = sqlite3.connect(self.path)
+        try:
+            return pd.DataFrame(rollups.query(con, res, start, end, bbox=bbox, by=by))
+        except sqlite3.OperationalError:
+            return pd.DataFrame()
+        finally:
+            con.close()
+
+
+class DuckDBBackend(SqliteBackend):
+    name = "duckdb"
+
+    def __init__(self, path=None, threads=0, archive=None):
+        super().__init__(path)
+        self.threads = int(threads or 0)
+        self.archive = archive
+        self.con = duckdb.connect()
+        if self.threads:
+            self.con.execute(f"SET threads = {self.threads}")
+        self._attach()
+        self._views()
+
+    def _attach(self):
+        self.con.execute("INSTALL sqlite; LOAD sqlite")
+        self.con.execute(f"ATTACH '{self.path.as_posix()}' AS db (TYPE sqlite, READ_ONLY)")
+
+    def _live_sql(self):
+        legacy = sqlite3.connect(self.path)
+        try:
+            if is_legacy(legacy):
+                return f"SELECT {COLS} FROM db.positions"
+        finally:
+            legacy.close()
+        return """
+            SELECT p.mmsi, p.ts, p.lat / 1e6 AS lat, p.lon / 1e6 AS lon,
+                   p.sog / 10.0 AS sog, p.cog / 10.0 AS cog, p.heading / 10.0 AS heading,
+                   p.draught / 10.0 AS draught, p.nav_status, s.name AS source
+              FROM db.positions_c p LEFT JOIN db.sources s ON s.id = p.source_id
+        """
+
+    def _views(self):
+        live = self._live_sql()
+        if self.archive:
+            glob = str(ROOT / self.archive)
+            # archive holds the older fixes; live rows start where it ends
+            live = f"""
+                SELECT {COLS} FROM read_parquet('{glob}')
+                UNION ALL
+                SELECT * FROM ({live}) WHERE ts > (SELECT COALESCE(max(ts), -1) FROM read_parquet('{glob}'))
+            """
+        self.con.execute(f"CREATE OR REPLACE VIEW positions AS {live}")
+
+    def _df(self, sql, params=(), columns=None):
+        cur = self.con.cursor()  # one cursor per call: Streamlit reruns run on several threads
+        try:
+            return cur.execute(sql, list(params)).df()
+        finally:
+            cur.close()
+
+    def rollups(self, res="h", start=None, end=None, bbox=None, by=("class",)):
+        """rollups.query with the bucket/cell scan and sums in DuckDB; sketches still merge in Python."""
+        if res not in rollups.RESOLUTIONS:
+            raise ValueError(f"res must be one of {sorted(rollups.RESOLUTIONS)}")
+        by = [k for k in ("class", "source") if k in by]
+        where, args = ["res = ?"], [res]
+        if bbox is not None:
+            ranges = cell_ranges(*bbox)
+            where.append("(" + " OR ".join("cell BETWEEN ? AND ?" for _ in ranges) + ")")
+            args += [c for r in ranges for c in r]
+        if start is not None:
+            where.append("bucket >= ?"); args.append(int(start) - int(start) % rollups.RESOLUTIONS[res])
+        if end is not None:
+            where.append("bucket <= ?"); args.append(int(end))
+        keys = ", ".join(["bucket"] + by)
+        df = self._df(f"""
+            SELECT {keys}, sum(fixes) AS fixes, sum(sog_sum) AS sog_sum, sum(sog_n) AS sog_n,
+                   list(vessels) AS sketches
+              FROM db.rollups WHERE {' AND '.join(where)} GROUP BY {keys} ORDER BY {keys}
+        """, args)
+        if df.empty:
+            return pd.DataFrame()
+        df["fixes"] = df["fixes"].astype("int64")
+        df["mean_sog"] = (df["sog_sum"] / df["sog_n"].where(df["sog_n"] > 0)).round(2)
+        df["vessels"] = [rollups.estimate(rollups.merge_many(bytes(b) for b in s)) for s in df["sketches"]]
+        return df[["bucket", *by, "fixes", "mean_sog", "vessels"]]
+
+
+def get_backend(engine=None, path=None, **overrides):
+    """Backend per the backend section of config.yaml (`engine`, overrides win), falling back to SQLite."""
+    opts = load_config()
+    opts.update({k: v for k, v in overrides.items() if v is not None})
+    engine = engine or opts["engine"]
+    if engine == "duckdb":
+        if duckdb is None:
+            print("[backend] duckdb is not installed; using sqlite")
+        else:
+            try:
+                return DuckDBBackend(path, threads=opts["threads"], archive=opts["archive"])
+            except Exception as e:
+                print(f"[backend] duckdb could not attach the database ({e}); using sqlite")
+    elif engine != "sqlite":
+        print(f"[backend] unknown engine {engine!r}; using sqlite")
+    return SqliteBackend(path)
@@ -0,0 +1,91 @@
+# src/classify.py
+"""
+Ship class inference shared by the dashboard and the maintenance scripts.
+
+Labels are 'Tanker' | 'Cargo' | None (unknown). AIS numeric type codes use the
+standard ranges (80–89 tanker, 70–79 cargo); free-text types are matched with
+precompiled keyword patterns. Series helpers classify each distinct value once.
+"""
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+TANKER = "Tanker"
+CARGO = "Cargo"
+
+TANKER_CODES = (80, 89)
+CARGO_CODES = (70, 79)
+
+# Ship-type strings: a tanker word wins over a cargo word ("oil/chemical cargo tanker")
+TANKER_WORDS = ("tanker", "vlcc", "suezmax", "aframax", "lr1", "lr2", "oil", "crude",
+                "lng", "lpg", "chem", "product")
+CARGO_WORDS = ("cargo", "bulk", "bulker", "container", "feeder", "handymax", "panamax",
+               "kamsarmax", "cape", "ro-ro", "boxship")
+
+_TANKER_RE = re.compile("|".join(re.escape(w) for w in TANKER_WORDS), re.I)
+_CARGO_RE = re.compile("|".join(re.escape(w) for w in CARGO_WORDS), re.I)
+
+
+def _code_class(code: int):
+    if TANKER_CODES[0] <= code <= TANKER_CODES[1]: return TANKER
+    if CARGO_CODES[0] <= code <= CARGO_CODES[1]: return CARGO
+    return None
+
+
+@lru_cache(maxsize=4096)
+def _classify_str(s: str):
+    s = s.strip()
+    if s.isdigit():
+        return _code_class(int(s))
+    if _TANKER_RE.search(s): return TANKER
+    if _CARGO_RE.search(s): return CARGO
+    return None
+
+
+def classify(val):
+    """Classify one ship_type value (AIS code or free text)."""
+    if val is None:
+        return None
+    if isinstance(val, str):
+        return _classify_str(val)
+    try:
+        if val != val:  # NaN / NA
+            return None
+        return _code_class(int(val))
+    except Exception:
+        return None
+
+
+def classify_series(ship_type: pd.Series) -> pd.Series:
+    """
+    Vectorized classify over a whole column. Numeric columns go through range masks;
+    anything else is factorized so each distinct value is classified once.
+    """
+    out = np.full(len(ship_type), None, dtype=object)
+    if len(ship_type) == 0:
+        return pd.Series(out, index=ship_type.index, dtype=object)
+
+    if pd.api.types.is_numeric_dtype(ship_type):
+        codes = ship_type.to_numpy(dtype="float64", na_value=np.nan)
+        out[(codes >= TANKER_CODES[0]) & (codes <= TANKER_CODES[1])] = TANKER
+        out[(codes >= CARGO_CODES[0]) & (codes <= CARGO_CODES[1])] = CARGO
+    else:
+        idx, uniques = pd.factorize(ship_type)
+        labels = np.array([classify(u) for u in uniques] + [None], dtype=object)
+        out = labels[idx]  # idx == -1 (missing) picks the trailing None
+    return pd.Series(out, index=ship_type.index, dtype=object)
+
+
+def classify_text(snippet: str):
+    """
+    Classify a free-text snippet (web pages, search results) by keyword hit counts.
+    Ties, including no hits at all, stay unknown.
+    """
+    s = (snippet or "").lower()
+    t_hits = sum(1 for w in TANKER_WORDS if w in s)
+    c_hits = sum(1 for w in CARGO_WORDS if w in s)
+    if t_hits > c_hits: return TANKER
+    if c_hits > t_hits: return CARGO
+    return None
@@ -1,9 +1,15 @@
-import sqlite3
+import json, sqlite3, time
 from pathlib import Path
 
+from . import metrics, rollups
+from .gaps import SCHEMA as GAPS_SCHEMA
+from .geofence import SCHEMA as GEOFENCE_SCHEMA, default_engine
+from .proximity import SCHEMA as PROXIMITY_SCHEMA
+from .spatial import SCHEMA as SPATIAL_SCHEMA, index_positions
+
 DB_PATH = Path(__file__).resolve().parents[1] / "tanker.db"
 
-SCHEMA = '''
+BASE_SCHEMA = '''
 PRAGMA journal_mode=WAL;
 CREATE TABLE IF NOT EXISTS ships(
   mmsi INTEGER PRIMARY KEY,
@@ -15,6 +21,52 @@ CREATE TABLE IF NOT EXISTS ships(
   company TEXT,
   cargo TEXT
 );
+CREATE TABLE IF NOT EXISTS alerts(
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  ts INTEGER, mmsi INTEGER, kind TEXT, message TEXT
+);
+'''
+
+# Compact layout: one clustered b-tree on (mmsi, ts, source_id), source names in a
+# dictionary, coordinates as integer micro-degrees and sog/cog/heading/draught as
+# integer tenths. The `positions` view decodes it, so readers see the old columns;
+# inserts into the view go through a trigger, write_positions writes the table directly.
+COORD_SCALE = 1_000_000
+TENTHS = 10
+UNKNOWN_SOURCE = "unknown"
+
+POSITIONS_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS sources(
+  id INTEGER PRIMARY KEY,
+  name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS positions_c(
+  mmsi INTEGER NOT NULL, ts INTEGER NOT NULL, source_id INTEGER NOT NULL,
+  lat INTEGER, lon INTEGER, sog INTEGER, cog INTEGER, heading INTEGER, draught INTEGER,
+  nav_status INTEGER,
+  PRIMARY KEY (mmsi, ts, source_id)
+) WITHOUT ROWID;
+CREATE VIEW IF NOT EXISTS positions AS
+  SELECT p.mmsi AS mmsi, p.ts AS ts,
+         p.lat / 1e6 AS lat, p.lon / 1e6 AS lon,
+         p.sog / 10.0 AS sog, p.cog / 10.0 AS cog, p.heading / 10.0 AS heading, p.draught / 10.0 AS draught,
+         p.nav_status AS nav_status, s.name AS source
+    FROM positions_c p LEFT JOIN sources s ON s.id = p.source_id;
+CREATE TRIGGER IF NOT EXISTS positions_insert INSTEAD OF INSERT ON positions
+BEGIN
+  INSERT OR IGNORE INTO sources(name) VALUES (COALESCE(NEW.source, 'unknown'));
+  INSERT OR IGNORE INTO positions_c(mmsi, ts, source_id, lat, lon, sog, cog, heading, draught, nav_status)
+  VALUES (NEW.mmsi, NEW.ts, (SELECT id FROM sources WHERE name = COALESCE(NEW.source, 'unknown')),
+          CAST(round(NEW.lat * 1e6) AS INTEGER), CAST(round(NEW.lon * 1e6) AS INTEGER),
+          CAST(round(NEW.sog * 10) AS INTEGER), CAST(round(NEW.cog * 10) AS INTEGER),
+          CAST(round(NEW.heading * 10) AS INTEGER), CAST(round(NEW.draught * 10) AS INTEGER),
+          NEW.nav_status);
+END;
+'''
+
+# Original row-per-REAL layout. src.migrations converts databases still on it;
+# kept for scripts/bench_positions_layout.py.
+LEGACY_POSITIONS_SCHEMA = '''
 CREATE TABLE IF NOT EXISTS positions(
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   mmsi INTEGER, ts INTEGER, lat REAL, lon REAL,
@@ -23,18 +75,110 @@ CREATE TABLE IF NOT EXISTS positions(
   UNIQUE(mmsi, ts, source)
 );
 CREATE INDEX IF NOT EXISTS idx_positions_mmsi_ts ON positions(mmsi, ts);
-CREATE TABLE IF NOT EXISTS alerts(
-  id INTEGER PRIMARY KEY AUTOINCREMENT,
-  ts INTEGER, mmsi INTEGER, kind TEXT, message TEXT
-);
 '''
 
+# Whole schema as one script, for throwaway benchmark databases; tanker.db is created
+# and upgraded by src.migrations (init_db / ensure_tables).
+SCHEMA = BASE_SCHEMA + POSITIONS_SCHEMA + SPATIAL_SCHEMA + GEOFENCE_SCHEMA + PROXIMITY_SCHEMA + GAPS_SCHEMA + rollups.SCHEMA
+LEGACY_SCHEMA = BASE_SCHEMA + LEGACY_POSITIONS_SCHEMA + SPATIAL_SCHEMA + GEOFENCE_SCHEMA + PROXIMITY_SCHEMA + GAPS_SCHEMA + rollups.SCHEMA
+
 def get_conn():
-  return sqlite3.connect(DB_PATH)
+  con = sqlite3.connect(DB_PATH)
+  rollups.register(con)
+  return con
+
+def is_legacy(con):
+  """True while `positions` is still the original table rather than the compact view."""
+  row = con.execute("SELECT type FROM sqlite_master WHERE name = 'positions'").fetchone()
+  return bool(row) and row[0] == "table"
 
 def init_db():
-  con = get_conn(); cur = con.cursor()
-  cur.executescript(SCHEMA); con.commit(); con.close()
+  """Bring tanker.db up to the current schema (src.migrations); call once at startup."""
+  con = get_conn(); ensure_tables(con); con.close()
 
 def ensure_tables(con):
-  con.executescript(SCHEMA); con.commit()
+  from .migrations import migrate
+  migrate(con)
+
+POSITION_COLS = ("mmsi", "ts", "lat", "lon", "sog", "cog", "heading", "draught", "nav_status", "source")
+COMPACT_COLS = ("mmsi", "ts", "source_id", "lat", "lon", "sog", "cog", "heading", "draught", "nav_status")
+
+def source_ids(con, names):
+  """{name: id} from the sources dictionary, adding names not seen before."""
+  names = sorted({n or UNKNOWN_SOURCE for n in names})
+  con.executemany("INSERT OR IGNORE INTO sources(name) VALUES (?)", [(n,) for n in names])
+  return dict(con.execute("SELECT name, id FROM sources WHERE name IN (SELECT value FROM json_each(?))",
+                          (json.dumps(names),)).fetchall())
+
+def _scaled(v, k):
+  return None if v is None else int(round(float(v) * k))
+
+def compact_rows(con, rows):
+  """POSITION_COLS tuples -> COMPACT_COLS tuples (scaled ints, source ids)."""
+  ids = source_ids(con, {r[9] for r in rows})
+  return [(mmsi, ts, ids[src or UNKNOWN_SOURCE],
+           _scaled(lat, COORD_SCALE), _scaled(lon, COORD_SCALE),
+           _scaled(sog, TENTHS), _scaled(cog, TENTHS), _scaled(heading, TENTHS), _scaled(draught, TENTHS), nav)
+          for mmsi, ts, lat, lon, sog, cog, heading, draught, nav, src in rows]
+
+def insert_positions(con, rows, ships=None, dedupe=True):
+  """
+  write_positions without the commit (for callers that batch several writes into one
+  transaction, e.g. src.ingest.writer_service). Returns (new rows, rows kept by the filter).
+  """
+  if dedupe and rows:
+    from .trackfilter import default_filter
+    rows = default_filter().filter(rows, con)
+  if ships:
+    con.executemany("INSERT OR IGNORE INTO ships(mmsi, ship_type, name) VALUES(?,?,?)", ships)
+  if is_legacy(con):
+    table, cols, values = "positions", POSITION_COLS, rows
+  else:
+    table, cols, values = "positions_c", COMPACT_COLS, compact_rows(con, rows) if rows else []
+  sql = f"""INSERT OR IGNORE INTO {table}({", ".join(cols)}) VALUES ({",".join("?" * len(cols))})"""
+  stored = []  # rows actually inserted: rollups count stored fixes, not re-ingested duplicates
+  for r, v in zip(rows, values):
+    before = con.total_changes
+    con.execute(sql, v)
+    if con.total_changes != before:
+      stored.append(r)
+  n = len(stored)
+  index_positions(con, rows)
+  rollups.update(con, stored)
+  fences = default_engine()
+  if fences is not None:
+    fences.evaluate(con, rows)
+  return n, rows
+
+def rollback_positions(con, rows):
+  """
+  Roll back a failed insert_positions transaction. The track filter and the geofence
+  engine already advanced their in-memory state for these vessels; drop it so it is
+  reloaded from what was committed (otherwise a retry would judge the rows against fixes
+  that were never stored, and the geofence alerts of the rolled-back batch would be lost).
+  """
+  con.rollback()
+  from .trackfilter import default_filter
+  mmsis = {r[0] for r in rows}
+  default_filter().forget(mmsis)
+  fences = default_engine()
+  if fences is not None:
+    fences.forget(mmsis)
+
+def write_positions(con, rows, ships=None, dedupe=True):
+  """
+  Insert position tuples (POSITION_COLS order) and optional ships(mmsi, ship_type, name)
+  stubs in a single transaction. With dedupe, reports inside the vessel's dead-band
+  (see src.trackfilter) are dropped first. The spatial index (src.spatial), rollups
+  (src.rollups) and geofence alerts (src.geofence) are updated in the same transaction.
+  Returns the number of new position rows.
+  """
+  t0 = time.perf_counter()
+  try:
+    n, kept = insert_positions(con, rows, ships, dedupe)
+    con.commit()
+  except Exception:
+    rollback_positions(con, rows)
+    raise
+  metrics.record_write(len(rows), kept, n, time.perf_counter() - t0)
+  return n
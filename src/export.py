@@ -0,0 +1,149 @@
+# src/export.py
+"""
+Streaming bulk export of positions and alerts.
+
+    cur, fields = positions_cursor(con, start, end, mmsis=[...], bbox=(lat_min, lat_max, lon_min, lon_max))
+    for chunk in stream(cur, fields, "csv", "gzip"):
+        out.write(chunk)
+
+Rows come off one SQLite cursor CHUNK_ROWS at a time and each chunk is encoded (and
+compressed) before the next is fetched, so memory stays flat however large the export.
+Positions are read in the clustered (mmsi, ts) order of positions_c, which needs no sort.
+There is no index on ts alone (it would cost every write), so an export filtered only
+by time reads the whole table; an MMSI list or a bbox (narrowed through track_cells)
+probes just those vessels' keys. A bbox range older than the spatial index keeps
+(spatial.track_days) is filtered row by row.
+Formats: csv, ndjson, parquet (pyarrow; one row group per chunk). Compression: gzip or
+zstd (the zstandard package) around csv/ndjson; for parquet it selects the column codec.
+Used by the API's /export endpoints and scripts/export.py.
+"""
+import csv, io, json, sqlite3, time, zlib
+
+from . import arrowio
+from .spatial import horizon, vessels_in_bbox
+
+try:
+    import zstandard
+except ImportError:  # gzip only
+    zstandard = None
+
+CHUNK_ROWS = 50000
+
+FORMATS = {"csv": ("text/csv", ".csv"), "ndjson": ("application/x-ndjson", ".ndjson"),
+           "parquet": ("application/vnd.apache.parquet", ".parquet")}
+COMPRESSIONS = {"gzip": ("application/gzip", ".gz"), "zstd": ("application/zstd", ".zst")}
+
+POSITION_FIELDS = [("mmsi", "int"), ("ts", "int"), ("lat", "float"), ("lon", "float"), ("sog", "float"),
+                   ("cog", "float"), ("heading", "float"), ("draught", "float"), ("nav_status", "int"),
+                   ("source", "str")]
+ALERT_FIELDS = [("id", "int"), ("ts", "int"), ("mmsi", "int"), ("kind", "str"), ("message", "str")]
+
+
+def check(fmt, compression=None):
+    """ValueError when this format/compression cannot be produced here."""
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {sorted(FORMATS)}")
+    if compression is not None and compression not in COMPRESSIONS:
+        raise ValueError(f"compression must be one of {sorted(COMPRESSIONS)}")
+    if fmt == "parquet" and not arrowio.available():
+        raise ValueError("parquet needs pyarrow (pip install pyarrow)")
+    if compression == "zstd" and fmt != "parquet" and zstandard is None:
+        raise ValueError("zstd needs the zstandard package (pip install zstandard)")
+
+
+def filename(kind, fmt, compression=None):
+    name = f"{kind}-{time.strftime('%Y%m%d-%H%M%S', time.gmtime())}{FORMATS[fmt][1]}"
+    return name + COMPRESSIONS[compression][1] if compression and fmt != "parquet" else name
+
+
+def media_type(fmt, compression=None):
+    return COMPRESSIONS[compression][0] if compression and fmt != "parquet" else FORMATS[fmt][0]
+
+
+# ------------------------------------------------------------
+# Queries
+# ------------------------------------------------------------
+def positions_cursor(con, start=None, end=None, mmsis=None, bbox=None):
+    """Cursor over positions (POSITION_FIELDS) in the range, MMSI set and/or bbox; plus the fields."""
+    where, args = ["p.ts BETWEEN ? AND ?"], [int(start or 0), int(end if end is not None else 2**62)]
+    if bbox is not None:
+        lat_min, lat_max, lon_min, lon_max = bbox
+        try:  # narrow to the vessels the spatial index saw there, if it reaches back to start
+            cutoff = horizon()
+            seen = vessels_in_bbox(con, lat_min, lat_max, lon_min, lon_max, *args) \
+                if cutoff is None or args[0] >= cutoff else None
+            if seen or (seen is not None and con.execute("SELECT 1 FROM track_cells LIMIT 1").fetchone()):
+                mmsis = seen if mmsis is None else sorted(set(seen) & set(mmsis))
+            # else the index was never built (scripts/build_spatial_index.py) or is pruned: filter every row
+        except sqlite3.OperationalError:  # no spatial index tables: filter every row
+            pass
+        where.append("p.lat BETWEEN ? AND ?"); args += [lat_min, lat_max]
+        # lon_min > lon_max crosses the antimeridian
+        where.append("p.lon BETWEEN ? AND ?" if lon_min <= lon_max else "(p.lon >= ? OR p.lon <= ?)")
+        args += [lon_min, lon_max]
+    if mmsis is not None:
+        # IN (subquery) probes the (mmsi, ts) key in order: no sort, rows stream as found
+        where.append("p.mmsi IN (SELECT value FROM json_each(?))")
+        args.append(json.dumps(sorted(int(m) for m in mmsis)))
+    cols = ", ".join(f"p.{name}" for name, _ in POSITION_FIELDS)
+    cur = con.execute(f"SELECT {cols} FROM positions p WHERE {' AND '.join(where)} ORDER BY p.mmsi, p.ts", args)
+    return cur, POSITION_FIELDS
+
+
+def alerts_cursor(con, start=None, end=None, mmsis=None, kinds=None):
+    """Cursor over alerts (ALERT_FIELDS) in id order; plus the fields."""
+    where, args = ["1=1"], []
+    if start is not None:
+        where.append("ts >= ?"); args.append(int(start))
+    if end is not None:
+        where.append("ts <= ?"); args.append(int(end))
+    if mmsis is not None:
+        where.append("mmsi IN (SELECT value FROM json_each(?))"); args.append(json.dumps([int(m) for m in mmsis]))
+    if kinds:
+        where.append("kind IN (SELECT value FROM json_each(?))"); args.append(json.dumps(list(kinds)))
+    cols = ", ".join(name for name, _ in ALERT_FIELDS)
+    return con.execute(f"SELECT {cols} FROM alerts WHERE {' AND '.join(where)} ORDER BY id", args), ALERT_FIELDS
+
+
+# ------------------------------------------------------------
+# Encoding
+# ------------------------------------------------------------
+def _csv(cur, fields, chunk_rows):
+    buf = io.StringIO()
+    w = csv.writer(buf, lineterminator="\n")
+    w.writerow([name for name, _ in fields])
+    while True:
+        rows = cur.fetchmany(chunk_rows)
+        w.writerows(rows)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0); buf.truncate()
+        if not rows:
+            return
+
+
+def _ndjson(cur, fields, chunk_rows):
+    names = [name for name, _ in fields]
+    dumps = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False).encode
+    while True:
+        rows = cur.fetchmany(chunk_rows)
+        if not rows:
+            return
+        yield "".join(dumps(dict(zip(names, r))) + "\n" for r in rows).encode("utf-8")
+
+
+def _compressed(chunks, compression):
+    z = zlib.compressobj(6, zlib.DEFLATED, 31) if compression == "gzip" else zstandard.ZstdCompressor().compressobj()
+    for chunk in chunks:
+        out = z.compress(chunk)
+        if out:
+            yield out
+    yield z.flush()
+
+
+def stream(cur, fields, fmt="csv", compression=None, chunk_rows=CHUNK_ROWS):
+    """Yield the encoded export of cur chunk by chunk (see check() for what is supported)."""
+    check(fmt, compression)
+    if fmt == "parquet":
+        return arrowio.stream_parquet(cur, arrowio.schema(fields), compression, chunk_rows)
+    chunks = (_csv if fmt == "csv" else _ndjson)(cur, fields, chunk_rows)
+    return _compressed(chunks, compression) if compression else chunks
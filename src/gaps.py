@@ -0,0 +1,232 @@
+# src/gaps.py
+"""
+AIS gap ("going dark") detection.
+
+Each tracked vessel has a slot in flat numpy arrays (last fix ts / lat / lon, threshold,
+dark-since). A heap of (deadline, slot) orders the vessels by when they become
+overdue. Heap entries are not removed when a newer fix arrives; a popped entry whose
+deadline no longer matches last_ts + threshold is simply skipped. A timer tick is
+then O(vessels that went dark) and never touches `positions`.
+
+New fixes come from latest_positions rows written since the last poll: the watermark
+is the ingest-side updated_at (idx_latest_updated), not the fix ts, so a fix that
+arrives late (a scraped position behind the live stream) is still seen. Thresholds are
+per watchlist.class (gaps.class_hours in config.yaml). A vessel going dark yields an
+`ais_dark` alert and an open ais_gaps row with the last position. Its next fix yields
+`ais_reappeared` and closes the row with the new position.
+"""
+import heapq, json, time
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+from . import metrics
+
+ROOT = Path(__file__).resolve().parents[1]
+CFG_PATH = ROOT / "config.yaml"
+
+DEFAULTS = {
+    "default_hours": 6.0,
+    "class_hours": {"Tanker": 3.0, "Cargo": 6.0, "Other": 12.0},
+    "watchlist_only": True,   # track only watchlist vessels (their class picks the threshold)
+    "stale_days": 7,          # fixes older than this at startup are not alerted as new gaps
+    "interval_s": 60,         # scripts/run_gaps.py --loop
+}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS ais_gaps(
+  mmsi INTEGER NOT NULL, start_ts INTEGER NOT NULL, start_lat REAL, start_lon REAL,
+  end_ts INTEGER, end_lat REAL, end_lon REAL, threshold_s INTEGER,
+  PRIMARY KEY (mmsi, start_ts)
+) WITHOUT ROWID;
+'''
+
+LATE_S = 300      # re-read this much behind the watermark: transactions that committed late
+SILENT = -1       # dark_since marker: already dark at startup, no alert
+
+
+def load_config():
+    opts = dict(DEFAULTS)
+    try:
+        opts.update(yaml.safe_load(open(CFG_PATH, "r", encoding="utf-8")).get("gaps") or {})
+    except Exception:
+        pass
+    return opts
+
+
+class GapDetector:
+    def __init__(self, default_hours=6.0, class_hours=None, watchlist_only=True, stale_days=7, **_):
+        self.default_s = int(float(default_hours) * 3600)
+        self.class_s = {k: int(float(v) * 3600) for k, v in (class_hours or {}).items()}
+        self.watchlist_only = watchlist_only
+        self.stale_s = int(float(stale_days) * 86400)
+        self.classes = {}        # mmsi -> watchlist class
+        self.slot = {}           # mmsi -> index into the arrays
+        self.n = 0
+        self.mmsi = np.zeros(1024, dtype=np.int64)
+        self.last_ts = np.zeros(1024, dtype=np.int64)
+        self.lat = np.full(1024, np.nan)
+        self.lon = np.full(1024, np.nan)
+        self.thr = np.zeros(1024, dtype=np.int64)
+        self.dark_since = np.zeros(1024, dtype=np.int64)   # 0 = reporting, SILENT, or deadline it went dark
+        self.heap = []
+        self.watermark = None    # latest_positions.updated_at read so far; None: read everything
+
+    # ---- state ------------------------------------------------------------
+    def threshold(self, mmsi):
+        return self.class_s.get(self.classes.get(mmsi), self.default_s)
+
+    def tracked(self, mmsi):
+        return not self.watchlist_only or mmsi in self.classes
+
+    def _slot(self, mmsi):
+        if not self.tracked(mmsi):
+            return None
+        s = self.slot.get(mmsi)
+        if s is None:
+            if self.n == len(self.mmsi):
+                for name in ("mmsi", "last_ts", "thr", "dark_since"):
+                    a = getattr(self, name)
+                    setattr(self, name, np.concatenate([a, np.zeros_like(a)]))
+                for name in ("lat", "lon"):
+                    a = getattr(self, name)
+                    setattr(self, name, np.concatenate([a, np.full_like(a, np.nan)]))
+            s = self.slot[mmsi] = self.n
+            self.n += 1
+            self.mmsi[s] = mmsi
+            self.thr[s] = self.threshold(mmsi)
+        return s
+
+    def _push(self, s):
+        heapq.heappush(self.heap, (int(self.last_ts[s] + self.thr[s]), s))
+        if len(self.heap) > 4 * self.n + 1024:  # drop superseded entries
+            live = np.nonzero(self.dark_since[:self.n] == 0)[0]
+            self.heap = list(zip((self.last_ts[live] + self.thr[live]).tolist(), live.tolist()))
+            heapq.heapify(self.heap)
+
+    def set_classes(self, classes):
+        """Watchlist {mmsi: class}; re-times vessels whose threshold changed. Returns new MMSIs."""
+        new = set(classes) - set(self.classes)
+        self.classes = dict(classes)
+        for m, s in self.slot.items():
+            t = self.threshold(m)
+            if t != self.thr[s]:
+                self.thr[s] = t
+                if self.dark_since[s] == 0:
+                    self._push(s)
+        return new
+
+    # ---- events -----------------------------------------------------------
+    def observe(self, rows):
+        """(mmsi, ts, lat, lon) fixes -> reappeared events for vessels that were dark."""
+        events = []
+        for mmsi, ts, lat, lon in rows:
+            s = self._slot(mmsi)
+            if s is None or ts is None or ts <= self.last_ts[s]:
+                continue
+            if self.dark_since[s]:
+                events.append(("reappeared", int(mmsi), int(self.last_ts[s]), float(self.lat[s]), float(self.lon[s]),
+                               int(ts), lat, lon, int(self.thr[s])))
+                self.dark_since[s] = 0
+            self.last_ts[s] = ts
+            self.lat[s] = np.nan if lat is None else lat
+            self.lon[s] = np.nan if lon is None else lon
+            self._push(s)
+        return events
+
+    def tick(self, now):
+        """Vessels whose deadline passed since the last tick -> dark events."""
+        events = []
+        while self.heap and self.heap[0][0] <= now:
+            deadline, s = heapq.heappop(self.heap)
+            if self.dark_since[s] or self.last_ts[s] + self.thr[s] != deadline:
+                continue  # superseded by a newer fix or threshold
+            if not self.tracked(int(self.mmsi[s])):
+                continue  # dropped from the watchlist
+            self.dark_since[s] = deadline
+            events.append(("dark", int(self.mmsi[s]), int(self.last_ts[s]), float(self.lat[s]), float(self.lon[s]),
+                           None, None, None, int(self.thr[s])))
+        return events
+
+    def dark_count(self):
+        return int(np.count_nonzero(self.dark_since[:self.n]))
+
+    # ---- database ---------------------------------------------------------
+    def prime(self, con, now):
+        """Startup: open gaps from ais_gaps, then every vessel's latest fix."""
+        for m, start_ts, lat, lon in con.execute(
+                "SELECT mmsi, start_ts, start_lat, start_lon FROM ais_gaps WHERE end_ts IS NULL"):
+            s = self._slot(m)
+            if s is not None:
+                self.last_ts[s], self.lat[s], self.lon[s] = start_ts, lat, lon
+                self.dark_since[s] = start_ts + self.thr[s]
+        events = self.poll(con)   # vessels that came back while we were down
+        self._silence_stale(range(self.n), now)
+        return events
+
+    def _silence_stale(self, slots, now):
+        for s in slots:
+            if self.dark_since[s] == 0 and self.last_ts[s] < now - self.stale_s:
+                self.dark_since[s] = SILENT  # long gone before we knew it: alert only when it reappears
+
+    def refresh_watchlist(self, con, now):
+        """Reload watchlist classes; vessels new to it start from their latest fix."""
+        new = self.set_classes(watchlist_classes(con))
+        if not new:
+            return []
+        rows = con.execute("SELECT mmsi, ts, lat, lon FROM latest_positions "
+                           "WHERE mmsi IN (SELECT value FROM json_each(?))", (json.dumps(sorted(new)),)).fetchall()
+        events = self.observe(rows)
+        self._silence_stale([self.slot[m] for m in new if m in self.slot], now)
+        return events
+
+    def poll(self, con):
+        """Vessels whose latest fix was written since the last poll (latest_positions.updated_at)."""
+        sql = "SELECT mmsi, ts, lat, lon, updated_at FROM latest_positions"
+        if self.watermark is None:
+            rows = con.execute(sql).fetchall()
+        else:
+            rows = con.execute(sql + " WHERE updated_at >= ?", (self.watermark - LATE_S,)).fetchall()
+        stamps = [r[4] for r in rows if r[4] is not None]
+        self.watermark = max([self.watermark or 0] + stamps)
+        return self.observe([r[:4] for r in rows])
+
+def _num(v):
+    return None if v is None or v != v else v
+
+
+def _pos(lat, lon):
+    return "unknown position" if lat is None or lon is None else f"{lat:.4f},{lon:.4f}"
+
+
+def statements(events):
+    """ais_gaps rows + alerts for events, as [(sql, [params, ...]), ...] for the writer service."""
+    gaps, alerts = [], []
+    for kind, mmsi, start_ts, lat0, lon0, end_ts, lat1, lon1, thr in events:
+        gaps.append((mmsi, start_ts, lat0, lon0, end_ts, lat1, lon1, thr))
+        lat0, lon0 = _num(lat0), _num(lon0)
+        since = time.strftime("%Y-%m-%d %H:%M", time.gmtime(start_ts))
+        if kind == "dark":
+            alerts.append((start_ts + thr, mmsi, "ais_dark",
+                           f"no position for {thr / 3600:.1f} h; last seen {since} UTC at {_pos(lat0, lon0)}"))
+        else:
+            alerts.append((end_ts, mmsi, "ais_reappeared",
+                           f"reappeared after {(end_ts - start_ts) / 3600:.1f} h dark: "
+                           f"{_pos(lat0, lon0)} ({since} UTC) -> {_pos(lat1, lon1)}"))
+        metrics.inc("tracker_gap_events_total", kind=kind)
+    if not gaps:
+        return []
+    return [("""
+        INSERT INTO ais_gaps(mmsi, start_ts, start_lat, start_lon, end_ts, end_lat, end_lon, threshold_s)
+        VALUES (?,?,?,?,?,?,?,?)
+        ON CONFLICT(mmsi, start_ts) DO UPDATE SET
+          end_ts=excluded.end_ts, end_lat=excluded.end_lat, end_lon=excluded.end_lon
+    """, gaps), ("INSERT INTO alerts(ts, mmsi, kind, message) VALUES (?,?,?,?)", alerts)]
+
+
+def watchlist_classes(con):
+    try:
+        return {m: c for m, c in con.execute("SELECT mmsi, class FROM watchlist")}
+    except Exception:
+        return {}
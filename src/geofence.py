@@ -0,0 +1,328 @@
+# src/geofence.py
+"""
+Geofences evaluated at ingest.
+
+Polygons come from the GeoJSON files listed under `geofences:` in config.yaml (plus,
+with include_regions, the boxes under `regions:`). Every batch stored by
+src.db.write_positions is tested against them, and enter / exit / dwell events go to
+`alerts` with kind geofence_enter / geofence_exit / geofence_dwell.
+
+The lookup is a grid of cell_deg cells, built once. Each cell lists the fences that
+touch it. A fence is flagged "inside" when the cell lies wholly within it, so no test
+is needed. Otherwise it is "boundary": we keep the fence edges that cross the cell and
+whether a reference point in the cell is inside. A fix is then inside iff the segment
+from the fix to the reference point crosses an odd number of those edges. Per-point
+work is limited to the few edges in its cell, and a whole batch is one numpy pass.
+
+Per-vessel state (which fences, since when, dwell alerted) lives in geofence_state. It
+is written in the same transaction as the positions, so a restart does not re-alert.
+The in-memory copy runs ahead of the commit; src.db.rollback_positions drops it for the
+vessels of a rolled-back batch, so they are reloaded and their transitions re-detected.
+"""
+import json
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+from . import metrics
+
+ROOT = Path(__file__).resolve().parents[1]
+CFG_PATH = ROOT / "config.yaml"
+
+DEFAULTS = {
+    "enabled": True,
+    "files": [],              # GeoJSON Polygon/MultiPolygon features; properties.name, .dwell_min
+    "include_regions": True,  # also fence the `regions:` boxes
+    "dwell_min": 120,         # dwell alert after this long inside (per-feature override)
+    "cell_deg": 0.25,         # grid cell size of the prefilter
+}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS geofence_state(
+  mmsi INTEGER NOT NULL, fence TEXT NOT NULL,
+  entered_ts INTEGER, dwell_alerted INTEGER DEFAULT 0,
+  PRIMARY KEY (mmsi, fence)
+) WITHOUT ROWID;
+'''
+
+REF_FRAC = (0.4142, 0.5773)  # reference point inside each cell, off-centre to dodge grid-aligned vertices
+
+
+class Fence:
+    __slots__ = ("name", "rings", "dwell_s")
+
+    def __init__(self, name, rings, dwell_s=None):
+        self.name = name
+        self.rings = [_closed(np.asarray(r, dtype=float)[:, :2]) for r in rings]  # (n, 2) lon, lat
+        self.dwell_s = dwell_s
+
+    def edges(self):
+        return np.concatenate([np.hstack([r[:-1], r[1:]]) for r in self.rings])  # x1, y1, x2, y2
+
+
+def _closed(ring):
+    return ring if len(ring) and np.array_equal(ring[0], ring[-1]) else np.vstack([ring, ring[:1]])
+
+
+def _polygons(geom):
+    t, coords = geom.get("type"), geom.get("coordinates") or []
+    if t == "Polygon":
+        return [coords]
+    if t == "MultiPolygon":
+        return coords
+    if t == "GeometryCollection":
+        return [p for g in geom.get("geometries") or [] for p in _polygons(g)]
+    return []
+
+
+def load_fences(opts):
+    """Fence list from the configured GeoJSON files and, optionally, the `regions:` boxes."""
+    fences, seen = [], Counter()
+    default_dwell = opts.get("dwell_min")
+
+    def add(name, rings, dwell_min):
+        seen[name] += 1
+        if seen[name] > 1:
+            name = f"{name} ({seen[name]})"
+        fences.append(Fence(name, rings, dwell_min * 60 if dwell_min else None))
+
+    for f in opts.get("files") or []:
+        path = Path(f) if Path(f).is_absolute() else ROOT / f
+        try:
+            gj = json.load(open(path, "r", encoding="utf-8"))
+        except Exception as e:
+            print(f"[geofence] cannot read {path}: {e}")
+            continue
+        feats = gj.get("features") if gj.get("type") == "FeatureCollection" else [gj]
+        for i, feat in enumerate(feats or []):
+            props = feat.get("properties") or {}
+            rings = [r for poly in _polygons(feat.get("geometry") or feat) for r in poly if len(r) >= 3]
+            if rings:
+                add(str(props.get("name") or f"{path.stem}#{i}"), rings, props.get("dwell_min", default_dwell))
+    if opts.get("include_regions"):
+        for name, (lat0, lat1, lon0, lon1) in (opts.get("regions") or {}).items():
+            add(name, [[[lon0, lat0], [lon1, lat0], [lon1, lat1], [lon0, lat1]]], default_dwell)
+    return fences
+
+
+def _orient(ax, ay, bx, by, cx, cy):
+    return (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+
+
+def _crosses(px, py, rx, ry, e):
+    """Segment (p, r) strictly crosses edge e = (x1, y1, x2, y2); all arguments broadcast."""
+    x1, y1, x2, y2 = e[..., 0], e[..., 1], e[..., 2], e[..., 3]
+    return (((_orient(x1, y1, x2, y2, px, py) > 0) != (_orient(x1, y1, x2, y2, rx, ry) > 0))
+            & ((_orient(px, py, rx, ry, x1, y1) > 0) != (_orient(px, py, rx, ry, x2, y2) > 0)))
+
+
+def _inside(px, py, edges):
+    """Even-odd point-in-polygon (crossing number) for points px, py against all edges."""
+    x1, y1, x2, y2 = (edges[:, i][None, :] for i in range(4))
+    px, py = px[:, None], py[:, None]
+    straddle = (y1 > py) != (y2 > py)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        xi = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+    return ((straddle & (px < xi)).sum(axis=1) % 2).astype(bool)
+
+
+def _expand(start, count):
+    """Concatenated ranges start[i] .. start[i] + count[i]."""
+    total = int(count.sum())
+    if not total:
+        return np.zeros(0, dtype=np.int64)
+    offs = np.repeat(np.cumsum(count) - count, count)
+    return np.repeat(start, count) + (np.arange(total) - offs)
+
+
+class FenceIndex:
+    """Grid prefilter + boundary-edge lists for a fixed set of fences."""
+
+    def __init__(self, fences, cell_deg=0.25):
+        self.fences = fences
+        self.cell_deg = float(cell_deg)
+        self.n_cols = int(round(360 / self.cell_deg))
+        self.n_rows = int(round(180 / self.cell_deg))
+        p_cell, p_fence, p_full, p_ref, p_e0, p_en, pair_edges = [], [], [], [], [], [], []
+        n_edges = 0
+        for fi, fence in enumerate(fences):
+            edges = fence.edges()
+            # cells touched by each edge's bbox -> boundary cells and their edges
+            boundary = {}
+            r0s, r1s = self._rows(np.minimum(edges[:, 1], edges[:, 3])), self._rows(np.maximum(edges[:, 1], edges[:, 3]))
+            c0s, c1s = self._cols(np.minimum(edges[:, 0], edges[:, 2])), self._cols(np.maximum(edges[:, 0], edges[:, 2]))
+            for ei in range(len(edges)):
+                for r in range(r0s[ei], r1s[ei] + 1):
+                    for c in range(c0s[ei], c1s[ei] + 1):
+                        boundary.setdefault(r * self.n_cols + c, []).append(ei)
+            # every cell of the fence bbox: classify by a reference point
+            rr = np.arange(r0s.min(), r1s.max() + 1)
+            cc = np.arange(c0s.min(), c1s.max() + 1)
+            cells = (rr[:, None] * self.n_cols + cc[None, :]).ravel()
+            rx, ry = self._ref(cells)
+            inside = np.zeros(len(cells), dtype=bool)
+            for s in range(0, len(cells), 4096):  # bounded points x edges matrices
+                inside[s:s + 4096] = _inside(rx[s:s + 4096], ry[s:s + 4096], edges)
+            for cell, ins in zip(cells.tolist(), inside.tolist()):
+                eids = boundary.get(cell)
+                if eids is None and not ins:
+                    continue  # wholly outside
+                p_cell.append(cell); p_fence.append(fi); p_ref.append(ins)
+                p_full.append(eids is None)
+                p_e0.append(n_edges); p_en.append(len(eids or ()))
+                if eids:
+                    pair_edges.append(edges[eids]); n_edges += len(eids)
+        order = np.argsort(np.asarray(p_cell, dtype=np.int64), kind="stable")
+        self.p_cell = np.asarray(p_cell, dtype=np.int64)[order]
+        self.p_fence = np.asarray(p_fence, dtype=np.int64)[order]
+        self.p_full = np.asarray(p_full, dtype=bool)[order]
+        self.p_ref = np.asarray(p_ref, dtype=bool)[order]
+        self.p_e0 = np.asarray(p_e0, dtype=np.int64)[order]
+        self.p_en = np.asarray(p_en, dtype=np.int64)[order]
+        self.edges = np.concatenate(pair_edges) if pair_edges else np.zeros((0, 4))
+        self.cells, self.c_start, self.c_count = np.unique(self.p_cell, return_index=True, return_counts=True)
+
+    def _rows(self, lat):
+        return np.clip(((np.asarray(lat) + 90.0) // self.cell_deg).astype(np.int64), 0, self.n_rows - 1)
+
+    def _cols(self, lon):
+        return (((np.asarray(lon) + 180.0) % 360.0) // self.cell_deg).astype(np.int64)
+
+    def _ref(self, cells):
+        r, c = cells // self.n_cols, cells % self.n_cols
+        return ((c + REF_FRAC[0]) * self.cell_deg - 180.0, (r + REF_FRAC[1]) * self.cell_deg - 90.0)
+
+    def hits(self, lat, lon):
+        """(point index, fence index) arrays for every point inside a fence."""
+        lat = np.asarray(lat, dtype=float); lon = np.asarray(lon, dtype=float)
+        empty = np.zeros(0, dtype=np.int64)
+        if not len(self.cells) or not len(lat):
+            return empty, empty
+        cell = self._rows(lat) * self.n_cols + self._cols(lon)
+        k = np.minimum(np.searchsorted(self.cells, cell), len(self.cells) - 1)
+        ok = self.cells[k] == cell
+        pts, k = np.nonzero(ok)[0], k[ok]
+        pt = np.repeat(pts, self.c_count[k])
+        pair = _expand(self.c_start[k], self.c_count[k])
+        full = self.p_full[pair]
+        bpt, bpair = pt[~full], pair[~full]
+        if len(bpair):
+            cnt = self.p_en[bpair]
+            owner = np.repeat(np.arange(len(bpair)), cnt)
+            e = self.edges[_expand(self.p_e0[bpair], cnt)]
+            rx, ry = self._ref(self.p_cell[bpair])
+            x = _crosses(lon[bpt][owner], lat[bpt][owner], rx[owner], ry[owner], e)
+            odd = np.bincount(owner, weights=x, minlength=len(bpair)).astype(np.int64) % 2 == 1
+            keep = self.p_ref[bpair] ^ odd
+            bpt, bpair = bpt[keep], bpair[keep]
+        return np.concatenate([pt[full], bpt]), np.concatenate([self.p_fence[pair[full]], self.p_fence[bpair]])
+
+
+class GeofenceEngine:
+    """Turns fence membership of incoming fixes into enter / exit / dwell alerts."""
+
+    def __init__(self, fences, cell_deg=0.25):
+        self.index = FenceIndex(fences, cell_deg)
+        self.names = [f.name for f in fences]
+        self.dwell = {f.name: f.dwell_s for f in fences}
+        self.state = {}      # mmsi -> {fence name: [entered_ts, dwell_alerted]}
+        self.last_ts = {}    # mmsi -> ts of the last evaluated fix
+        self.events = Counter()
+
+    def _prime(self, con, mmsis):
+        missing = [m for m in mmsis if m not in self.state]
+        metrics.cache_lookup("geofence", hits=len(mmsis) - len(missing), misses=len(missing))
+        for m in missing:
+            self.state[m] = {}
+        if not missing or con is None:
+            return
+        for m, fence, entered, alerted in con.execute(
+                "SELECT mmsi, fence, entered_ts, dwell_alerted FROM geofence_state "
+                "WHERE mmsi IN (SELECT value FROM json_each(?))", (json.dumps(missing),)):
+            self.state[m][fence] = [entered, alerted]
+
+    def forget(self, mmsis=None):
+        """
+        Drop the in-memory state of mmsis (all when None). evaluate() changes it before the
+        transaction commits, so after a rollback it is reloaded from geofence_state and the
+        lost enter/exit transitions are detected (and alerted) again.
+        """
+        if mmsis is None:
+            self.state.clear(); self.last_ts.clear()
+        for m in mmsis or ():
+            self.state.pop(m, None); self.last_ts.pop(m, None)
+
+    def evaluate(self, con, rows):
+        """Check positions tuples (src.db.POSITION_COLS order); writes alerts + state, no commit."""
+        if not rows:
+            return []
+        mmsi = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        lat = np.array([np.nan if r[2] is None else r[2] for r in rows], dtype=float)
+        lon = np.array([np.nan if r[3] is None else r[3] for r in rows], dtype=float)
+        valid = np.nonzero(~(np.isnan(lat) | np.isnan(lon)))[0]
+        pi, fi = self.index.hits(lat[valid], lon[valid])
+        inside = {}
+        for p, f in zip(valid[pi].tolist(), fi.tolist()):
+            inside.setdefault(p, set()).add(self.names[f])
+        self._prime(con, set(mmsi.tolist()))
+        occupied = np.fromiter((bool(self.state[m]) for m in mmsi.tolist()), dtype=bool, count=len(rows))
+        todo = np.zeros(len(rows), dtype=bool)
+        todo[valid] = True
+        todo &= occupied
+        todo[list(inside)] = True
+        events, dirty = [], set()
+        for i in sorted(np.nonzero(todo)[0].tolist(), key=lambda i: rows[i][1]):
+            m, ts = rows[i][0], rows[i][1]
+            if ts < self.last_ts.get(m, ts):
+                continue  # late report: membership is judged on the live track only
+            self.last_ts[m] = ts
+            cur, prev = inside.get(i, set()), self.state[m]
+            for name in sorted(prev.keys() - cur):
+                entered = prev.pop(name)[0]
+                events.append((ts, m, "geofence_exit", f"left {name} after {(ts - entered) / 3600:.1f} h"))
+            for name in sorted(cur - prev.keys()):
+                prev[name] = [ts, 0]
+                events.append((ts, m, "geofence_enter", f"entered {name}"))
+            for name in cur & prev.keys():
+                st, dwell = prev[name], self.dwell.get(name)
+                if dwell and not st[1] and ts - st[0] >= dwell:
+                    st[1] = 1
+                    events.append((ts, m, "geofence_dwell", f"in {name} for {(ts - st[0]) / 3600:.1f} h"))
+            dirty.add(m)
+        if dirty and con is not None:
+            con.executemany("DELETE FROM geofence_state WHERE mmsi = ?", [(m,) for m in dirty])
+            con.executemany("INSERT INTO geofence_state(mmsi, fence, entered_ts, dwell_alerted) VALUES (?,?,?,?)",
+                            [(m, name, st[0], st[1]) for m in dirty for name, st in self.state[m].items()])
+        if events and con is not None:
+            con.executemany("INSERT INTO alerts(ts, mmsi, kind, message) VALUES (?,?,?,?)", events)
+        for kind, n in Counter(e[2] for e in events).items():
+            self.events[kind] += n
+            metrics.inc("tracker_geofence_events_total", n, kind=kind)
+        return events
+
+
+def load_config():
+    opts = dict(DEFAULTS)
+    try:
+        cfg = yaml.safe_load(open(CFG_PATH, "r", encoding="utf-8")) or {}
+        opts.update(cfg.get("geofences") or {})
+        opts["regions"] = cfg.get("regions") or {}
+    except Exception:
+        pass
+    return opts
+
+
+_default = False
+
+def default_engine():
+    """Process-wide engine from config.yaml `geofences`, or None when disabled / no fences."""
+    global _default
+    if _default is False:
+        opts = load_config()
+        fences = load_fences(opts) if opts.get("enabled") else []
+        _default = GeofenceEngine(fences, opts["cell_deg"]) if fences else None
+        if _default is not None:
+            print(f"[geofence] {len(fences)} fences, {len(_default.index.cells)} grid cells")
+    return _default
@@ -1,7 +1,8 @@
 # src/ingest/aisstream_ws.py
 import json, time, traceback
 from websocket import create_connection, WebSocketConnectionClosedException
-from ..db import get_conn, ensure_tables
+from .. import metrics
+from .writer_client import get_client
 
 # World-ish box (docs require lat,lon corner pairs)
 WORLD_BBOX = [[[-85.0, -179.9], [85.0, 179.9]]]
@@ -35,8 +36,9 @@ def run_aisstream(api_key: str, tanker_only: bool = True, watch_mmsi=None):
             print("[AISStream] Sent subscription:", sub)
             print("[AISStream] Subscribed. Receiving messages…")
 
-            conn = get_conn(); ensure_tables(conn)
+            writer = get_client("aisstream")
             backoff = 5
+            received = 0
 
             while True:
                 try:
@@ -56,6 +58,7 @@ def run_aisstream(api_key: str, tanker_only: bool = True, watch_mmsi=None):
 
                 if isinstance(obj, dict) and ("error" in obj or "Error" in obj):
                     print("[AISStream] Server error:", obj)
+                    metrics.inc("tracker_fetch_errors_total", source="aisstream")
                     raise RuntimeError(str(obj))
 
                 # Expect doc-format: MessageType, Message{...}, MetaData{...}
@@ -63,6 +66,7 @@ def run_aisstream(api_key: str, tanker_only: bool = True, watch_mmsi=None):
                 if mtype != "PositionReport":
                     # You can broaden if you remove FilterMessageTypes
                     continue
+                metrics.inc("tracker_messages_received_total", source="aisstream")
 
                 meta = obj.get("MetaData") or {}
                 body = (obj.get("Message") or {}).get("PositionReport") or {}
@@ -102,24 +106,26 @@ def run_aisstream(api_key: str, tanker_only: bool = True, watch_mmsi=None):
                 nav_status = body.get("NavigationalStatus")
                 name = meta.get("ShipName")
 
-                # Store
+                # Hand off to the writer service without waiting for the commit (reports inside
+                # the vessel's dead-band are dropped there by write_positions)
                 ts = int(time.time())
-                conn.execute("INSERT OR IGNORE INTO ships(mmsi, ship_type, name) VALUES(?,?,?)",
-                             (mmsi, "Tanker" if ship_type and 80 <= int(ship_type) <= 89 else None, name))
-                conn.execute("""INSERT OR IGNORE INTO positions
-                    (mmsi, ts, lat, lon, sog, cog, heading, draught, nav_status, source)
-                    VALUES (?,?,?,?,?,?,?,?,?,?)""",
-                    (mmsi, ts, lat, lon,
-                     float(sog) if sog is not None else None,
-                     float(cog) if cog is not None else None,
-                     float(heading) if heading is not None else None,
-                     float(draught) if draught is not None else None,
-                     nav_status,
-                     "aisstream"))
-                conn.commit()
+                writer.write_positions([(
+                    mmsi, ts, lat, lon,
+                    float(sog) if sog is not None else None,
+                    float(cog) if cog is not None else None,
+                    float(heading) if heading is not None else None,
+                    float(draught) if draught is not None else None,
+                    nav_status,
+                    "aisstream")],
+                    ships=[(mmsi, "Tanker" if ship_type and 80 <= int(ship_type) <= 89 else None, name)],
+                    wait=False)
+                received += 1
+                if received % 1000 == 0:
+                    print(f"[AISStream] received {received} ({writer.mode}: {writer.sent} sent, {writer.direct} written directly)")
 
         except Exception as e:
             print("[AISStream] Connection lost / error:", repr(e))
+            metrics.inc("tracker_reconnects_total", source="aisstream")
             print((traceback.format_exc(limit=2) or "").strip())
             try:
                 if ws: ws.close()
@@ -0,0 +1,181 @@
+# src/ingest/writer_client.py
+"""
+Producer side of the single-writer ingest service (src/ingest/writer_service.py).
+
+    writer = get_client("aisstream")
+    writer.write_positions(rows, ships=..., wait=False)   # same rows as src.db.write_positions
+    writer.execute([(sql, [params, ...]), ...])           # other writes, one transaction
+
+When the service is not running (or writer.enabled is false in config.yaml) the client
+writes to tanker.db directly, exactly as the producers used to, and tries the service
+again every RETRY_S seconds. Position batches that were sent but got no reply are
+written directly as well (INSERT OR IGNORE makes a repeat harmless); execute() raises
+ConnectionError instead, since its statements may already be committed.
+
+subscribe() follows the service's change stream (the rows of every commit).
+"""
+import socket, threading, time
+
+from ..db import ensure_tables, get_conn, write_positions
+from .writer_service import HEARTBEAT_S, load_config, recv_frame, run_statements, send_frame
+
+CHUNK_ROWS = 20000
+RETRY_S = 30
+
+
+class WriterClient:
+    def __init__(self, producer, host=None, port=None, timeout=60, enabled=None):
+        cfg = load_config()
+        self.producer = producer
+        self.host = host or cfg["host"]
+        self.port = int(port or cfg["port"])
+        self.timeout = timeout
+        self.enabled = cfg["enabled"] if enabled is None else enabled
+        self.sock = None
+        self._con = None
+        self._lock = threading.Lock()
+        self._retry_at = 0.0
+        self.sent = self.direct = 0   # rows via the service / written directly
+
+    @property
+    def mode(self):
+        return "service" if self.sock else "direct"
+
+    def close(self):
+        with self._lock:
+            if self.sock:
+                self.sock.close(); self.sock = None
+            if self._con:
+                self._con.close(); self._con = None
+
+    # ---- transport --------------------------------------------------------
+    def _connect(self):
+        if self.sock is not None:
+            return True
+        if not self.enabled or time.time() < self._retry_at:
+            return False
+        try:
+            self.sock = socket.create_connection((self.host, self.port), timeout=2)
+            self.sock.settimeout(self.timeout)
+            print(f"[writer] {self.producer}: submitting to {self.host}:{self.port}")
+            return True
+        except OSError:
+            self._retry_at = time.time() + RETRY_S
+            print(f"[writer] {self.producer}: service at {self.host}:{self.port} not reachable, writing directly")
+            return False
+
+    def _request(self, msg, resend=True):
+        """
+        Reply from the service, or None if it cannot be reached (caller writes directly).
+        Once the request is on the wire its outcome is unknown if the reply never comes:
+        unless resend (repeating it is harmless), that raises ConnectionError instead.
+        """
+        if not self._connect():
+            return None
+        sent = False
+        try:
+            send_frame(self.sock, msg)
+            sent = True
+            reply = recv_frame(self.sock)
+            if reply is None:
+                raise ConnectionError("service closed the connection")
+            return reply
+        except (OSError, ValueError) as e:
+            self.sock.close(); self.sock = None
+            self._retry_at = time.time() + RETRY_S
+            if sent and not resend:
+                print(f"[writer] {self.producer}: lost the service ({e}) with a request in flight")
+                raise ConnectionError(f"writer service lost after {msg['op']!r} was sent; it may have been applied") from e
+            print(f"[writer] {self.producer}: lost the service ({e}), writing directly")
+            return None
+
+    def _direct_con(self):
+        if self._con is None:
+            self._con = get_conn()
+            ensure_tables(self._con)
+        return self._con
+
+    # ---- API --------------------------------------------------------------
+    def write_positions(self, rows, ships=None, dedupe=True, wait=True):
+        """
+        Submit positions tuples (src.db.POSITION_COLS order). Returns the number of new
+        rows, or None when wait=False and the service only acknowledged the batch.
+        """
+        rows = [tuple(r) for r in rows]
+        total = 0
+        with self._lock:
+            for i in range(0, max(1, len(rows)), CHUNK_ROWS):
+                chunk, chunk_ships = rows[i:i + CHUNK_ROWS], ships if i == 0 else None
+                reply = self._request({"op": "write", "producer": self.producer, "rows": chunk,
+                                       "ships": chunk_ships or [], "dedupe": dedupe, "wait": wait})
+                if reply is None:
+                    n = write_positions(self._direct_con(), chunk, ships=chunk_ships, dedupe=dedupe)
+                    self.direct += len(chunk)
+                elif not reply.get("ok"):
+                    raise RuntimeError(f"writer service: {reply.get('error')}")
+                else:
+                    n = reply.get("stored")
+                    self.sent += len(chunk)
+                total = None if n is None or total is None else total + n
+        return total
+
+    def execute(self, statements, wait=True):
+        """
+        Run [(sql, [params, ...]), ...] as one transaction; returns rows changed (None if
+        not waited). ConnectionError when the service dropped after receiving them.
+        """
+        statements = [(sql, [tuple(p) for p in many]) for sql, many in statements]
+        with self._lock:
+            reply = self._request({"op": "exec", "producer": self.producer,
+                                   "statements": statements, "wait": wait}, resend=False)
+            if reply is None:
+                con = self._direct_con()
+                try:
+                    changes = run_statements(con, statements)
+                    con.commit()
+                except Exception:
+                    con.rollback()
+                    raise
+                return changes
+            if not reply.get("ok"):
+                raise RuntimeError(f"writer service: {reply.get('error')}")
+            return reply.get("changes")
+
+    def stats(self):
+        """Service-side per-producer stats, or None when running direct."""
+        with self._lock:
+            return self._request({"op": "stats"})
+
+
+def subscribe(host=None, port=None):
+    """
+    Yield the rows (POSITION_COLS lists) of every write the service commits; heartbeats
+    yield []. Raises OSError when the service cannot be reached or the stream breaks.
+    """
+    cfg = load_config()
+    sock = socket.create_connection((host or cfg["host"], int(port or cfg["port"])), timeout=2)
+    try:
+        sock.settimeout(4 * HEARTBEAT_S)
+        send_frame(sock, {"op": "subscribe"})
+        reply = recv_frame(sock)
+        if not reply or not reply.get("ok"):
+            raise ConnectionError(f"subscribe refused: {reply}")
+        while True:
+            frame = recv_frame(sock)
+            if frame is None:
+                raise ConnectionError("service closed the change stream")
+            yield frame["rows"]
+    finally:
+        sock.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(producer):
+    """Process-wide client for `producer` (one socket per producer)."""
+    with _clients_lock:
+        if producer not in _clients:
+            _clients[producer] = WriterClient(producer)
+        return _clients[producer]
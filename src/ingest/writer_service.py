@@ -0,0 +1,345 @@
+# src/ingest/writer_service.py
+"""
+Single-writer ingest service.
+
+Producers (AISStream client, locator, scrapers, CSV loader, dashboard) send their
+batches here over a local TCP socket instead of writing tanker.db themselves. One
+writer thread owns the only write connection: it takes whatever is queued (up to
+coalesce_ms / max_batch_rows), applies it in one transaction and answers every
+request with its own result. src/ingest/writer_client.py is the producer side.
+
+Wire format: 4-byte big-endian length + UTF-8 JSON object; one reply per request.
+  {"op": "write", "producer", "rows": [[POSITION_COLS...]], "ships": [[mmsi, type, name]],
+   "dedupe": bool, "wait": bool}                        -> {"ok", "stored"} | {"ok", "queued"}
+  {"op": "exec", "producer", "statements": [[sql, [params, ...]], ...], "wait": bool}
+                                                         -> {"ok", "changes"}
+  {"op": "stats"}                                        -> per-producer throughput
+  {"op": "subscribe"}                                    -> {"ok"}, then a frame per commit:
+                                                            {"rows": [[POSITION_COLS...]]}
+The subscribe connection is a change stream (the API's track cache, src/trackcache.py):
+after every transaction the rows the filter kept are pushed to each subscriber, and an
+empty {"rows": []} goes out every HEARTBEAT_S when nothing is written. A subscriber that
+falls SUBSCRIBER_QUEUE frames behind is disconnected; it has to reload what it holds.
+"""
+import json, queue, socketserver, struct, threading, time
+from collections import deque
+from pathlib import Path
+
+import yaml
+
+from .. import metrics
+from ..db import ensure_tables, get_conn, insert_positions, rollback_positions
+
+CFG_PATH = Path(__file__).resolve().parents[2] / "config.yaml"
+
+DEFAULTS = {
+    "enabled": True,
+    "host": "127.0.0.1",
+    "port": 5055,
+    "coalesce_ms": 50,        # how long the writer waits for more work before committing
+    "max_batch_rows": 20000,  # rows per transaction
+    "max_queue": 1000,        # queued requests before producers block (backpressure)
+}
+LOG_EVERY_S = 60
+RATE_WINDOW_S = 60
+HEARTBEAT_S = 15
+SUBSCRIBER_QUEUE = 1000   # frames
+
+
+def load_config():
+    opts = dict(DEFAULTS)
+    try:
+        opts.update(yaml.safe_load(open(CFG_PATH, "r", encoding="utf-8")).get("writer") or {})
+    except Exception:
+        pass
+    return opts
+
+
+# ------------------------------------------------------------
+# Framing
+# ------------------------------------------------------------
+_LEN = struct.Struct(">I")
+
+
+def _jsonable(o):
+    if hasattr(o, "item"):  # numpy scalars from pandas-built rows
+        return o.item()
+    raise TypeError(f"not JSON serializable: {type(o).__name__}")
+
+
+def send_frame(sock, obj):
+    data = json.dumps(obj, default=_jsonable, separators=(",", ":")).encode("utf-8")
+    sock.sendall(_LEN.pack(len(data)) + data)
+
+
+def _recv_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(min(n - len(buf), 1 << 20))
+        if not chunk:
+            return None
+        buf += chunk
+    return bytes(buf)
+
+
+def recv_frame(sock):
+    """Next JSON object from sock, or None when the peer closed the connection."""
+    head = _recv_exact(sock, _LEN.size)
+    if head is None:
+        return None
+    body = _recv_exact(sock, _LEN.unpack(head)[0])
+    return None if body is None else json.loads(body)
+
+
+def run_statements(con, statements):
+    """Apply [(sql, [params, ...]), ...] on con without committing; returns rows changed."""
+    before = con.total_changes
+    for sql, many in statements:
+        if len(many) == 1:  # executemany refuses DDL
+            con.execute(sql, many[0])
+        else:
+            con.executemany(sql, many)
+    return con.total_changes - before
+
+
+# ------------------------------------------------------------
+# Service
+# ------------------------------------------------------------
+class _Request:
+    __slots__ = ("msg", "producer", "size", "done", "result")
+
+    def __init__(self, msg):
+        self.msg = msg
+        self.producer = str(msg.get("producer") or "unknown")
+        self.size = len(msg.get("rows") or ()) or sum(len(m) for _, m in msg.get("statements") or ()) or 1
+        self.done = threading.Event()
+        self.result = None
+
+
+class ProducerStats:
+    def __init__(self):
+        self.requests = self.rows = self.stored = self.suppressed = self.errors = 0
+        self.first_seen = self.last_seen = None
+        self.recent = deque()   # (ts, rows) inside RATE_WINDOW_S
+
+    def add(self, rows, stored, suppressed, now):
+        self.requests += 1; self.rows += rows; self.stored += stored; self.suppressed += suppressed
+        self.first_seen = self.first_seen or now
+        self.last_seen = now
+        self.recent.append((now, rows))
+
+    def rate(self, now):
+        while self.recent and self.recent[0][0] < now - RATE_WINDOW_S:
+            self.recent.popleft()
+        return sum(n for _, n in self.recent) / RATE_WINDOW_S
+
+    def as_dict(self, now):
+        return {"requests": self.requests, "rows": self.rows, "stored": self.stored,
+                "suppressed": self.suppressed, "errors": self.errors,
+                "rows_per_s": round(self.rate(now), 1),
+                "idle_s": round(now - self.last_seen, 1) if self.last_seen else None}
+
+
+class WriterService:
+    def __init__(self, coalesce_ms=50, max_batch_rows=20000, max_queue=1000, **_):
+        self.coalesce_s = coalesce_ms / 1000.0
+        self.max_batch_rows = int(max_batch_rows)
+        self.q = queue.Queue(maxsize=int(max_queue))
+        self.producers = {}
+        self._stats_lock = threading.Lock()
+        self.txns = self.txn_requests = 0
+        self.started = time.time()
+        self.subscribers = []
+        self._sub_lock = threading.Lock()
+
+    def submit(self, msg):
+        req = _Request(msg)
+        self.q.put(req)
+        return req
+
+    # ---- change stream ----------------------------------------------------
+    def subscribe(self):
+        q = queue.Queue(maxsize=SUBSCRIBER_QUEUE)
+        with self._sub_lock:
+            self.subscribers.append(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._sub_lock:
+            if q in self.subscribers:
+                self.subscribers.remove(q)
+
+    def _publish(self, rows):
+        with self._sub_lock:
+            subs = list(self.subscribers)
+        for q in subs:
+            try:
+                q.put_nowait({"rows": rows})
+            except queue.Full:  # too slow: cut it off rather than stall the writer
+                self.unsubscribe(q)
+                with q.mutex:
+                    q.queue.clear()
+                q.put_nowait(None)
+                print("[writer] dropped a change-stream subscriber that fell behind")
+
+    # ---- writer thread ----------------------------------------------------
+    def run_writer(self):
+        con = get_conn()
+        ensure_tables(con)
+        last_log = time.time()
+        while True:
+            try:
+                first = self.q.get(timeout=5)
+            except queue.Empty:
+                first = None
+            if first is not None:
+                batch, rows = [first], first.size
+                deadline = time.monotonic() + self.coalesce_s
+                while rows < self.max_batch_rows:
+                    try:
+                        req = self.q.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    batch.append(req); rows += req.size
+                self._apply(con, batch)
+            if time.time() - last_log >= LOG_EVERY_S:
+                last_log = time.time()
+                print(f"[writer] {format_stats(self.snapshot())}")
+
+    def _apply(self, con, batch, kept_before=None):
+        t0 = time.perf_counter()
+        done = []   # (req, result, kept rows or None, seconds)
+        try:
+            for req in batch:
+                t1 = time.perf_counter()
+                m = req.msg
+                if m.get("op") == "write":
+                    rows = [tuple(r) for r in m.get("rows") or ()]
+                    ships = [tuple(s) for s in m.get("ships") or ()] or None
+                    if kept_before is not None:  # retry: the filter already ran on the first attempt
+                        n, kept = insert_positions(con, kept_before, ships, dedupe=False)
+                    else:
+                        n, kept = insert_positions(con, rows, ships, dedupe=m.get("dedupe", True))
+                    done.append((req, {"ok": True, "stored": n}, kept, time.perf_counter() - t1))
+                else:
+                    changes = run_statements(con, m.get("statements") or ())
+                    done.append((req, {"ok": True, "changes": changes}, None, 0.0))
+            con.commit()
+        except Exception as e:
+            rollback_positions(con, [r for req in batch for r in req.msg.get("rows") or ()])
+            if len(batch) > 1:  # isolate the bad request; the rest still commit
+                kept = {id(r): k for r, _, k, _ in done}
+                for req in batch:
+                    self._apply(con, [req], kept.get(id(req)))
+                return
+            req = batch[0]
+            print(f"[writer] {req.producer} request failed: {e}")
+            with self._stats_lock:
+                self.producers.setdefault(req.producer, ProducerStats()).errors += 1
+            req.result = {"ok": False, "error": str(e)}
+            req.done.set()
+            return
+        txn_s = time.perf_counter() - t0
+        now = time.time()
+        with self._stats_lock:
+            self.txns += 1; self.txn_requests += len(batch)
+            for req, res, kept, dt in done:
+                rows = len(req.msg.get("rows") or ())
+                stored = res.get("stored", res.get("changes", 0))
+                self.producers.setdefault(req.producer, ProducerStats()).add(
+                    rows, stored, rows - len(kept) if kept is not None else 0, now)
+        for req, res, kept, dt in done:
+            if kept is not None:
+                metrics.record_write(len(req.msg.get("rows") or ()), kept, res["stored"], dt)
+            metrics.inc("tracker_writer_requests_total", producer=req.producer, op=req.msg.get("op"))
+            req.result = res
+            req.done.set()
+        metrics.observe("tracker_writer_txn_seconds", txn_s)
+        metrics.set_gauge("tracker_queue_depth", self.q.qsize(), queue="writer")
+        if self.subscribers:
+            stored = [r for _, _, kept, _ in done if kept for r in kept]
+            if stored:
+                self._publish(stored)
+
+    def snapshot(self):
+        now = time.time()
+        with self._stats_lock:
+            return {"ok": True, "uptime_s": round(now - self.started), "queue": self.q.qsize(),
+                    "txns": self.txns,
+                    "requests_per_txn": round(self.txn_requests / self.txns, 1) if self.txns else 0.0,
+                    "producers": {p: s.as_dict(now) for p, s in sorted(self.producers.items())}}
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def _stream(self, svc):
+        """Serve this connection as a change-stream subscriber until either side goes away."""
+        q = svc.subscribe()
+        try:
+            send_frame(self.request, {"ok": True})
+            while True:
+                try:
+                    frame = q.get(timeout=HEARTBEAT_S)
+                except queue.Empty:
+                    frame = {"rows": []}
+                if frame is None:
+                    return
+                send_frame(self.request, frame)
+        except OSError:
+            return
+        finally:
+            svc.unsubscribe(q)
+
+    def handle(self):
+        svc = self.server.service
+        while True:
+            try:
+                msg = recv_frame(self.request)
+            except (OSError, ValueError):
+                return
+            if msg is None:
+                return
+            op = msg.get("op")
+            if op == "subscribe":
+                return self._stream(svc)
+            if op == "stats":
+                reply = svc.snapshot()
+            elif op in ("write", "exec"):
+                req = svc.submit(msg)
+                if msg.get("wait", True):
+                    req.done.wait()
+                    reply = req.result
+                else:
+                    reply = {"ok": True, "queued": svc.q.qsize()}
+            else:
+                reply = {"ok": False, "error": f"unknown op {op!r}"}
+            try:
+                send_frame(self.request, reply)
+            except OSError:
+                return
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def format_stats(snap):
+    parts = [f"txns={snap['txns']} req/txn={snap['requests_per_txn']} queue={snap['queue']}"]
+    for p, s in snap["producers"].items():
+        parts.append(f"{p}: {s['rows_per_s']}/s rows={s['rows']} stored={s['stored']} "
+                     f"suppressed={s['suppressed']} err={s['errors']}")
+    return " | ".join(parts)
+
+
+def serve(host=None, port=None, **opts):
+    cfg = load_config()
+    cfg.update({k: v for k, v in opts.items() if v is not None})
+    host = host or cfg["host"]; port = int(port or cfg["port"])
+    metrics.set_process("writer")
+    service = WriterService(**cfg)
+    threading.Thread(target=service.run_writer, name="writer", daemon=True).start()
+    with _Server((host, port), _Handler) as server:
+        server.service = service
+        print(f"[writer] listening on {host}:{port} (coalesce {cfg['coalesce_ms']} ms, "
+              f"≤{cfg['max_batch_rows']} rows/txn)")
+        server.serve_forever()
@@ -0,0 +1,161 @@
+# src/locator.py
+"""
+Position locator shared by scripts/locate_from_watchlist.py and scripts/ingest_position_api.py.
+
+One pooled HTTP session, a bounded thread pool for per-MMSI lookups (or a single bulk
+POST when the API offers one), and one batched write per poll cycle, submitted through
+the single-writer service (src/ingest/writer_service.py) when it is running.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import metrics
+from .ingest.writer_client import get_client
+
+
+def _first(d, *keys):
+    for k in keys:
+        v = d.get(k)
+        if v is not None:
+            return v
+    return None
+
+
+def _float(v):
+    return None if v is None else float(v)
+
+
+def normalize(mmsi, payload, source=None):
+    """
+    Map an API payload to a positions tuple (src.db.POSITION_COLS order), or None.
+    Accepts both the short (lat/lon/ts/sog/cog) and the long
+    (latitude/longitude/timestamp/speed/course) field names.
+    source None keeps the payload's own 'source' field.
+    """
+    lat = _first(payload, "lat", "latitude")
+    lon = _first(payload, "lon", "longitude")
+    if lat is None or lon is None:
+        return None
+    ts = _first(payload, "ts", "timestamp") or time.time()
+    return (int(mmsi), int(ts), float(lat), float(lon),
+            _float(_first(payload, "sog", "speed")),
+            _float(_first(payload, "cog", "course")),
+            _float(payload.get("heading")),
+            _float(payload.get("draught")),
+            payload.get("nav_status"),
+            source or payload.get("source") or "local_api")
+
+
+def _pct(sorted_vals, q):
+    if not sorted_vals:
+        return 0.0
+    return sorted_vals[min(len(sorted_vals) - 1, int(q * len(sorted_vals)))]
+
+
+class Locator:
+    """
+    Polls a location API for many MMSIs per cycle.
+
+    base/path_template address the per-MMSI endpoint; bulk_path (POST, JSON list of
+    MMSIs) is tried first and dropped for the life of the engine if the API lacks it.
+    """
+
+    def __init__(self, base, path_template="/location/{mmsi}", bulk_path="/locations",
+                 workers=32, timeout=15, source=None):
+        self.base = base.rstrip("/") + "/"
+        self.path_template = path_template
+        self.bulk_path = bulk_path
+        self.workers = max(1, int(workers))
+        self.timeout = timeout
+        self.source = source
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        self.session.close()
+
+    def fetch_one(self, mmsi):
+        url = urljoin(self.base, self.path_template.format(mmsi=mmsi).lstrip("/"))
+        r = self.session.get(url, timeout=self.timeout)
+        r.raise_for_status()
+        return r.json()
+
+    def fetch_bulk(self, mmsis):
+        """{mmsi: payload} from the bulk endpoint, or None if the API has no such endpoint."""
+        if not self.bulk_path:
+            return None
+        url = urljoin(self.base, self.bulk_path.lstrip("/"))
+        r = self.session.post(url, json=[int(m) for m in mmsis], timeout=max(self.timeout, 60))
+        if r.status_code in (404, 405):
+            self.bulk_path = None
+            return None
+        r.raise_for_status()
+        return {int(p["mmsi"]): p for p in r.json()}
+
+    def _timed_fetch(self, mmsi):
+        t0 = time.perf_counter()
+        try:
+            return mmsi, self.fetch_one(mmsi), None, time.perf_counter() - t0
+        except Exception as e:
+            return mmsi, None, e, time.perf_counter() - t0
+
+    def poll(self, mmsis):
+        """
+        Fetch positions for mmsis. Returns (rows, stats); rows are positions tuples.
+        Per-MMSI errors are counted, not raised.
+        """
+        t0 = time.perf_counter()
+        rows, errors, latencies = [], {}, []
+        payloads = None
+        try:
+            payloads = self.fetch_bulk(mmsis)
+        except Exception as e:
+            print(f"[locator] bulk fetch failed ({e}); falling back to per-MMSI requests")
+        if payloads is not None:
+            latencies.append(time.perf_counter() - t0)
+            for m in mmsis:
+                row = normalize(m, payloads[int(m)], self.source) if int(m) in payloads else None
+                if row: rows.append(row)
+                else: errors[m] = "no position"
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.workers, max(1, len(mmsis)))) as pool:
+                for m, payload, err, dt in pool.map(self._timed_fetch, mmsis):
+                    latencies.append(dt)
+                    row = None if err else normalize(m, payload, self.source)
+                    if row: rows.append(row)
+                    else: errors[m] = err or "no position"
+        source = self.source or "local_api"
+        metrics.inc("tracker_messages_received_total", len(rows), source=source)
+        if errors:
+            metrics.inc("tracker_fetch_errors_total", len(errors), source=source)
+        metrics.observe_many("tracker_fetch_seconds", latencies, source=source)
+        latencies.sort()
+        stats = {
+            "requested": len(mmsis), "ok": len(rows), "fail": len(errors),
+            "bulk": payloads is not None,
+            "fetch_s": time.perf_counter() - t0,
+            "p50_ms": 1000 * _pct(latencies, 0.50), "p95_ms": 1000 * _pct(latencies, 0.95),
+            "errors": errors,
+        }
+        return rows, stats
+
+    def run_cycle(self, mmsis, register_ships=False):
+        """Poll mmsis and store every hit in one transaction. Returns (rows, stats)."""
+        rows, stats = self.poll(mmsis)
+        t0 = time.perf_counter()
+        ships = [(r[0], None, None) for r in rows] if register_ships else None
+        stats["stored"] = get_client("locator").write_positions(rows, ships=ships)
+        stats["write_s"] = time.perf_counter() - t0
+        return rows, stats
+
+
+def format_stats(stats):
+    return (f"n={stats['requested']} ok={stats['ok']} fail={stats['fail']} stored={stats.get('stored', 0)} "
+            f"{'bulk ' if stats['bulk'] else ''}fetch={stats['fetch_s']:.2f}s "
+            f"p50={stats['p50_ms']:.0f}ms p95={stats['p95_ms']:.0f}ms write={stats.get('write_s', 0):.3f}s")
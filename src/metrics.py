@@ -0,0 +1,340 @@
+# src/metrics.py
+"""
+Ingest and query metrics, merged across processes through small JSON files.
+
+Every process (API, AISStream client, locator, scrapers, loaders) keeps counters,
+gauges and fixed-bucket histograms in memory and rewrites data/metrics/<process>-<pid>.json
+at most every FLUSH_S seconds and at exit. The API's /metrics endpoint merges the
+files that were refreshed within STALE_S (counters and histograms are summed, gauges
+keep a process label) and renders them in the Prometheus text format.
+
+Files older than STALE_S belong to stopped processes: collect() folds their counters and
+histograms into data/metrics/retired.json and deletes them, so exported counters never
+go backwards when a process exits. A process whose file was retired while it sat idle
+notices on its next flush and keeps only what it counted since that file was written.
+"""
+import atexit, json, os, sys, threading, time
+from bisect import bisect_left
+from collections import Counter
+from pathlib import Path
+
+METRICS_DIR = Path(__file__).resolve().parents[1] / "data" / "metrics"
+FLUSH_S = 5.0
+STALE_S = 600            # files not refreshed for this long belong to stopped processes
+RETIRED = "retired.json"
+LOCK_STALE_S = 60        # a retire lock this old was left by a crashed process
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_BUCKETS = (1, 5, 15, 60, 300, 900, 3600, 6 * 3600, 86400, 7 * 86400)
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    "tracker_messages_received_total": ("counter", "Position reports received, per source", None),
+    "tracker_fetch_errors_total": ("counter", "Failed frames, lookups or scrapes, per source", None),
+    "tracker_reconnects_total": ("counter", "Stream reconnects, per source", None),
+    "tracker_rows_submitted_total": ("counter", "Position rows handed to write_positions", None),
+    "tracker_rows_suppressed_total": ("counter", "Rows dropped by the track filter dead-band", None),
+    "tracker_rows_written_total": ("counter", "New position rows stored", None),
+    "tracker_write_seconds": ("histogram", "write_positions transaction latency", LATENCY_BUCKETS),
+    "tracker_ingest_lag_seconds": ("histogram", "Write time minus report ts for stored rows", LAG_BUCKETS),
+    "tracker_fetch_seconds": ("histogram", "Position lookup latency, per source", LATENCY_BUCKETS),
+    "tracker_queue_depth": ("gauge", "Items waiting to be processed, per queue", None),
+    "tracker_http_requests_total": ("counter", "API requests, per route, method and status", None),
+    "tracker_http_request_seconds": ("histogram", "API request latency, per route", LATENCY_BUCKETS),
+    "tracker_cache_requests_total": ("counter", "Cache lookups, per cache and result (hit/miss)", None),
+    "tracker_writer_requests_total": ("counter", "Requests applied by the writer service, per producer and op", None),
+    "tracker_geofence_events_total": ("counter", "Geofence enter/exit/dwell alerts, per kind", None),
+    "tracker_gap_events_total": ("counter", "AIS gap events, per kind (dark/reappeared)", None),
+    "tracker_dark_vessels": ("gauge", "Tracked vessels currently past their gap threshold", None),
+    "tracker_writer_txn_seconds": ("histogram", "Writer service transaction latency (coalesced requests)", LATENCY_BUCKETS),
+}
+
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_counters = {}   # (name, labels) -> float; labels is a sorted tuple of (key, value)
+_gauges = {}
+_hists = {}      # (name, labels) -> [per-bucket counts (+Inf last), sum, count]
+_process = None
+_last_flush = 0.0
+_written = None   # snapshot last written to our file (a missing file was retired)
+
+
+def set_process(name):
+    """Name used for this process's metrics file and gauge labels (default: script name)."""
+    global _process, _written
+    if name != _proc():
+        try:
+            _path().unlink()  # already flushed under the old name
+        except OSError:
+            pass
+        _written = None
+    _process = name
+
+
+def _proc():
+    return _process or Path(sys.argv[0] or "python").stem or "python"
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name, value=1, **labels):
+    with _lock:
+        k = _key(name, labels)
+        _counters[k] = _counters.get(k, 0) + value
+    _maybe_flush()
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+    _maybe_flush()
+
+
+def observe(name, value, **labels):
+    observe_many(name, (value,), **labels)
+
+
+def observe_many(name, values, **labels):
+    buckets = METRICS[name][2]
+    with _lock:
+        h = _hists.get(_key(name, labels))
+        if h is None:
+            h = _hists[_key(name, labels)] = [[0] * (len(buckets) + 1), 0.0, 0]
+        counts = h[0]
+        for v in values:
+            counts[bisect_left(buckets, v)] += 1
+            h[1] += v
+            h[2] += 1
+    _maybe_flush()
+
+
+def cache_lookup(cache, hits=0, misses=0):
+    if hits:
+        inc("tracker_cache_requests_total", hits, cache=cache, result="hit")
+    if misses:
+        inc("tracker_cache_requests_total", misses, cache=cache, result="miss")
+
+
+def record_write(submitted, kept, written, seconds, now=None):
+    """Book one write_positions call; kept are the rows left after the track filter."""
+    now = now or time.time()
+    by_source = Counter(r[9] for r in kept)
+    source = next(iter(by_source)) if len(by_source) == 1 else ("mixed" if by_source else "none")
+    inc("tracker_rows_submitted_total", submitted, source=source)
+    if submitted - len(kept):
+        inc("tracker_rows_suppressed_total", submitted - len(kept), source=source)
+    if written:
+        inc("tracker_rows_written_total", written, source=source)
+    observe("tracker_write_seconds", seconds, source=source)
+    for src in by_source:
+        observe_many("tracker_ingest_lag_seconds",
+                     [max(0.0, now - r[1]) for r in kept if r[9] == src and r[1] is not None], source=src)
+
+
+# ------------------------------------------------------------
+# Persistence and merge
+# ------------------------------------------------------------
+def snapshot():
+    with _lock:
+        return {
+            "process": _proc(), "pid": os.getpid(), "ts": time.time(),
+            "counters": [[n, dict(l), v] for (n, l), v in _counters.items()],
+            "gauges": [[n, dict(l), v] for (n, l), v in _gauges.items()],
+            "histograms": [[n, dict(l), h[0], h[1], h[2]] for (n, l), h in _hists.items()],
+        }
+
+
+def _path():
+    return METRICS_DIR / f"{_proc()}-{os.getpid()}.json"
+
+
+def flush():
+    global _last_flush, _written
+    if not _flush_lock.acquire(blocking=False):
+        return  # another thread is writing the file right now
+    try:
+        _last_flush = time.time()
+        if not (_counters or _gauges or _hists):
+            return
+        METRICS_DIR.mkdir(parents=True, exist_ok=True)
+        path = _path()
+        if _written is not None and not path.exists():
+            _forget(_written)  # already counted in retired.json
+        snap = snapshot()
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(snap), encoding="utf-8")
+        os.replace(tmp, path)
+        _written = snap
+    except Exception as e:
+        print(f"[metrics] flush failed: {e}")
+    finally:
+        _flush_lock.release()
+
+
+def _forget(snap):
+    """Subtract the counters and histograms of a snapshot of ours that was retired."""
+    with _lock:
+        for n, l, v in snap["counters"]:
+            k = _key(n, l)
+            _counters[k] = _counters.get(k, 0) - v
+        for n, l, counts, total, count in snap["histograms"]:
+            h = _hists.get(_key(n, l))
+            if h is not None:
+                h[0] = [a - b for a, b in zip(h[0], counts)]; h[1] -= total; h[2] -= count
+
+
+def _maybe_flush():
+    if time.time() - _last_flush >= FLUSH_S:
+        flush()
+
+
+atexit.register(flush)
+
+
+def _read(p):
+    try:
+        return json.loads(p.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None  # gone, being replaced or half-written
+
+
+def _merge(snaps):
+    counters, gauges, hists = {}, {}, {}
+    for s in snaps:
+        for n, l, v in s["counters"]:
+            k = _key(n, l)
+            counters[k] = counters.get(k, 0) + v
+        for n, l, v in s.get("gauges") or ():
+            gauges[_key(n, dict(l, process=s["process"], pid=s["pid"]))] = v
+        for n, l, counts, total, count in s["histograms"]:
+            k = _key(n, l)
+            h = hists.get(k)
+            if h is None or len(h[0]) != len(counts):
+                hists[k] = [list(counts), total, count]
+            else:
+                h[0] = [a + b for a, b in zip(h[0], counts)]; h[1] += total; h[2] += count
+    return counters, gauges, hists
+
+
+def _retire(stale):
+    """
+    Fold the snapshots of stale files into retired.json and delete the files; returns
+    the retired totals as a snapshot, or None when another process kept the lock.
+    """
+    lock = METRICS_DIR / "retired.lock"
+    for _ in range(40):
+        try:
+            os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except OSError:
+            try:
+                if time.time() - lock.stat().st_mtime > LOCK_STALE_S:
+                    lock.unlink()
+                    continue
+            except OSError:
+                pass
+            time.sleep(0.05)
+    else:
+        return None
+    try:
+        path = METRICS_DIR / RETIRED
+        retired = _read(path) or {"process": "retired", "pid": 0, "counters": [], "histograms": []}
+        cutoff = time.time() - STALE_S
+        folded = []
+        for p in stale:  # another collector may have folded it, or its process flushed again
+            try:
+                if p.stat().st_mtime >= cutoff:
+                    continue
+            except OSError:
+                continue
+            s = _read(p)
+            if s is not None:
+                folded.append((p, s))
+        if folded:
+            counters, _, hists = _merge([retired] + [s for _, s in folded])
+            retired["counters"] = [[n, dict(l), v] for (n, l), v in counters.items()]
+            retired["histograms"] = [[n, dict(l), h[0], h[1], h[2]] for (n, l), h in hists.items()]
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(retired), encoding="utf-8")
+            os.replace(tmp, path)
+            for p, _ in folded:
+                try:
+                    p.unlink()
+                except OSError:
+                    pass
+        return retired
+    finally:
+        try:
+            lock.unlink()
+        except OSError:
+            pass
+
+
+def collect():
+    """Merge this process's live metrics with every fresh file and the retired totals."""
+    snaps = [snapshot()]
+    own = _path().name
+    cutoff = time.time() - STALE_S
+    stale = []
+    for p in METRICS_DIR.glob("*.json") if METRICS_DIR.exists() else ():
+        if p.name in (own, RETIRED):
+            continue
+        try:
+            fresh = p.stat().st_mtime >= cutoff
+        except OSError:
+            continue
+        if fresh:
+            s = _read(p)
+            if s is not None:
+                snaps.append(s)
+        else:
+            stale.append(p)
+    retired = _retire(stale) if stale else None
+    if retired is None:
+        retired = _read(METRICS_DIR / RETIRED)
+        for p in stale:  # not folded this time: still count them, without their gauges
+            s = _read(p)
+            if s is not None:
+                snaps.append(dict(s, gauges=[]))
+    if retired is not None:
+        snaps.append(retired)
+    return _merge(snaps)
+
+
+def _labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+
+def _num(v):
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+def render_prometheus():
+    counters, gauges, hists = collect()
+    lines = []
+    for name, (kind, help_, buckets) in METRICS.items():
+        series = {"counter": counters, "gauge": gauges, "histogram": hists}[kind]
+        keys = sorted(k for k in series if k[0] == name)
+        if not keys:
+            continue
+        lines.append(f"# HELP {name} {help_}")
+        lines.append(f"# TYPE {name} {kind}")
+        for k in keys:
+            labels = k[1]
+            if kind != "histogram":
+                lines.append(f"{name}{_labels(labels)} {_num(series[k])}")
+                continue
+            counts, total, count = series[k]
+            cum = 0
+            for le, c in zip(list(buckets) + ["+Inf"], counts):
+                cum += c
+                lines.append(f"{name}_bucket{_labels(labels, [('le', le if le == '+Inf' else _num(le))])} {cum}")
+            lines.append(f"{name}_sum{_labels(labels)} {_num(total)}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,153 @@
+# src/migrations.py
+"""
+Versioned schema migrations.
+
+PRAGMA user_version holds the number of migrations applied to tanker.db. migrate(con)
+runs the pending ones in order, each in its own BEGIN IMMEDIATE transaction together
+with its version bump, so a concurrent start waits and then finds nothing to do, and an
+interrupted upgrade resumes where it stopped. An up-to-date database costs one PRAGMA
+read. Entry points call src.db.init_db() (or ensure_tables(con)) once at startup; the
+write paths assume the schema is in place and run no DDL.
+
+Databases from before versioning (user_version 0) already have some of these objects,
+so every step is idempotent (IF NOT EXISTS, column checks, layout checks). Add a change
+by appending a function to MIGRATIONS; never edit one that has shipped.
+"""
+import sqlite3, time
+
+from . import db, rollups
+from .gaps import SCHEMA as GAPS_SCHEMA
+from .geofence import SCHEMA as GEOFENCE_SCHEMA
+from .proximity import SCHEMA as PROXIMITY_SCHEMA
+from .spatial import SCHEMA as SPATIAL_SCHEMA
+
+WATCHLIST_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS watchlist(
+  mmsi INTEGER PRIMARY KEY,
+  name TEXT,
+  class TEXT,             -- 'Cargo' | 'Tanker' | 'Other' | NULL
+  favorite INTEGER DEFAULT 0,
+  imo INTEGER
+);
+'''
+
+# legacy `positions` table (any of its variants) -> positions_c, see db.POSITIONS_SCHEMA
+COPY_LEGACY_SQL = """
+INSERT OR IGNORE INTO positions_c(mmsi, ts, source_id, lat, lon, sog, cog, heading, draught, nav_status)
+SELECT p.mmsi, p.ts, s.id,
+       CAST(round(p.lat * 1e6) AS INTEGER), CAST(round(p.lon * 1e6) AS INTEGER),
+       CAST(round(p.sog * 10) AS INTEGER), CAST(round(p.cog * 10) AS INTEGER),
+       CAST(round(p.heading * 10) AS INTEGER), CAST(round(p.draught * 10) AS INTEGER),
+       p.nav_status
+  FROM {table} p JOIN sources s ON s.name = COALESCE(p.source, 'unknown')
+ WHERE p.mmsi IS NOT NULL AND p.ts IS NOT NULL
+ ORDER BY p.mmsi, p.ts, s.id
+"""
+
+
+def statements(script):
+    """Split a schema script into statements (trigger bodies contain semicolons)."""
+    out, buf = [], ""
+    for line in script.splitlines(keepends=True):
+        buf += line
+        if sqlite3.complete_statement(buf):
+            s = buf.strip()
+            if not s.upper().startswith("PRAGMA JOURNAL_MODE"):  # not allowed in a transaction; see migrate
+                out.append(s)
+            buf = ""
+    return out
+
+
+def _run(con, script):
+    for s in statements(script):
+        con.execute(s)
+
+
+# ------------------------------------------------------------
+# Migrations (append only)
+# ------------------------------------------------------------
+def _base_tables(con, **_):
+    """ships, alerts and the watchlist (which used to be created by whichever script ran first)."""
+    _run(con, db.BASE_SCHEMA + WATCHLIST_SCHEMA)
+
+
+def _watchlist_imo(con, **_):
+    """watchlist.imo (was scripts/migrate_add_imo.py)."""
+    cols = {r[1] for r in con.execute("PRAGMA table_info(watchlist)")}
+    if "imo" not in cols:
+        con.execute("ALTER TABLE watchlist ADD COLUMN imo INTEGER")
+        print("[migrate] added watchlist.imo column")
+
+
+def _compact_positions(con, keep_legacy=False, **_):
+    """
+    Positions in the compact layout (was scripts/migrate_compact_positions.py). Also
+    converts the (mmsi, ts)-keyed table locate_from_watchlist.py used to create.
+    """
+    tables = [s for s in statements(db.POSITIONS_SCHEMA) if s.upper().startswith("CREATE TABLE")]
+    rest = [s for s in statements(db.POSITIONS_SCHEMA) if s not in tables]
+    for s in tables:
+        con.execute(s)
+    if db.is_legacy(con):
+        t0 = time.time()
+        con.execute("ALTER TABLE positions RENAME TO positions_legacy")
+        total = con.execute("SELECT COUNT(*) FROM positions_legacy").fetchone()[0]
+        con.execute("INSERT OR IGNORE INTO sources(name) "
+                    "SELECT DISTINCT COALESCE(source, 'unknown') FROM positions_legacy")
+        copied = con.execute(COPY_LEGACY_SQL.format(table="positions_legacy")).rowcount
+        if not keep_legacy:
+            con.execute("DROP TABLE positions_legacy")
+        print(f"[migrate] positions: copied {copied} of {total} rows to the compact layout "
+              f"({total - copied} duplicates/rows without mmsi or ts dropped) in {time.time()-t0:.1f}s")
+    for s in rest:  # view + insert trigger
+        con.execute(s)
+
+
+def _derived_tables(con, **_):
+    """Spatial index, geofence state, proximity pairs, AIS gaps and rollups."""
+    _run(con, SPATIAL_SCHEMA + GEOFENCE_SCHEMA + PROXIMITY_SCHEMA + GAPS_SCHEMA + rollups.SCHEMA)
+
+
+def _latest_updated_at(con, **_):
+    """latest_positions.updated_at (write time), the gap detector's watermark."""
+    cols = {r[1] for r in con.execute("PRAGMA table_info(latest_positions)")}
+    if "updated_at" not in cols:
+        con.execute("ALTER TABLE latest_positions ADD COLUMN updated_at INTEGER")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_latest_updated ON latest_positions(updated_at)")
+
+
+MIGRATIONS = [_base_tables, _watchlist_imo, _compact_positions, _derived_tables, _latest_updated_at]
+LATEST = len(MIGRATIONS)
+
+
+def version(con):
+    return con.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(con, **opts):
+    """Apply pending migrations; returns the number applied. opts go to the steps (keep_legacy)."""
+    if version(con) >= LATEST:
+        return 0
+    if con.in_transaction:
+        con.commit()
+    level, con.isolation_level = con.isolation_level, None  # explicit transactions around DDL
+    applied = 0
+    try:
+        con.execute("PRAGMA journal_mode=WAL")
+        for n, step in enumerate(MIGRATIONS, start=1):
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                if version(con) >= n:  # another process got here first
+                    con.execute("ROLLBACK")
+                    continue
+                step(con, **opts)
+                con.execute(f"PRAGMA user_version = {n}")
+                con.execute("COMMIT")
+            except Exception:
+                con.execute("ROLLBACK")
+                raise
+            applied += 1
+            print(f"[migrate] {n}/{LATEST} {step.__name__.lstrip('_')}")
+    finally:
+        con.isolation_level = level
+    return applied
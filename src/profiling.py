@@ -0,0 +1,152 @@
+# src/profiling.py
+"""
+Opt-in profiling for dashboard reruns and API handlers.
+
+TRACKER_PROFILE=1 switches it on (the dashboard also has a sidebar toggle).
+  StageTimer      wall time of each named stage of a Streamlit rerun; render() draws
+                  the breakdown panel.
+  profiled(fn)    wraps a sync API handler with a stack sampler that reads the handler
+                  thread's frame every TRACKER_PROFILE_INTERVAL_MS and writes a report
+                  (top functions + collapsed stacks for flamegraph.pl/speedscope) to
+                  data/profiles/api/ for requests slower than TRACKER_PROFILE_MIN_MS.
+Nothing is sampled or written unless the flag is set when the API starts.
+"""
+import functools, inspect, os, re, sys, threading, time
+from collections import Counter
+from pathlib import Path
+
+PROFILE_DIR = Path(__file__).resolve().parents[1] / "data" / "profiles"
+
+
+def enabled():
+    return os.getenv("TRACKER_PROFILE", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+# ------------------------------------------------------------
+# Dashboard stages
+# ------------------------------------------------------------
+class StageTimer:
+    """
+    Lap timer: mark(name) closes the stage that started at the previous mark (or at
+    construction), so stages can be marked along a top-level script without re-indenting it.
+    StageTimer.latest is the most recent one (scripts/bench_suite.py reads the dashboard's).
+    """
+    latest = None
+
+    def __init__(self):
+        self.t0 = self._last = time.perf_counter()
+        self.stages = []   # [(name, seconds)]
+        StageTimer.latest = self
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.stages.append((name, now - self._last))
+        self._last = now
+
+    def total(self):
+        return self._last - self.t0
+
+    def render(self, container):
+        """Breakdown table + bar chart into a Streamlit container (e.g. st.sidebar.expander)."""
+        import pandas as pd
+        total = self.total() or 1e-9
+        df = pd.DataFrame(self.stages, columns=["stage", "s"])
+        df = df.groupby("stage", sort=False, as_index=False)["s"].sum()
+        df["ms"] = (df["s"] * 1000).round(1)
+        df["%"] = (100 * df["s"] / total).round(1)
+        container.markdown(f"**Rerun {total * 1000:.0f} ms**")
+        container.bar_chart(df.set_index("stage")["ms"])
+        container.dataframe(df[["stage", "ms", "%"]], use_container_width=True, hide_index=True)
+
+
+# ------------------------------------------------------------
+# API handlers
+# ------------------------------------------------------------
+class Sampler(threading.Thread):
+    """Samples one thread's Python stack every `interval` seconds until stop()."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()   # tuple of code objects, outermost first -> samples
+        self._stop_evt = threading.Event()
+
+    def run(self):
+        while not self._stop_evt.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_evt.set()
+        self.join()
+
+
+def _call(fn, args, kwargs):
+    # stacks are trimmed to what runs below this frame
+    return fn(*args, **kwargs)
+
+
+def _fmt(code):
+    return f"{Path(code.co_filename).name}:{code.co_name}:{code.co_firstlineno}"
+
+
+def report(label, wall_s, sampler, top=25):
+    stacks = Counter()
+    for stack, n in sampler.stacks.items():
+        if _call.__code__ in stack:  # otherwise sampled before/after the handler ran
+            stacks[stack[stack.index(_call.__code__) + 1:]] += n
+    n_samples = sum(stacks.values())
+    samples = n_samples or 1
+    self_n, total_n = Counter(), Counter()
+    for stack, n in stacks.items():
+        if stack:
+            self_n[stack[-1]] += n
+        for code in set(stack):
+            total_n[code] += n
+    lines = [f"# {label}  {wall_s * 1000:.1f} ms wall, {n_samples} samples @ {sampler.interval * 1000:g} ms", "",
+             "## Top functions", f"{'self%':>7} {'total%':>7}  function"]
+    for code, n in total_n.most_common(top):
+        lines.append(f"{100 * self_n[code] / samples:7.1f} {100 * n / samples:7.1f}  {_fmt(code)}")
+    lines += ["", "## Collapsed stacks"]
+    lines += [f"{';'.join(_fmt(c) for c in stack)} {n}" for stack, n in stacks.most_common() if stack]
+    return "\n".join(lines) + "\n"
+
+
+def _write_report(label, wall_s, sampler):
+    out = PROFILE_DIR / "api"
+    try:
+        out.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", label).strip("_")
+        stamp = time.strftime("%Y%m%d-%H%M%S") + f"-{int(time.time() * 1000) % 1000:03d}"
+        path = out / f"{stamp}-{slug}-{wall_s * 1000:.0f}ms.txt"
+        path.write_text(report(label, wall_s, sampler), encoding="utf-8")
+    except Exception as e:
+        print(f"[profile] could not write report for {label}: {e}")
+
+
+def profiled(fn, label):
+    """fn wrapped with a per-request sampler when profiling is on; fn itself otherwise."""
+    if not enabled() or inspect.iscoroutinefunction(fn):
+        return fn
+    interval = float(os.getenv("TRACKER_PROFILE_INTERVAL_MS", "2")) / 1000.0
+    min_ms = float(os.getenv("TRACKER_PROFILE_MIN_MS", "50"))
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        sampler = Sampler(threading.get_ident(), interval)
+        sampler.start()
+        t0 = time.perf_counter()
+        try:
+            return _call(fn, args, kwargs)
+        finally:
+            wall = time.perf_counter() - t0
+            sampler.stop()
+            if wall * 1000 >= min_ms:
+                _write_report(label, wall, sampler)
+    return wrapper
@@ -0,0 +1,217 @@
+# src/proximity.py
+"""
+Ship-to-ship (STS) transfer candidates from the latest-position index.
+
+A scan takes every vessel in latest_positions with a recent fix and low SOG. It finds
+all pairs within max_distance_m by spatial hashing. Fixes are mapped to unit vectors
+and bucketed in a 3-D grid whose cell is the chord of max_distance_m, so only the cell
+and its 13 "forward" neighbours are compared. That is O(n + close pairs) instead of
+O(n^2), and it needs no special cases for the antimeridian or the poles.
+
+A pair seen again with newer fixes within gap_min keeps its episode open in
+proximity_pairs; first_seen/last_seen are the older of the pair's fix times. Once an
+episode spans min_minutes of fixes, both vessels get an `sts_proximity` alert. Scans run from
+scripts/run_proximity.py; the API serves the pairs at /proximity.
+"""
+import itertools, math, time
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+ROOT = Path(__file__).resolve().parents[1]
+CFG_PATH = ROOT / "config.yaml"
+
+DEFAULTS = {
+    "max_distance_m": 500.0,
+    "max_sog_kn": 3.0,
+    "min_minutes": 30,      # episode length before alerting
+    "max_age_min": 30,      # only vessels with a fix this recent take part
+    "gap_min": 15,          # a pair unseen for longer closes its episode
+    "tanker_only": True,    # at least one vessel of the pair must classify as a tanker
+    "interval_s": 60,       # scripts/run_proximity.py --loop
+}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS proximity_pairs(
+  mmsi_a INTEGER NOT NULL, mmsi_b INTEGER NOT NULL, first_seen INTEGER NOT NULL,
+  last_seen INTEGER, dist_m REAL, min_dist_m REAL, lat REAL, lon REAL, alerted INTEGER DEFAULT 0,
+  PRIMARY KEY (mmsi_a, mmsi_b, first_seen)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_proximity_last_seen ON proximity_pairs(last_seen);
+'''
+
+EARTH_M = 6371008.8
+_FORWARD = [d for d in itertools.product((-1, 0, 1), repeat=3) if d > (0, 0, 0)]
+
+
+def load_config():
+    opts = dict(DEFAULTS)
+    try:
+        opts.update(yaml.safe_load(open(CFG_PATH, "r", encoding="utf-8")).get("proximity") or {})
+    except Exception:
+        pass
+    return opts
+
+
+def _unit(lat, lon):
+    la, lo = np.radians(lat), np.radians(lon)
+    c = np.cos(la)
+    return np.column_stack([c * np.cos(lo), c * np.sin(lo), np.sin(la)])
+
+
+def close_pairs(lat, lon, max_m):
+    """(i, j, metres) for every pair i < j of points within max_m (great-circle)."""
+    lat = np.asarray(lat, dtype=float); lon = np.asarray(lon, dtype=float)
+    empty = np.zeros(0, dtype=np.int64)
+    if len(lat) < 2:
+        return empty, empty, np.zeros(0)
+    xyz = _unit(lat, lon)
+    chord = 2.0 * math.sin(min(math.pi / 2, max_m / (2.0 * EARTH_M)))
+    off = int(math.ceil(1.0 / chord)) + 1
+    k = 2 * off + 2
+    g = np.floor(xyz / chord).astype(np.int64) + off
+    key = (g[:, 0] * k + g[:, 1]) * k + g[:, 2]
+    order = np.argsort(key, kind="stable")
+    cells, start, count = np.unique(key[order], return_index=True, return_counts=True)
+    out_i, out_j = [], []
+    for d in [(0, 0, 0)] + _FORWARD:
+        if d == (0, 0, 0):
+            a = b = np.nonzero(count > 1)[0]
+        else:
+            target = cells + (d[0] * k + d[1]) * k + d[2]
+            pos = np.minimum(np.searchsorted(cells, target), len(cells) - 1)
+            a = np.nonzero(cells[pos] == target)[0]
+            b = pos[a]
+        n = count[a] * count[b]
+        total = int(n.sum())
+        if not total:
+            continue
+        pair = np.repeat(np.arange(len(a)), n)
+        r = np.arange(total) - np.repeat(np.cumsum(n) - n, n)
+        cb = count[b][pair]
+        li, ri = start[a][pair] + r // cb, start[b][pair] + r % cb
+        if d == (0, 0, 0):
+            keep = li < ri
+            li, ri = li[keep], ri[keep]
+        i, j = order[li], order[ri]
+        near = ((xyz[i] - xyz[j]) ** 2).sum(axis=1) <= chord * chord
+        out_i.append(i[near]); out_j.append(j[near])
+    if not out_i:
+        return empty, empty, np.zeros(0)
+    i, j = np.concatenate(out_i), np.concatenate(out_j)
+    i, j = np.minimum(i, j), np.maximum(i, j)
+    c = np.sqrt(((xyz[i] - xyz[j]) ** 2).sum(axis=1))
+    return i, j, 2.0 * EARTH_M * np.arcsin(np.minimum(1.0, c / 2.0))
+
+
+def candidates(con, now, opts):
+    """Recent, slow vessels from latest_positions: dict of numpy arrays."""
+    from .classify import TANKER, classify_series
+    import pandas as pd
+    df = pd.read_sql_query("""
+        SELECT l.mmsi, l.ts, l.lat, l.lon, l.sog, s.ship_type
+          FROM latest_positions l LEFT JOIN ships s ON s.mmsi = l.mmsi
+         WHERE l.ts >= ? AND l.sog <= ? AND l.lat IS NOT NULL AND l.lon IS NOT NULL
+    """, con, params=(int(now - opts["max_age_min"] * 60), float(opts["max_sog_kn"])))
+    return {"mmsi": df["mmsi"].to_numpy(np.int64), "ts": df["ts"].to_numpy(np.int64),
+            "lat": df["lat"].to_numpy(float), "lon": df["lon"].to_numpy(float),
+            "tanker": (classify_series(df["ship_type"]) == TANKER).to_numpy(bool)}
+
+
+class ProximityTracker:
+    """Keeps pair episodes across scans and turns long ones into alerts."""
+
+    def __init__(self, **opts):
+        self.opts = dict(DEFAULTS, **opts)
+        self.active = {}   # (mmsi_a, mmsi_b) -> [first_seen, last_seen, dist, min_dist, lat, lon, alerted]
+        self._scanned = None  # episodes as of the last scan, until commit()
+        self.loaded = False
+
+    def _load(self, con, now):
+        gap = self.opts["gap_min"] * 60
+        try:
+            for a, b, first, last, dist, mind, lat, lon, alerted in con.execute(
+                    "SELECT mmsi_a, mmsi_b, first_seen, last_seen, dist_m, min_dist_m, lat, lon, alerted "
+                    "FROM proximity_pairs WHERE last_seen >= ?", (now - gap,)):
+                self.active[(a, b)] = [first, last, dist, mind, lat, lon, alerted]
+        except Exception:
+            pass  # table not created yet
+        self.loaded = True
+
+    def scan(self, con, now=None):
+        """
+        One pass over latest_positions. Returns (statements, stats): statements are
+        [(sql, [params, ...]), ...] for the writer service (src.ingest.writer_client.execute).
+        Episodes are timed by the fixes, not the scan clock, and only a pair with newer
+        fixes extends one. The tracker keeps its old episodes until commit(), so a scan
+        whose statements fail to write is simply repeated.
+        """
+        now = int(now or time.time())
+        if not self.loaded:
+            self._load(con, now)
+        o = self.opts
+        v = candidates(con, now, o)
+        i, j, dist = close_pairs(v["lat"], v["lon"], float(o["max_distance_m"]))
+        if o["tanker_only"] and len(i):
+            keep = v["tanker"][i] | v["tanker"][j]
+            i, j, dist = i[keep], j[keep], dist[keep]
+        ma, mb = v["mmsi"][i], v["mmsi"][j]
+        a, b = np.minimum(ma, mb), np.maximum(ma, mb)
+        seen = np.minimum(v["ts"][i], v["ts"][j])   # the pair is only as recent as its older fix
+        mid_lat = (v["lat"][i] + v["lat"][j]) / 2
+        mid_lon = (v["lon"][i] + v["lon"][j]) / 2
+        gap, min_s = o["gap_min"] * 60, o["min_minutes"] * 60
+        active = {k: list(ep) for k, ep in self.active.items()}
+        upserts, alerts = [], []
+        for pa, pb, t, d, la, lo in zip(a.tolist(), b.tolist(), seen.tolist(), dist.tolist(),
+                                        mid_lat.tolist(), mid_lon.tolist()):
+            if now - t > gap:
+                continue  # fixes too old to keep an episode open
+            ep = active.get((pa, pb))
+            if ep is None or t - ep[1] > gap:
+                ep = active[(pa, pb)] = [t, t, d, d, la, lo, 0]
+            elif t <= ep[1]:
+                continue  # no newer fixes since the last scan: not seen again
+            ep[1], ep[2], ep[3], ep[4], ep[5] = t, d, min(ep[3], d), la, lo
+            if not ep[6] and ep[1] - ep[0] >= min_s:
+                ep[6] = 1
+                mins = (ep[1] - ep[0]) / 60
+                for m, other in ((pa, pb), (pb, pa)):
+                    alerts.append((now, m, "sts_proximity",
+                                   f"within {d:.0f} m of {other} for {mins:.0f} min at {la:.4f},{lo:.4f} (possible STS)"))
+            upserts.append((pa, pb, ep[0], ep[1], ep[2], ep[3], ep[4], ep[5], ep[6]))
+        for key in [k for k, ep in active.items() if now - ep[1] > gap]:
+            del active[key]  # episode closed; its row stays as history
+        self._scanned = active
+        statements = []
+        if upserts:
+            statements.append(("""
+                INSERT INTO proximity_pairs(mmsi_a, mmsi_b, first_seen, last_seen, dist_m, min_dist_m, lat, lon, alerted)
+                VALUES (?,?,?,?,?,?,?,?,?)
+                ON CONFLICT(mmsi_a, mmsi_b, first_seen) DO UPDATE SET
+                  last_seen=excluded.last_seen, dist_m=excluded.dist_m, min_dist_m=excluded.min_dist_m,
+                  lat=excluded.lat, lon=excluded.lon, alerted=excluded.alerted
+            """, upserts))
+        if alerts:
+            statements.append(("INSERT INTO alerts(ts, mmsi, kind, message) VALUES (?,?,?,?)", alerts))
+        stats = {"vessels": len(v["mmsi"]), "pairs": len(upserts), "active": len(active),
+                 "alerts": len(alerts) // 2}
+        return statements, stats
+
+    def commit(self):
+        """Adopt the episodes of the last scan; call once its statements are written."""
+        if self._scanned is not None:
+            self.active, self._scanned = self._scanned, None
+
+
+def active_pairs(con, now=None, min_minutes=0, mmsi=None, gap_min=None):
+    """Open episodes (seen within gap_min), longest first."""
+    now = int(now or time.time())
+    gap = (gap_min if gap_min is not None else load_config()["gap_min"]) * 60
+    sql = ("SELECT mmsi_a, mmsi_b, first_seen, last_seen, dist_m, min_dist_m, lat, lon, alerted "
+           "FROM proximity_pairs WHERE last_seen >= ? AND last_seen - first_seen >= ?")
+    args = [now - gap, int(min_minutes * 60)]
+    if mmsi is not None:
+        sql += " AND (mmsi_a = ? OR mmsi_b = ?)"; args += [mmsi, mmsi]
+    return con.execute(sql + " ORDER BY last_seen - first_seen DESC", args).fetchall()
@@ -0,0 +1,88 @@
+# src/queries.py
+"""
+Paged, index-backed reads for the dashboard Explorer.
+
+Vessel lists come from latest_positions (one row per MMSI, see src.spatial) in MMSI
+order and are paged with a keyset (mmsi > last seen) instead of OFFSET, so every page
+costs the same whatever the fleet size. Tracks are read per vessel on demand from
+positions(mmsi, ts), newest first, with the last (ts, source) seen as the cursor.
+"""
+import json
+
+from . import spatial
+from .classify import classify
+
+VESSEL_COLS = ["mmsi", "name", "ship_type", "ts", "lat", "lon", "sog", "cog", "source"]
+TRACK_COLS = ["mmsi", "ts", "lat", "lon", "sog", "cog", "heading", "draught", "nav_status", "source"]
+
+
+def _register(con):
+    # same classification as the dashboard filters; classify() caches per distinct string
+    con.create_function("vclass", 1, classify, deterministic=True)
+
+
+def _vessel_filters(since=None, vclass=None, mmsi=None, name_like=None,
+                    watchlist_only=False, favorites_only=False, bbox=None):
+    where, args = [], []
+    if since is not None:
+        where.append("l.ts >= ?"); args.append(int(since))
+    if vclass:
+        # vessels without a type stay visible, as on the map
+        where.append("(s.ship_type IS NULL OR vclass(s.ship_type) = ?)"); args.append(vclass)
+    if mmsi is not None:
+        where.append("l.mmsi = ?"); args.append(int(mmsi))
+    if name_like:
+        where.append("s.name LIKE ?"); args.append(f"%{name_like}%")
+    if favorites_only:
+        where.append("l.mmsi IN (SELECT mmsi FROM watchlist WHERE favorite = 1)")
+    elif watchlist_only:
+        where.append("l.mmsi IN (SELECT mmsi FROM watchlist)")
+    if bbox:
+        lat_min, lat_max, lon_min, lon_max = bbox
+        where.append("""EXISTS (SELECT 1 FROM json_each(?) r
+                         WHERE l.cell BETWEEN json_extract(r.value, '$[0]') AND json_extract(r.value, '$[1]'))""")
+        args.append(json.dumps(spatial.cell_ranges(lat_min, lat_max, lon_min, lon_max)))
+        where.append("l.lat BETWEEN ? AND ?"); args += [lat_min, lat_max]
+        where.append("l.lon BETWEEN ? AND ?" if lon_min <= lon_max else "(l.lon >= ? OR l.lon <= ?)")
+        args += [lon_min, lon_max]
+    return where, args
+
+
+def vessel_page(con, after=None, limit=100, **filters):
+    """
+    Up to `limit` vessels (VESSEL_COLS) with mmsi > after, in MMSI order.
+    filters: since, vclass, mmsi, name_like, watchlist_only, favorites_only, bbox.
+    """
+    _register(con)
+    where, args = _vessel_filters(**filters)
+    if after is not None:
+        where.append("l.mmsi > ?"); args.append(int(after))
+    sql = """
+        SELECT l.mmsi, s.name, s.ship_type, l.ts, l.lat, l.lon, l.sog, l.cog, l.source
+          FROM latest_positions l LEFT JOIN ships s ON s.mmsi = l.mmsi
+    """ + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY l.mmsi LIMIT ?"
+    return con.execute(sql, args + [int(limit)]).fetchall()
+
+
+def vessel_count(con, **filters):
+    _register(con)
+    where, args = _vessel_filters(**filters)
+    sql = "SELECT COUNT(*) FROM latest_positions l LEFT JOIN ships s ON s.mmsi = l.mmsi"
+    return con.execute(sql + (" WHERE " + " AND ".join(where) if where else ""), args).fetchone()[0]
+
+
+def track_page(con, mmsi, before=None, limit=500, since=None):
+    """
+    Up to `limit` fixes (TRACK_COLS) of one vessel, newest first. before is the
+    (ts, source) of the last row of the previous page; source breaks ties between
+    reports that share a timestamp. A missing source (NULL, or NaN from a DataFrame)
+    sorts as '' so the cursor never skips or repeats those rows.
+    """
+    sql = f"SELECT {', '.join(TRACK_COLS)} FROM positions WHERE mmsi = ?"
+    args = [int(mmsi)]
+    if before is not None:
+        source = before[1] if isinstance(before[1], str) else ""
+        sql += " AND (ts, COALESCE(source, '')) < (?, ?)"; args += [int(before[0]), source]
+    if since is not None:
+        sql += " AND ts >= ?"; args.append(int(since))
+    return con.execute(sql + " ORDER BY ts DESC, COALESCE(source, '') DESC LIMIT ?", args + [int(limit)]).fetchall()
@@ -0,0 +1,221 @@
+# src/rollups.py
+"""
+Hourly and daily rollups maintained at ingest.
+
+One row per (res, bucket, cell, class, source): res 'h' or 'd', bucket start (UTC epoch s),
+src.spatial grid cell, vessel class (Tanker / Cargo / Other) and source. A row holds
+stored-fix count, SOG sum and count for means, and a distinct-vessel sketch.
+src.db.insert_positions folds every batch in with one upsert per touched row, in
+the same transaction, so rollups never need a scan of `positions`.
+
+The sketch is a sorted MMSI set while it has at most SPARSE_MAX members (exact).
+Past that it becomes a HyperLogLog with 2**P registers (~3% error). Sketches merge
+(union) in SQL via the hll_merge function, and at query time across cells and classes.
+A region's distinct vessels per bucket is therefore a union, not a sum that would
+double-count vessels crossing cells.
+
+Counts are of stored fixes, so they reflect the track filter's dead-band. Regions are
+snapped outward to whole grid cells. A vessel's class is its watchlist.class when set,
+else src.classify of ships.ship_type, looked up again after CLASS_TTL_S so processes
+agree once a vessel is (re)classified. Connections that write rollups need hll_merge:
+register(con), which src.db.get_conn does.
+"""
+import json, time
+
+import numpy as np
+
+from .spatial import cell_of, cell_ranges
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS rollups(
+  res TEXT NOT NULL, bucket INTEGER NOT NULL, cell INTEGER NOT NULL,
+  class TEXT NOT NULL, source TEXT NOT NULL,
+  fixes INTEGER, sog_sum REAL, sog_n INTEGER, vessels BLOB,
+  PRIMARY KEY (res, bucket, cell, class, source)
+) WITHOUT ROWID;
+'''
+
+RESOLUTIONS = {"h": 3600, "d": 86400}
+OTHER = "Other"
+
+P = 10                    # HLL precision: 1024 registers
+M = 1 << P
+SPARSE_MAX = 256          # exact MMSI set up to this size (same bytes as the dense form)
+_ALPHA = 0.7213 / (1 + 1.079 / M)
+
+
+# ------------------------------------------------------------
+# Distinct-count sketch
+# ------------------------------------------------------------
+def _hash(ids):
+    """splitmix64 of uint64 ids."""
+    z = np.asarray(ids, dtype=np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def _registers(ids):
+    regs = np.zeros(M, dtype=np.uint8)
+    if len(ids):
+        h = _hash(ids)
+        idx = (h >> np.uint64(64 - P)).astype(np.int64)
+        w = h << np.uint64(P)
+        hi = (w >> np.uint64(32)).astype(np.float64)   # 32-bit halves convert to float exactly
+        lo = (w & np.uint64(0xFFFFFFFF)).astype(np.float64)
+        with np.errstate(divide="ignore"):
+            lz = np.where(hi > 0, 31 - np.floor(np.log2(hi)),
+                          np.where(lo > 0, 63 - np.floor(np.log2(lo)), 64 - P))
+        np.maximum.at(regs, idx, np.minimum(lz + 1, 64 - P + 1).astype(np.uint8))
+    return regs
+
+
+def _decode(blob):
+    """(set of MMSIs or None, registers or None)."""
+    if not blob:
+        return np.zeros(0, dtype=np.uint32), None
+    if blob[:1] == b"S":
+        return np.frombuffer(blob, dtype="<u4", offset=1), None
+    return None, np.frombuffer(blob, dtype=np.uint8, offset=1)
+
+
+def sketch(ids=(), regs=None):
+    """Encode a set of MMSIs (plus optional dense registers) as a sketch blob."""
+    ids = np.unique(np.asarray(ids, dtype=np.uint32))
+    if regs is None and len(ids) <= SPARSE_MAX:
+        return b"S" + ids.astype("<u4").tobytes()
+    dense = _registers(ids)
+    if regs is not None:
+        dense = np.maximum(dense, regs)
+    return b"D" + dense.tobytes()
+
+
+def merge_many(blobs):
+    """Union of sketch blobs, as one blob."""
+    ids, regs = [], None
+    for b in blobs:
+        s, r = _decode(b)
+        if r is not None:
+            regs = r.copy() if regs is None else np.maximum(regs, r)
+        else:
+            ids.append(s)
+    return sketch(np.concatenate(ids) if ids else (), regs)
+
+
+def merge(a, b):
+    """hll_merge(a, b) SQL function."""
+    return merge_many((a, b))
+
+
+def estimate(blob):
+    """Distinct vessels in a sketch: exact for sparse sketches, HLL estimate otherwise."""
+    s, regs = _decode(blob)
+    if regs is None:
+        return int(len(s))
+    e = _ALPHA * M * M / np.sum(np.ldexp(1.0, -regs.astype(np.int64)))
+    zeros = int(np.count_nonzero(regs == 0))
+    if e <= 2.5 * M and zeros:
+        e = M * np.log(M / zeros)  # linear counting for small cardinalities
+    return int(round(e))
+
+
+# ------------------------------------------------------------
+# Maintenance (called inside the write transaction)
+# ------------------------------------------------------------
+UPSERT_SQL = """
+    INSERT INTO rollups(res, bucket, cell, class, source, fixes, sog_sum, sog_n, vessels)
+    VALUES (?,?,?,?,?,?,?,?,?)
+    ON CONFLICT(res, bucket, cell, class, source) DO UPDATE SET
+      fixes = fixes + excluded.fixes, sog_sum = sog_sum + excluded.sog_sum,
+      sog_n = sog_n + excluded.sog_n, vessels = hll_merge(vessels, excluded.vessels)
+"""
+
+CLASS_TTL_S = 3600
+_classes = {}   # mmsi -> (class label, monotonic time looked up)
+
+
+def register(con):
+    """Make hll_merge available on con; once per connection, not per statement."""
+    con.create_function("hll_merge", 2, merge, deterministic=True)
+
+
+def _vessel_classes(con, mmsis):
+    from .classify import classify
+    now = time.monotonic()
+    missing = [m for m in mmsis if m not in _classes or now - _classes[m][1] > CLASS_TTL_S]
+    if missing:
+        found = {m: (wl, st) for m, wl, st in con.execute("""
+            SELECT j.value, w.class, s.ship_type FROM json_each(?) j
+              LEFT JOIN watchlist w ON w.mmsi = j.value LEFT JOIN ships s ON s.mmsi = j.value
+        """, (json.dumps(missing),))}
+        for m in missing:
+            wl, st = found.get(m, (None, None))
+            _classes[m] = (wl or classify(st) or OTHER, now)
+    return {m: _classes[m][0] for m in mmsis}
+
+
+def update(con, rows):
+    """Fold positions tuples (src.db.POSITION_COLS order) into the hourly and daily rollups."""
+    if not rows:
+        return
+    classes = _vessel_classes(con, {r[0] for r in rows})
+    groups = {}
+    for mmsi, ts, lat, lon, sog, _cog, _hdg, _dr, _nav, src in rows:
+        if ts is None or lat is None or lon is None:
+            continue
+        key_rest = (cell_of(lat, lon), classes.get(mmsi, OTHER), src or "unknown")
+        for res, size in RESOLUTIONS.items():
+            g = groups.get((res, ts - ts % size) + key_rest)
+            if g is None:
+                g = groups[(res, ts - ts % size) + key_rest] = [0, 0.0, 0, set()]
+            g[0] += 1
+            if sog is not None:
+                g[1] += sog; g[2] += 1
+            g[3].add(mmsi)
+    con.executemany(UPSERT_SQL, [(*k, n, ss, sn, sketch(list(ids))) for k, (n, ss, sn, ids) in groups.items()])
+
+
+# ------------------------------------------------------------
+# Queries: O(buckets x cells of the area)
+# ------------------------------------------------------------
+def query(con, res="h", start=None, end=None, bbox=None, vclass=None, source=None, by=("class",)):
+    """
+    Rows per bucket (and per `by` keys: 'class', 'source'): fixes, mean_sog, vessels
+    (distinct, merged over cells). bbox (lat_min, lat_max, lon_min, lon_max) snaps to cells.
+    """
+    if res not in RESOLUTIONS:
+        raise ValueError(f"res must be one of {sorted(RESOLUTIONS)}")
+    sql = "SELECT bucket, class, source, fixes, sog_sum, sog_n, vessels FROM rollups"
+    where, args = ["res = ?"], [res]
+    if bbox is not None:
+        sql += (" JOIN json_each(?) r ON cell BETWEEN json_extract(r.value, '$[0]') "
+                "AND json_extract(r.value, '$[1]')")
+        args.insert(0, json.dumps(cell_ranges(*bbox)))
+    if start is not None:
+        where.append("bucket >= ?"); args.append(int(start) - int(start) % RESOLUTIONS[res])
+    if end is not None:
+        where.append("bucket <= ?"); args.append(int(end))
+    if vclass:
+        where.append("class = ?"); args.append(vclass)
+    if source:
+        where.append("source = ?"); args.append(source)
+    by = [k for k in ("class", "source") if k in by]
+    groups = {}
+    for bucket, cls, src, n, ss, sn, blob in con.execute(f"{sql} WHERE {' AND '.join(where)}", args):
+        key = (bucket,) + tuple(cls if k == "class" else src for k in by)
+        g = groups.get(key)
+        if g is None:
+            g = groups[key] = [0, 0.0, 0, []]
+        g[0] += n; g[1] += ss or 0.0; g[2] += sn or 0; g[3].append(blob)
+    out = []
+    for key in sorted(groups):
+        n, ss, sn, blobs = groups[key]
+        row = {"bucket": key[0], **dict(zip(by, key[1:]))}
+        row.update(fixes=n, mean_sog=round(ss / sn, 2) if sn else None, vessels=estimate(merge_many(blobs)))
+        out.append(row)
+    return out
+
+
+def prune(con, res, before):
+    """Drop buckets of `res` older than `before` (epoch s); returns rows deleted."""
+    return con.execute("DELETE FROM rollups WHERE res = ? AND bucket < ?", (res, int(before))).rowcount
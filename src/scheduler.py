@@ -0,0 +1,189 @@
+# src/scheduler.py
+"""
+Adaptive per-vessel polling for the position ingesters.
+
+Every vessel sits in a heap keyed on its next-due time. After each poll its interval
+is recomputed from the last SOG, how stale its last fix is, watchlist.favorite and
+recent alerts, then clamped. A global budget (lookups per minute) caps each tick;
+anything over budget simply stays due and is served first on the next tick.
+"""
+import heapq, json, time
+
+from . import metrics
+from .db import get_conn
+from .locator import format_stats
+
+# SOG bands (kn) -> base interval (s): moored/anchored vessels barely move
+SOG_BANDS = ((0.5, 1800), (3.0, 900), (8.0, 420), (12.0, 300))
+UNDERWAY_INTERVAL = 180
+UNKNOWN_INTERVAL = 300
+
+FAVORITE_FACTOR = 0.5
+ALERT_FACTOR = 0.5
+ALERT_WINDOW_S = 3600
+DARK_AFTER_S = 6 * 3600  # fix older than this: the API has nothing new, back off
+
+
+def base_interval(sog):
+    if sog is None:
+        return UNKNOWN_INTERVAL
+    for limit, interval in SOG_BANDS:
+        if sog < limit:
+            return interval
+    return UNDERWAY_INTERVAL
+
+
+class PollScheduler:
+    def __init__(self, budget_per_min=600, min_interval=60, max_interval=3600):
+        self.budget_per_min = float(budget_per_min)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._heap = []      # (due_ts, mmsi); stale entries are skipped on pop
+        self._due = {}       # mmsi -> current due_ts
+        self.state = {}      # mmsi -> {"sog", "ts", "favorite", "alert_ts"}
+        self._tokens = self.budget_per_min
+        self._refill_ts = time.time()
+
+    # ---- fleet membership -------------------------------------------------
+    def sync(self, mmsis, favorites=(), alerts=None, latest=None, now=None):
+        """
+        Align the schedule with the current fleet. New vessels are due immediately
+        unless latest ({mmsi: (ts, sog)}) says they were seen recently.
+        """
+        now = now or time.time()
+        favorites = set(favorites); alerts = alerts or {}; latest = latest or {}
+        wanted = set(int(m) for m in mmsis)
+        for m in list(self.state):
+            if m not in wanted:
+                del self.state[m]; self._due.pop(m, None)
+        for m in wanted:
+            st = self.state.get(m)
+            if st is None:
+                ts, sog = latest.get(m, (None, None))
+                st = self.state[m] = {"ts": ts, "sog": sog, "favorite": False, "alert_ts": None}
+                st["favorite"] = m in favorites; st["alert_ts"] = alerts.get(m)
+                self._push(m, (ts + self.interval_for(m, now)) if ts else now)
+                continue
+            changed = st["favorite"] != (m in favorites) or st["alert_ts"] != alerts.get(m)
+            st["favorite"] = m in favorites; st["alert_ts"] = alerts.get(m)
+            if changed:  # pull forward if the vessel just became more important
+                self._push(m, min(self._due.get(m, now), (st["ts"] or now) + self.interval_for(m, now)))
+
+    def _push(self, mmsi, due):
+        self._due[mmsi] = due
+        heapq.heappush(self._heap, (due, mmsi))
+
+    # ---- intervals --------------------------------------------------------
+    def interval_for(self, mmsi, now=None):
+        now = now or time.time()
+        st = self.state[mmsi]
+        interval = base_interval(st["sog"])
+        if st["ts"]:
+            age = now - st["ts"]
+            if age > DARK_AFTER_S:
+                return self.max_interval
+            if age > interval:
+                interval *= 0.5
+        if st["favorite"]:
+            interval *= FAVORITE_FACTOR
+        if st["alert_ts"] and now - st["alert_ts"] < ALERT_WINDOW_S:
+            interval *= ALERT_FACTOR
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    # ---- polling ----------------------------------------------------------
+    def take_due(self, now=None):
+        """Pop due vessels, most overdue first, up to the remaining request budget."""
+        now = now or time.time()
+        self._tokens = min(self.budget_per_min,
+                           self._tokens + (now - self._refill_ts) * self.budget_per_min / 60.0)
+        self._refill_ts = now
+        out = []
+        while self._heap and self._heap[0][0] <= now and len(out) < int(self._tokens):
+            due, m = heapq.heappop(self._heap)
+            if self._due.get(m) != due:
+                continue
+            del self._due[m]
+            out.append(m)
+        self._tokens -= len(out)
+        return out
+
+    def record(self, mmsi, ts=None, sog=None, now=None):
+        """Reschedule a polled vessel; ts/sog None means the lookup failed."""
+        now = now or time.time()
+        st = self.state.get(mmsi)
+        if st is None:
+            return
+        if ts is not None:
+            st["ts"] = ts; st["sog"] = sog
+        self._push(mmsi, now + self.interval_for(mmsi, now))
+
+    def next_due(self):
+        while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def backlog(self, now=None):
+        now = now or time.time()
+        return sum(1 for due in self._due.values() if due <= now)
+
+
+def fleet_state(mmsis, con=None):
+    """(favorites, {mmsi: last alert ts}, {mmsi: (ts, sog)}) for mmsis from tanker.db."""
+    own = con is None
+    con = con or get_conn()
+    ids = json.dumps([int(m) for m in mmsis])
+    try:
+        try:
+            favorites = {m for (m,) in con.execute(
+                "SELECT mmsi FROM watchlist WHERE favorite = 1 AND mmsi IN (SELECT value FROM json_each(?))", (ids,))}
+        except Exception:
+            favorites = set()
+        try:
+            alerts = dict(con.execute(
+                "SELECT mmsi, MAX(ts) FROM alerts WHERE ts >= ? GROUP BY mmsi",
+                (int(time.time()) - ALERT_WINDOW_S,)).fetchall())
+        except Exception:
+            alerts = {}
+        latest = {m: (ts, sog) for m, ts, sog in con.execute("""
+            SELECT p.mmsi, p.ts, p.sog FROM json_each(?) j
+              JOIN positions p ON p.mmsi = j.value
+                              AND p.ts = (SELECT MAX(ts) FROM positions WHERE mmsi = j.value)
+        """, (ids,))}
+    finally:
+        if own: con.close()
+    return favorites, alerts, latest
+
+
+def run_scheduled(locator, load_fleet, budget_per_min, tick=10, refresh=60,
+                  min_interval=60, max_interval=3600, log_prefix="[sched]", register_ships=False):
+    """
+    Poll forever with a PollScheduler. load_fleet() returns the MMSIs to track and is
+    re-read every `refresh` seconds, together with favorites/alerts/last fixes.
+    """
+    sched = PollScheduler(budget_per_min, min_interval=min_interval, max_interval=max_interval)
+    last_refresh = 0.0
+    while True:
+        now = time.time()
+        if now - last_refresh >= refresh:
+            fleet = load_fleet()
+            favorites, alerts, latest = fleet_state(fleet)
+            sched.sync(fleet, favorites, alerts, latest, now=now)
+            last_refresh = now
+        batch = sched.take_due(now)
+        metrics.set_gauge("tracker_queue_depth", sched.backlog(now), queue="poll_scheduler")
+        if batch:
+            try:
+                rows, stats = locator.run_cycle(batch, register_ships=register_ships)
+            except Exception as e:
+                print(f"{log_prefix} cycle error {e}")
+                rows, stats = [], None
+            seen = {r[0]: r for r in rows}
+            done = time.time()
+            for m in batch:
+                r = seen.get(m)
+                sched.record(m, r[1] if r else None, r[4] if r else None, now=done)
+            if stats:
+                print(f"{log_prefix} {format_stats(stats)} backlog={sched.backlog(done)} fleet={len(sched.state)}")
+        nxt = sched.next_due()
+        wait = tick if nxt is None else min(tick, max(1.0, nxt - time.time()))
+        time.sleep(wait)
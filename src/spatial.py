@@ -0,0 +1,241 @@
+# src/spatial.py
+"""
+Grid-cell spatial index over positions.
+
+The globe is cut into CELL_DEG x CELL_DEG cells numbered row-major from (-90, -180),
+so every latitude row of a bbox is one contiguous cell range. Two tables are kept
+current by src.db.write_positions:
+  latest_positions(mmsi PK, ..., cell)   latest fix per vessel, indexed on cell
+  track_cells(cell, hour, mmsi)          which vessels were in which cell each hour
+Regional questions then touch only the cells of the area instead of all positions.
+track_cells grows by the hour; with spatial.track_days set in config.yaml,
+scripts/build_spatial_index.py --prune drops older hours and lookups that reach back
+further fall back to reading positions (see horizon()).
+"""
+import json, math, time
+from pathlib import Path
+
+import yaml
+
+CELL_DEG = 0.5
+N_COLS = int(360 / CELL_DEG)
+N_ROWS = int(180 / CELL_DEG)
+
+CFG_PATH = Path(__file__).resolve().parents[1] / "config.yaml"
+DEFAULTS = {
+    "track_days": None,     # track_cells hours kept by --prune (None: keep everything)
+}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS latest_positions(
+  mmsi INTEGER PRIMARY KEY,
+  ts INTEGER, lat REAL, lon REAL, sog REAL, cog REAL, heading REAL,
+  nav_status TEXT, source TEXT, cell INTEGER,
+  updated_at INTEGER      -- wall-clock time of the write that set this row (src.gaps polls on it)
+);
+CREATE INDEX IF NOT EXISTS idx_latest_cell ON latest_positions(cell);
+CREATE INDEX IF NOT EXISTS idx_latest_ts ON latest_positions(ts);
+CREATE TABLE IF NOT EXISTS track_cells(
+  cell INTEGER, hour INTEGER, mmsi INTEGER,
+  PRIMARY KEY (cell, hour, mmsi)
+) WITHOUT ROWID;
+'''
+
+LATEST_COLS = ["mmsi", "ts", "lat", "lon", "sog", "cog", "heading", "nav_status", "source"]
+
+
+def load_config():
+    opts = dict(DEFAULTS)
+    try:
+        opts.update(yaml.safe_load(open(CFG_PATH, "r", encoding="utf-8")).get("spatial") or {})
+    except Exception:
+        pass
+    return opts
+
+
+def cell_of(lat, lon):
+    r = min(N_ROWS - 1, max(0, int((lat + 90.0) // CELL_DEG)))
+    c = int(((lon + 180.0) % 360.0) // CELL_DEG)
+    return r * N_COLS + c
+
+
+def cell_ranges(lat_min, lat_max, lon_min, lon_max):
+    """[(lo, hi), ...] cell ranges covering the bbox; lon_min > lon_max wraps the antimeridian."""
+    r0 = max(0, int((lat_min + 90.0) // CELL_DEG))
+    r1 = min(N_ROWS - 1, int((lat_max + 90.0) // CELL_DEG))
+    if lon_max - lon_min >= 360:
+        spans = [(0, N_COLS - 1)]
+    else:
+        c0 = int(((lon_min + 180.0) % 360.0) // CELL_DEG)
+        c1 = int(((lon_max + 180.0) % 360.0) // CELL_DEG)
+        spans = [(c0, c1)] if c0 <= c1 else [(c0, N_COLS - 1), (0, c1)]
+    if spans == [(0, N_COLS - 1)]:
+        return [(r0 * N_COLS, r1 * N_COLS + N_COLS - 1)]  # full rows are one contiguous range
+    return [(r * N_COLS + a, r * N_COLS + b) for r in range(r0, r1 + 1) for a, b in spans]
+
+
+def _lon_pred(col, lon_min, lon_max):
+    return (f"{col} BETWEEN ? AND ?", (lon_min, lon_max)) if lon_min <= lon_max \
+        else (f"({col} >= ? OR {col} <= ?)", (lon_min, lon_max))
+
+
+# ------------------------------------------------------------
+# Maintenance (called inside the write transaction)
+# ------------------------------------------------------------
+def index_positions(con, rows):
+    """Fold positions tuples (src.db.POSITION_COLS order) into latest_positions / track_cells."""
+    if not rows:
+        return
+    now = int(time.time())
+    latest, cells = {}, set()
+    for r in rows:
+        mmsi, ts, lat, lon = r[0], r[1], r[2], r[3]
+        if lat is None or lon is None:
+            continue
+        cell = cell_of(lat, lon)
+        cells.add((cell, ts // 3600, mmsi))
+        prev = latest.get(mmsi)
+        if prev is None or ts >= prev[1]:
+            latest[mmsi] = (mmsi, ts, lat, lon, r[4], r[5], r[6], r[8], r[9], cell, now)
+    con.executemany("""
+        INSERT INTO latest_positions(mmsi, ts, lat, lon, sog, cog, heading, nav_status, source, cell, updated_at)
+        VALUES (?,?,?,?,?,?,?,?,?,?,?)
+        ON CONFLICT(mmsi) DO UPDATE SET
+          ts=excluded.ts, lat=excluded.lat, lon=excluded.lon, sog=excluded.sog, cog=excluded.cog,
+          heading=excluded.heading, nav_status=excluded.nav_status, source=excluded.source, cell=excluded.cell,
+          updated_at=excluded.updated_at
+        WHERE excluded.ts >= latest_positions.ts
+    """, list(latest.values()))
+    con.executemany("INSERT OR IGNORE INTO track_cells(cell, hour, mmsi) VALUES (?,?,?)", list(cells))
+
+
+def rebuild(con, since=None):
+    """Repopulate both tables from positions (for databases that predate the index)."""
+    con.execute("DELETE FROM latest_positions")
+    con.execute("DELETE FROM track_cells")
+    cur = con.execute(
+        "SELECT mmsi, ts, lat, lon, sog, cog, heading, draught, nav_status, source FROM positions"
+        + (" WHERE ts >= ?" if since else "") + " ORDER BY mmsi, ts", (since,) if since else ())
+    n = 0
+    while True:
+        chunk = cur.fetchmany(50000)
+        if not chunk:
+            break
+        index_positions(con, chunk)
+        n += len(chunk)
+    con.commit()
+    return n
+
+
+def horizon(now=None, track_days=None):
+    """Oldest ts (epoch s) track_cells answers for when spatial.track_days prunes it, else None."""
+    days = track_days if track_days is not None else load_config()["track_days"]
+    if not days:
+        return None
+    return int((now or time.time()) - float(days) * 86400) // 3600 * 3600
+
+
+def prune(con, before):
+    """Drop track_cells hours that end before `before` (epoch s); returns rows deleted."""
+    return con.execute("DELETE FROM track_cells WHERE hour < ?", (int(before) // 3600,)).rowcount
+
+
+# ------------------------------------------------------------
+# Queries
+# ------------------------------------------------------------
+def latest_in_bbox(con, lat_min, lat_max, lon_min, lon_max, since=None):
+    """Latest fix (LATEST_COLS) of every vessel inside the bbox, optionally seen since `since`."""
+    lon_sql, lon_args = _lon_pred("l.lon", lon_min, lon_max)
+    sql = f"""
+        SELECT l.mmsi, l.ts, l.lat, l.lon, l.sog, l.cog, l.heading, l.nav_status, l.source
+          FROM json_each(?) r
+          JOIN latest_positions l ON l.cell BETWEEN json_extract(r.value, '$[0]') AND json_extract(r.value, '$[1]')
+         WHERE l.lat BETWEEN ? AND ? AND {lon_sql}
+    """
+    args = [json.dumps(cell_ranges(lat_min, lat_max, lon_min, lon_max)), lat_min, lat_max, *lon_args]
+    if since is not None:
+        sql += " AND l.ts >= ?"; args.append(since)
+    return con.execute(sql, args).fetchall()
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(min(1.0, a)))
+
+
+def radius_bbox(lat, lon, km):
+    """Bbox (lat_min, lat_max, lon_min, lon_max) enclosing a circle; may wrap the antimeridian."""
+    dlat = km / 111.32
+    lat_min, lat_max = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+    coslat = math.cos(math.radians(max(abs(lat_min), abs(lat_max))))
+    if coslat < 1e-6 or km / (111.32 * coslat) >= 180:
+        return lat_min, lat_max, -180.0, 180.0
+    dlon = km / (111.32 * coslat)
+    wrap = lambda x: (x + 180.0) % 360.0 - 180.0
+    return lat_min, lat_max, wrap(lon - dlon), wrap(lon + dlon)
+
+
+def latest_in_radius(con, lat, lon, km, since=None):
+    """Latest fixes within km of (lat, lon): bbox prefilter on cells, exact haversine after."""
+    rows = latest_in_bbox(con, *radius_bbox(lat, lon, km), since=since)
+    return [r for r in rows if haversine_km(lat, lon, r[2], r[3]) <= km]
+
+
+def vessels_in_bbox(con, lat_min, lat_max, lon_min, lon_max, start, end):
+    """
+    MMSIs with at least one fix in the bbox cells between start and end (epoch s).
+    Complete only from horizon() on; older hours may have been pruned.
+    """
+    cur = con.execute("""
+        SELECT DISTINCT t.mmsi FROM json_each(?) r
+          JOIN track_cells t ON t.cell BETWEEN json_extract(r.value, '$[0]') AND json_extract(r.value, '$[1]')
+         WHERE t.hour BETWEEN ? AND ?
+    """, (json.dumps(cell_ranges(lat_min, lat_max, lon_min, lon_max)), int(start) // 3600, int(end) // 3600))
+    return [m for (m,) in cur.fetchall()]
+
+
+def track_points_in_bbox(con, lat_min, lat_max, lon_min, lon_max, start, end):
+    """(mmsi, ts, lat, lon, sog, cog, source) fixes inside the bbox between start and end."""
+    mmsis = vessels_in_bbox(con, lat_min, lat_max, lon_min, lon_max, start, end)
+    if not mmsis:
+        return []
+    lon_sql, lon_args = _lon_pred("p.lon", lon_min, lon_max)
+    return con.execute(f"""
+        SELECT p.mmsi, p.ts, p.lat, p.lon, p.sog, p.cog, p.source
+          FROM json_each(?) j JOIN positions p ON p.mmsi = j.value
+         WHERE p.ts BETWEEN ? AND ? AND p.lat BETWEEN ? AND ? AND {lon_sql}
+         ORDER BY p.mmsi, p.ts
+    """, (json.dumps(mmsis), int(start), int(end), lat_min, lat_max, *lon_args)).fetchall()
+
+
+# ------------------------------------------------------------
+# Display aggregation (dashboard, zoomed-out views)
+# ------------------------------------------------------------
+def bin_vessels(lat, lon, vclass, favorite, cell_deg):
+    """
+    Aggregate vessel points into cell_deg grid cells: one row per occupied cell with
+    its center, total count, per-class counts (vclass 'Tanker'/'Cargo'/other) and favorites.
+    """
+    import numpy as np
+    import pandas as pd
+    lat = np.asarray(lat, dtype="float64"); lon = np.asarray(lon, dtype="float64")
+    ok = ~(np.isnan(lat) | np.isnan(lon))
+    lat, lon = lat[ok], lon[ok]
+    vclass = np.asarray(vclass, dtype=object)[ok]; favorite = np.asarray(favorite, dtype=bool)[ok]
+    n_cols = int(np.ceil(360.0 / cell_deg))
+    rows = np.floor((lat + 90.0) / cell_deg).astype(np.int64)
+    cols = np.floor(((lon + 180.0) % 360.0) / cell_deg).astype(np.int64)
+    keys, inv = np.unique(rows * n_cols + cols, return_inverse=True)
+    count = np.bincount(inv, minlength=len(keys))
+    tankers = np.bincount(inv, weights=(vclass == "Tanker"), minlength=len(keys)).astype(np.int64)
+    cargo = np.bincount(inv, weights=(vclass == "Cargo"), minlength=len(keys)).astype(np.int64)
+    return pd.DataFrame({
+        "lat": (keys // n_cols + 0.5) * cell_deg - 90.0,
+        "lon": (keys % n_cols + 0.5) * cell_deg - 180.0,
+        "count": count,
+        "tankers": tankers,
+        "cargo": cargo,
+        "other": count - tankers - cargo,
+        "favorites": np.bincount(inv, weights=favorite, minlength=len(keys)).astype(np.int64),
+    })
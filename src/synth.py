@@ -0,0 +1,185 @@
+# src/synth.py
+"""
+Synthetic fleet for scale tests.
+
+Each vessel trades between the ports of one region: it sails a leg to a random
+intermediate waypoint (course change) and on to the next port, then moors for 6-36 h
+(SOG 0, nav status 5) before leaving again. Cruise speed depends on the class (tankers
+slower than container/cargo), with small SOG/COG noise on every report. Reports come
+every report_s while under way and every MOORED_REPORT_S alongside, with a per-vessel
+phase, so the feed interleaves vessels the way a live stream does.
+
+    fleet = Fleet(2000, days=7)
+    ingest(fleet, get_client("synth"))     # batches of POSITION_COLS tuples, in time order
+
+The whole fleet advances with numpy per time step, so generation is not the
+bottleneck of an ingest benchmark. Same seed, same data.
+"""
+import time
+
+import numpy as np
+
+EARTH_M = 6371008.8
+KN = 1852.0 / 3600.0       # m/s per knot
+MOORED_REPORT_S = 180
+
+# trading regions: (port, lat, lon)
+REGIONS = {
+    "Gulf": [("Ras Tanura", 26.64, 50.17), ("Fujairah", 25.17, 56.37), ("Jebel Ali", 25.01, 55.06),
+             ("Kharg", 29.23, 50.32), ("Mina al Ahmadi", 29.06, 48.16), ("Sohar", 24.50, 56.63)],
+    "Malacca": [("Singapore", 1.26, 103.84), ("Port Klang", 3.00, 101.39), ("Tanjung Pelepas", 1.36, 103.55),
+                ("Penang", 5.41, 100.36), ("Belawan", 3.79, 98.69)],
+    "North Sea": [("Rotterdam", 51.95, 4.05), ("Antwerp", 51.28, 4.33), ("Hamburg", 53.54, 9.97),
+                  ("Felixstowe", 51.95, 1.33), ("Le Havre", 49.48, 0.11), ("Wilhelmshaven", 53.59, 8.15)],
+    "Gulf of Mexico": [("Houston", 29.73, -95.01), ("Corpus Christi", 27.81, -97.39), ("LOOP", 28.88, -90.02),
+                       ("Veracruz", 19.21, -96.13), ("Tampa", 27.94, -82.45)],
+    "Med": [("Piraeus", 37.94, 23.63), ("Genoa", 44.40, 8.91), ("Marseille-Fos", 43.40, 4.88),
+            ("Algeciras", 36.13, -5.43), ("Augusta", 37.22, 15.22), ("Ceyhan", 36.88, 35.93)],
+    "East China": [("Shanghai", 30.63, 122.07), ("Ningbo", 29.94, 121.89), ("Qingdao", 36.07, 120.32),
+                   ("Busan", 35.08, 129.07), ("Tianjin", 38.97, 117.79)],
+}
+
+# class -> (AIS ship type codes, cruise speed range kn)
+CLASSES = {
+    "Tanker": ((80, 81, 82, 84, 89), (11.0, 14.5)),
+    "Cargo": ((70, 71, 74, 79), (13.0, 19.0)),
+    "Other": ((60, 52, 30, 90), (8.0, 13.0)),
+}
+
+
+def _bearing(lat1, lon1, lat2, lon2):
+    la1, la2, dl = np.radians(lat1), np.radians(lat2), np.radians(lon2 - lon1)
+    y = np.sin(dl) * np.cos(la2)
+    x = np.cos(la1) * np.sin(la2) - np.sin(la1) * np.cos(la2) * np.cos(dl)
+    return np.degrees(np.arctan2(y, x)) % 360
+
+
+def _dist_m(lat1, lon1, lat2, lon2):
+    x = np.radians(lon2 - lon1) * np.cos(np.radians((lat1 + lat2) / 2))
+    return EARTH_M * np.hypot(x, np.radians(lat2 - lat1))
+
+
+class Fleet:
+    def __init__(self, vessels, days=1.0, report_s=60, seed=1, end=None,
+                 tanker_share=0.5, cargo_share=0.35, mmsi_base=200000000, source="synth"):
+        self.n = int(vessels)
+        self.report_s = int(report_s)
+        self.end = int(end or time.time())
+        self.start = self.end - int(days * 86400)
+        self.source = source
+        rnd = self.rnd = np.random.default_rng(seed)
+        self.mmsi = mmsi_base + np.arange(self.n, dtype=np.int64)
+        u = rnd.random(self.n)
+        self.vclass = np.where(u < tanker_share, "Tanker", np.where(u < tanker_share + cargo_share, "Cargo", "Other"))
+        self.ship_type = np.array([rnd.choice(CLASSES[c][0]) for c in self.vclass])
+        self.cruise = np.array([rnd.uniform(*CLASSES[c][1]) for c in self.vclass])
+        names = list(REGIONS)
+        self.region = rnd.integers(0, len(names), self.n)
+        self.ports = [np.array([(p[1], p[2]) for p in REGIONS[r]]) for r in names]
+        # start alongside a random port of the region, part-way through a stay
+        self.lat, self.lon = np.empty(self.n), np.empty(self.n)
+        self.port = np.empty(self.n, dtype=np.int64)
+        for i in range(self.n):
+            self.port[i] = rnd.integers(0, len(self.ports[self.region[i]]))
+            self.lat[i], self.lon[i] = self.ports[self.region[i]][self.port[i]]
+        self.moored_until = self.start + rnd.uniform(0, 24 * 3600, self.n)
+        self.tgt_lat, self.tgt_lon = self.lat.copy(), self.lon.copy()     # current leg target
+        self.dst_lat, self.dst_lon = self.lat.copy(), self.lon.copy()     # port at the end of the leg
+        self.via_wp = np.zeros(self.n, dtype=bool)                         # target is the waypoint
+        self.cog = rnd.uniform(0, 360, self.n)
+        self.phase = rnd.integers(0, max(1, MOORED_REPORT_S // self.report_s), self.n)
+        self.offset = rnd.integers(0, self.report_s, self.n)               # seconds into each step
+
+    def ships(self):
+        """ships(mmsi, ship_type, name) stubs for the whole fleet."""
+        return [(int(m), int(t), f"SYNTH {c.upper()} {i}")
+                for i, (m, t, c) in enumerate(zip(self.mmsi, self.ship_type, self.vclass))]
+
+    def _depart(self, idx):
+        rnd = self.rnd
+        for i in idx:
+            ports = self.ports[self.region[i]]
+            nxt = rnd.integers(0, len(ports) - 1)
+            nxt += nxt >= self.port[i]                     # any port but this one
+            self.port[i] = nxt
+            self.dst_lat[i], self.dst_lon[i] = ports[nxt]
+            # waypoint off the straight line: one real course change per leg
+            mid_lat = (self.lat[i] + self.dst_lat[i]) / 2
+            mid_lon = (self.lon[i] + self.dst_lon[i]) / 2
+            dlat, dlon = self.dst_lat[i] - self.lat[i], self.dst_lon[i] - self.lon[i]
+            k = rnd.uniform(-0.25, 0.25)
+            self.tgt_lat[i], self.tgt_lon[i] = mid_lat - k * dlon, mid_lon + k * dlat
+            self.via_wp[i] = True
+
+    def _step(self, t, dt):
+        """Advance every vessel by dt seconds to time t; returns (sog, nav) arrays."""
+        rnd = self.rnd
+        moored = self.moored_until > t
+        leaving = ~moored & (self.moored_until > t - dt)
+        if leaving.any():
+            self._depart(np.nonzero(leaving)[0])
+        sog = np.where(moored, 0.0, np.maximum(0.5, self.cruise + rnd.normal(0, 0.3, self.n)))
+        brg = _bearing(self.lat, self.lon, self.tgt_lat, self.tgt_lon)
+        dist = _dist_m(self.lat, self.lon, self.tgt_lat, self.tgt_lon)
+        step = sog * KN * dt
+        arrive = ~moored & (dist <= step)
+        go = ~moored & ~arrive
+        d = np.where(go, step / EARTH_M, 0.0)
+        b = np.radians(brg + rnd.normal(0, 1.5, self.n))
+        la = np.radians(self.lat)
+        new_la = np.arcsin(np.sin(la) * np.cos(d) + np.cos(la) * np.sin(d) * np.cos(b))
+        new_lo = np.radians(self.lon) + np.arctan2(np.sin(b) * np.sin(d) * np.cos(la),
+                                                   np.cos(d) - np.sin(la) * np.sin(new_la))
+        self.lat = np.where(go, np.degrees(new_la), self.lat)
+        self.lon = np.where(go, (np.degrees(new_lo) + 180) % 360 - 180, self.lon)
+        self.cog = np.where(go, (brg + rnd.normal(0, 1.0, self.n)) % 360, self.cog)
+        if arrive.any():
+            self.lat = np.where(arrive, self.tgt_lat, self.lat)
+            self.lon = np.where(arrive, self.tgt_lon, self.lon)
+            wp = arrive & self.via_wp                        # waypoint: turn towards the port
+            self.tgt_lat = np.where(wp, self.dst_lat, self.tgt_lat)
+            self.tgt_lon = np.where(wp, self.dst_lon, self.tgt_lon)
+            self.via_wp &= ~wp
+            port = arrive & ~wp                              # port: moor for 6-36 h
+            self.moored_until = np.where(port, t + rnd.uniform(6 * 3600, 36 * 3600, self.n), self.moored_until)
+            sog = np.where(port, 0.0, sog)
+            moored = moored | port
+        return sog, np.where(moored, 5, 0)
+
+    def batches(self, rows_per_batch=5000):
+        """Lists of POSITION_COLS tuples in time order, from start to end."""
+        out = []
+        every = max(1, MOORED_REPORT_S // self.report_s)
+        for k, t in enumerate(range(self.start + self.report_s, self.end + 1, self.report_s)):
+            sog, nav = self._step(t, self.report_s)
+            report = (nav == 0) | ((k + self.phase) % every == 0)
+            idx = np.nonzero(report)[0]
+            ts = t - self.report_s + self.offset[idx]
+            lat = self.lat[idx] + np.where(nav[idx] == 5, self.rnd.normal(0, 2e-5, len(idx)), 0.0)
+            out.extend(zip(self.mmsi[idx].tolist(), ts.tolist(), np.round(lat, 6).tolist(),
+                           np.round(self.lon[idx], 6).tolist(), np.round(sog[idx], 1).tolist(),
+                           np.round(self.cog[idx], 1).tolist(), np.round(self.cog[idx]).tolist(),
+                           [None] * len(idx), nav[idx].tolist(), [self.source] * len(idx)))
+            if len(out) >= rows_per_batch:
+                yield out
+                out = []
+        if out:
+            yield out
+
+
+def ingest(fleet, writer, rows_per_batch=5000, progress=None):
+    """
+    Feed the fleet through a writer client (src.ingest.writer_client), the same path live
+    producers use. Returns {"generated", "stored", "seconds"}.
+    """
+    t0 = time.perf_counter()
+    generated = stored = 0
+    ships = fleet.ships()
+    for rows in fleet.batches(rows_per_batch):
+        n = writer.write_positions(rows, ships=ships)
+        ships = None
+        generated += len(rows)
+        stored = None if n is None or stored is None else stored + n
+        if progress:
+            progress(generated)
+    return {"generated": generated, "stored": stored, "seconds": time.perf_counter() - t0}
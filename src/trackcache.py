@@ -0,0 +1,290 @@
+# src/trackcache.py
+"""
+Recent-track cache for the API's /history.
+
+Each cached vessel owns one slot: a ring of its newest `points` fixes kept as numpy
+columns in the compact encoding of positions_c (ts int64, lat/lon int32 micro-degrees,
+SOG/COG int16 tenths, source id), 22 bytes a fix. All slots are preallocated from
+max_mb, so the cache never grows past it; when a new vessel needs a slot, the one
+requested least recently is evicted.
+
+A vessel is loaded from tanker.db the first time it is requested and from then on kept
+current by the writer service's change stream (src.ingest.writer_client.subscribe),
+which a daemon thread follows. Requests the ring covers (the newest `limit` fixes, or a
+range that starts after the oldest buffered fix) are answered without touching the DB;
+anything else returns None and the caller queries as before. The cache only answers
+while the stream is connected: if it drops, everything is discarded and reloaded on
+demand once it is back. Producers that write directly (service down, writer.enabled
+false) bypass the stream, so a slot is also reloaded after max_age_s.
+"""
+import threading, time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+from . import metrics
+from .db import COORD_SCALE, TENTHS, UNKNOWN_SOURCE
+
+CFG_PATH = Path(__file__).resolve().parents[1] / "config.yaml"
+
+DEFAULTS = {
+    "enabled": True,
+    "points": 1000,     # fixes per vessel
+    "max_mb": 64,       # all rings together
+    "max_age_s": 600,   # reload a vessel from the DB after this long (0: never)
+}
+ROW_BYTES = 8 + 4 + 4 + 2 + 2 + 2
+NULL32 = np.iinfo(np.int32).min
+NULL16 = np.iinfo(np.int16).min
+RETRY_S = 10
+
+
+def load_config():
+    opts = dict(DEFAULTS)
+    try:
+        opts.update(yaml.safe_load(open(CFG_PATH, "r", encoding="utf-8")).get("track_cache") or {})
+    except Exception:
+        pass
+    return opts
+
+
+def _enc(v, k, null):
+    return null if v is None else int(round(float(v) * k))  # as src.db.compact_rows
+
+
+class TrackCache:
+    def __init__(self, points=1000, max_mb=64, max_age_s=600, **_):
+        self.cap = int(points)
+        self.nslots = max(1, int(max_mb * 2**20) // (self.cap * ROW_BYTES))
+        self.max_age_s = float(max_age_s or 0)
+        shape = (self.nslots, self.cap)
+        self.ts = np.zeros(shape, dtype=np.int64)
+        self.lat = np.zeros(shape, dtype=np.int32)
+        self.lon = np.zeros(shape, dtype=np.int32)
+        self.sog = np.zeros(shape, dtype=np.int16)
+        self.cog = np.zeros(shape, dtype=np.int16)
+        self.src = np.zeros(shape, dtype=np.int16)
+        self.cols = (self.ts, self.lat, self.lon, self.sog, self.cog, self.src)
+        self.head = np.zeros(self.nslots, dtype=np.int64)     # next write position
+        self.count = np.zeros(self.nslots, dtype=np.int64)
+        self.complete = np.zeros(self.nslots, dtype=bool)     # ring holds the vessel's whole history
+        self.loaded_at = np.zeros(self.nslots)
+        self.slots = OrderedDict()   # mmsi -> slot, least recently requested first
+        self.free = list(range(self.nslots))
+        self.pending = {}            # mmsi -> stream rows that arrived while it was being loaded
+        self.sources, self.source_ids = [], {}
+        self.live = False
+        self.generation = 0          # bumped by clear(): loads started before it are void
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+
+    # ---- encoding ---------------------------------------------------------
+    def _source_id(self, name):
+        name = name or UNKNOWN_SOURCE
+        i = self.source_ids.get(name)
+        if i is None:
+            i = self.source_ids[name] = len(self.sources)
+            self.sources.append(name)
+        return i
+
+    def _encode(self, ts, lat, lon, sog, cog, source):
+        return (int(ts), _enc(lat, COORD_SCALE, NULL32), _enc(lon, COORD_SCALE, NULL32),
+                _enc(sog, TENTHS, NULL16), _enc(cog, TENTHS, NULL16), self._source_id(source))
+
+    def _decode(self, s, idx):
+        """(ts, lat, lon, sog, cog, source) tuples for ring positions idx of slot s."""
+        out = []
+        for a, k, null in ((self.lat, COORD_SCALE, NULL32), (self.lon, COORD_SCALE, NULL32),
+                           (self.sog, float(TENTHS), NULL16), (self.cog, float(TENTHS), NULL16)):
+            v = a[s, idx]
+            col = (v / k).tolist()
+            for i in np.nonzero(v == null)[0].tolist():
+                col[i] = None
+            out.append(col)
+        names = [self.sources[i] for i in self.src[s, idx].tolist()]
+        return list(zip(self.ts[s, idx].tolist(), *out, names))
+
+    # ---- ring -------------------------------------------------------------
+    def _write(self, s, i, row):
+        for a, v in zip(self.cols, row):
+            a[s, i] = v
+
+    def _push(self, s, row):
+        n, cap = self.count[s], self.cap
+        if n and row[0] <= self.ts[s, (self.head[s] - 1) % cap]:
+            return self._insert(s, row)
+        self._write(s, self.head[s], row)
+        self.head[s] = (self.head[s] + 1) % cap
+        if n == cap:
+            self.complete[s] = False
+        else:
+            self.count[s] = n + 1
+
+    def _insert(self, s, row):
+        """A fix at or before the newest one: sorted insert, unless it is already there."""
+        n, cap = int(self.count[s]), self.cap
+        start = (self.head[s] - n) % cap
+        if start:  # straighten the ring so the fixes sit at 0..n-1
+            for a in self.cols:
+                a[s] = np.roll(a[s], -start)
+            self.head[s] = n % cap
+        lo, hi = np.searchsorted(self.ts[s, :n], row[0], "left"), np.searchsorted(self.ts[s, :n], row[0], "right")
+        if (self.src[s, lo:hi] == row[5]).any():  # same (ts, source): INSERT OR IGNORE kept the first
+            return
+        if n == cap:
+            if hi == 0:  # older than anything kept
+                return
+            for a in self.cols:
+                a[s, :hi - 1] = a[s, 1:hi]
+            self._write(s, hi - 1, row)
+            self.complete[s] = False
+            return
+        for a in self.cols:
+            a[s, hi + 1:n + 1] = a[s, hi:n]
+        self._write(s, hi, row)
+        self.count[s] = n + 1
+        self.head[s] = (n + 1) % cap
+
+    def _order(self, s):
+        """Ring positions of slot s, oldest first."""
+        n = int(self.count[s])
+        return (self.head[s] - n + np.arange(n)) % self.cap
+
+    # ---- stream -----------------------------------------------------------
+    def clear(self, live=False):
+        with self._lock:
+            self.slots.clear()
+            self.pending.clear()
+            self.free = list(range(self.nslots))
+            self.count[:] = 0
+            self.head[:] = 0
+            self.generation += 1
+            self.live = live
+
+    def append(self, rows):
+        """Stream rows (src.db.POSITION_COLS order) for the vessels held or being loaded."""
+        with self._lock:
+            for r in rows:
+                s = self.slots.get(r[0])
+                if s is not None:
+                    self._push(s, self._encode(r[1], r[2], r[3], r[4], r[5], r[9]))
+                elif r[0] in self.pending:
+                    self.pending[r[0]].append(r)
+
+    def follow(self, host=None, port=None):
+        """Keep the cache fed from the writer service's change stream (run on a daemon thread)."""
+        from .ingest.writer_client import subscribe
+        while True:
+            try:
+                for i, rows in enumerate(subscribe(host, port)):
+                    if i == 0:  # subscribed: from here on every commit reaches us
+                        self.clear(live=True)
+                        print("[trackcache] following the writer service")
+                    if rows:
+                        self.append(rows)
+            except Exception as e:
+                if self.live:
+                    print(f"[trackcache] change stream lost ({e}); serving /history from the DB")
+                self.clear(live=False)
+            time.sleep(RETRY_S)
+
+    # ---- reads ------------------------------------------------------------
+    def _slot(self, mmsi, load):
+        """Slot holding mmsi (loading it with load(n) -> newest-first rows on a miss), or None."""
+        with self._lock:
+            if not self.live:
+                return None
+            s = self.slots.get(mmsi)
+            if s is not None and self.max_age_s and time.time() - self.loaded_at[s] > self.max_age_s:
+                del self.slots[mmsi]
+                self.free.append(s)
+                s = None
+            if s is not None:
+                self.slots.move_to_end(mmsi)
+                self.hits += 1
+                metrics.cache_lookup("track_history", hits=1)
+                return s
+            self.misses += 1
+            metrics.cache_lookup("track_history", misses=1)
+            if mmsi in self.pending:  # another request is loading it
+                return None
+            self.pending[mmsi] = []
+            gen = self.generation
+        try:
+            rows = load(self.cap)
+        except Exception:
+            with self._lock:
+                self.pending.pop(mmsi, None)
+            raise
+        with self._lock:
+            queued = self.pending.pop(mmsi, None)
+            if gen != self.generation or mmsi in self.slots:
+                return None
+            if self.free:
+                s = self.free.pop()
+            else:
+                _, s = self.slots.popitem(last=False)
+            self.count[s] = self.head[s] = 0
+            for r in reversed(rows):
+                self._push(s, self._encode(*r))
+            self.complete[s] = len(rows) < self.cap
+            for r in queued or ():
+                self._push(s, self._encode(r[1], r[2], r[3], r[4], r[5], r[9]))
+            self.loaded_at[s] = time.time()
+            self.slots[mmsi] = s
+        return s
+
+    def newest(self, mmsi, limit, load):
+        """The newest `limit` fixes, newest first, or None when the ring cannot answer."""
+        if limit > self.cap:
+            return None
+        s = self._slot(mmsi, load)
+        if s is None:
+            return None
+        with self._lock:
+            if self.slots.get(mmsi) != s:  # evicted meanwhile
+                return None
+            idx = self._order(s)[::-1][:max(0, limit)]
+            return self._decode(s, idx)
+
+    def between(self, mmsi, start, end, load):
+        """Fixes with start <= ts <= end, oldest first, or None when the ring does not reach back to start."""
+        s = self._slot(mmsi, load)
+        if s is None:
+            return None
+        with self._lock:
+            if self.slots.get(mmsi) != s:
+                return None
+            idx = self._order(s)
+            ts = self.ts[s, idx]
+            if not self.complete[s] and (not len(idx) or ts[0] >= start):
+                return None
+            return self._decode(s, idx[(ts >= start) & (ts <= end)])
+
+    def stats(self):
+        with self._lock:
+            return {"live": self.live, "vessels": len(self.slots), "slots": self.nslots,
+                    "points_per_vessel": self.cap, "fixes": int(self.count.sum()),
+                    "mb": round(self.nslots * self.cap * ROW_BYTES / 2**20, 1),
+                    "hits": self.hits, "misses": self.misses}
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_cache():
+    """Process-wide cache per config.yaml `track_cache`, following the stream; None when disabled."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            from .ingest.writer_service import load_config as writer_config
+            opts = load_config()
+            if not opts["enabled"] or not writer_config()["enabled"]:
+                _default = False
+            else:
+                _default = TrackCache(**opts)
+                threading.Thread(target=_default.follow, name="trackcache", daemon=True).start()
+        return _default or None
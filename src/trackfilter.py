@@ -0,0 +1,127 @@
+# src/trackfilter.py
+"""
+Write-side filter for position reports.
+
+Each report is compared with the last stored state of its vessel. It is dropped when
+it falls inside the dead-band (moved less than min_move_m, course/speed/nav status
+unchanged within tolerance) and the heartbeat interval has not elapsed yet. A moored
+vessel therefore costs one row per heartbeat instead of one per report.
+"""
+import json, math
+from pathlib import Path
+
+import yaml
+
+from . import metrics
+
+CFG_PATH = Path(__file__).resolve().parents[1] / "config.yaml"
+
+DEFAULTS = {
+    "enabled": True,
+    "min_move_m": 50.0,      # dead-band radius
+    "cog_deg": 10.0,         # course change that always counts (only when under way)
+    "sog_kn": 1.0,           # speed change that always counts
+    "underway_kn": 1.0,      # below this COG is noise and ignored
+    "heartbeat_s": 900,      # keep at least one point per vessel this often
+}
+
+
+def _dist_m(lat1, lon1, lat2, lon2):
+    # equirectangular is plenty for a tens-of-metres dead-band
+    x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return 6371000.0 * math.hypot(x, y)
+
+
+class TrackFilter:
+    """Dead-band + heartbeat filter over positions tuples (src.db.POSITION_COLS order)."""
+
+    def __init__(self, min_move_m=50.0, cog_deg=10.0, sog_kn=1.0, underway_kn=1.0,
+                 heartbeat_s=900, enabled=True):
+        self.min_move_m = float(min_move_m)
+        self.cog_deg = float(cog_deg)
+        self.sog_kn = float(sog_kn)
+        self.underway_kn = float(underway_kn)
+        self.heartbeat_s = int(heartbeat_s)
+        self.enabled = enabled
+        self.last = {}   # mmsi -> (ts, lat, lon, sog, cog, nav_status) of the last stored point
+        self.kept = 0
+        self.suppressed = 0
+
+    def _prime(self, con, mmsis):
+        """Load the last stored point for vessels this process has not seen yet."""
+        missing = [m for m in mmsis if m not in self.last]
+        metrics.cache_lookup("track_filter", hits=len(mmsis) - len(missing), misses=len(missing))
+        if not missing or con is None:
+            return
+        for m, ts, lat, lon, sog, cog, nav in con.execute("""
+            SELECT p.mmsi, p.ts, p.lat, p.lon, p.sog, p.cog, p.nav_status FROM json_each(?) j
+              JOIN positions p ON p.mmsi = j.value
+                              AND p.ts = (SELECT MAX(ts) FROM positions WHERE mmsi = j.value)
+        """, (json.dumps(missing),)):
+            self.last[m] = (ts, lat, lon, sog, cog, nav)
+
+    def is_meaningful(self, row):
+        mmsi, ts, lat, lon, sog, cog, _heading, _draught, nav, _src = row
+        prev = self.last.get(mmsi)
+        if prev is None:
+            return True
+        pts, plat, plon, psog, pcog, pnav = prev
+        if ts < pts:
+            return True  # late/backfilled report: outside the live dead-band, keep as-is
+        if ts - pts >= self.heartbeat_s:
+            return True
+        if nav is not None and str(nav) != str(pnav):
+            return True
+        if (sog is None) != (psog is None) or (sog is not None and abs(sog - psog) >= self.sog_kn):
+            return True
+        if (cog is not None and pcog is not None and (sog or 0) >= self.underway_kn
+                and abs((cog - pcog + 180) % 360 - 180) >= self.cog_deg):
+            return True
+        if None in (plat, plon, lat, lon):
+            return True  # no position to measure against (e.g. a legacy row without lat/lon)
+        return _dist_m(plat, plon, lat, lon) >= self.min_move_m
+
+    def filter(self, rows, con=None):
+        """Rows worth storing, in input order; updates the per-vessel state and counters."""
+        if not self.enabled:
+            self.kept += len(rows)
+            return list(rows)
+        self._prime(con, {r[0] for r in rows})
+        out = []
+        for r in rows:
+            if self.is_meaningful(r):
+                out.append(r)
+                if r[0] not in self.last or r[1] >= self.last[r[0]][0]:
+                    self.last[r[0]] = (r[1], r[2], r[3], r[4], r[5], r[8])
+            else:
+                self.suppressed += 1
+        self.kept += len(out)
+        return out
+
+    def forget(self, mmsis=None):
+        """Drop the cached state of mmsis (all when None), e.g. after a rolled-back write: reloaded from the DB."""
+        if mmsis is None:
+            self.last.clear()
+        for m in mmsis or ():
+            self.last.pop(m, None)
+
+    def stats(self):
+        total = self.kept + self.suppressed
+        return {"kept": self.kept, "suppressed": self.suppressed,
+                "suppressed_pct": round(100.0 * self.suppressed / total, 1) if total else 0.0}
+
+
+_default = None
+
+def default_filter():
+    """Process-wide filter configured from config.yaml `track_filter`."""
+    global _default
+    if _default is None:
+        opts = dict(DEFAULTS)
+        try:
+            opts.update(yaml.safe_load(open(CFG_PATH, "r", encoding="utf-8")).get("track_filter") or {})
+        except Exception:
+            pass
+        _default = TrackFilter(**opts)
+    return _default
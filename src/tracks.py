@@ -0,0 +1,149 @@
+# src/tracks.py
+"""
+Track reduction for display.
+
+simplify_mask runs Douglas-Peucker over every vessel at once: each pass handles
+all open segments of all tracks with array ops, so the Python loop runs once per
+recursion level instead of once per point or per vessel.
+
+bucket_mask / lttb_mask / downsample reduce one long track to a bounded number of
+points for the /history endpoint, again with array ops only.
+"""
+import numpy as np
+import pandas as pd
+
+TILE_PX = 256
+
+
+def zoom_tolerance(zoom, pixels=1.5):
+    """Degrees spanned by `pixels` screen pixels at a web-mercator zoom level."""
+    return pixels * 360.0 / (TILE_PX * 2.0 ** float(zoom))
+
+
+def _group_bounds(ids):
+    """(starts, ends) inclusive index bounds of runs of equal ids (ids must be grouped)."""
+    if len(ids) == 0:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    brk = np.flatnonzero(ids[1:] != ids[:-1]) + 1
+    starts = np.concatenate(([0], brk))
+    ends = np.concatenate((brk - 1, [len(ids) - 1]))
+    return starts, ends
+
+
+def simplify_mask(ids, x, y, tol):
+    """
+    Boolean keep-mask for Douglas-Peucker with tolerance tol (same units as x/y).
+    ids/x/y are parallel arrays with each track contiguous and in time order.
+    """
+    ids = np.asarray(ids); x = np.asarray(x, dtype="float64"); y = np.asarray(y, dtype="float64")
+    keep = np.zeros(len(x), dtype=bool)
+    starts, ends = _group_bounds(ids)
+    keep[starts] = True
+    keep[ends] = True
+    open_ = ends - starts > 1
+    seg_s, seg_e = starts[open_], ends[open_]
+    while len(seg_s):
+        lens = seg_e - seg_s - 1
+        seg_id = np.repeat(np.arange(len(seg_s)), lens)
+        offsets = np.concatenate(([0], np.cumsum(lens)[:-1]))
+        pts = seg_s[seg_id] + 1 + (np.arange(len(seg_id)) - offsets[seg_id])
+
+        ax, ay = x[seg_s][seg_id], y[seg_s][seg_id]
+        dx, dy = x[seg_e][seg_id] - ax, y[seg_e][seg_id] - ay
+        px, py = x[pts] - ax, y[pts] - ay
+        norm = np.hypot(dx, dy)
+        dist = np.where(norm > 0, np.abs(dx * py - dy * px) / np.where(norm > 0, norm, 1.0), np.hypot(px, py))
+
+        seg_max = np.maximum.reduceat(dist, offsets)
+        hit = np.flatnonzero(dist == seg_max[seg_id])  # seg_id is sorted: first hit per segment
+        hit = hit[np.concatenate(([True], seg_id[hit][1:] != seg_id[hit][:-1]))]
+        first_seg, split_at = seg_id[hit], pts[hit]
+
+        split = seg_max[first_seg] > tol
+        k, s, e = split_at[split], seg_s[first_seg][split], seg_e[first_seg][split]
+        keep[k] = True
+        ns = np.concatenate((s, k)); ne = np.concatenate((k, e))
+        more = ne - ns > 1
+        seg_s, seg_e = ns[more], ne[more]
+    return keep
+
+
+def build_paths(df, tol, decimals=5):
+    """
+    DataFrame(mmsi, path) for pydeck's PathLayer from rows sorted by (mmsi, ts).
+    Coordinates are simplified, rounded and converted to Python lists in one call;
+    each vessel's path is then a slice of that list.
+    """
+    if df.empty:
+        return pd.DataFrame({"mmsi": pd.Series(dtype="Int64"), "path": pd.Series(dtype="object")})
+    ids = df["mmsi"].to_numpy(dtype="int64")
+    lon = df["lon"].to_numpy(dtype="float64"); lat = df["lat"].to_numpy(dtype="float64")
+    keep = simplify_mask(ids, lon, lat, tol)
+    ids, coords = ids[keep], np.column_stack((lon[keep], lat[keep])).round(decimals)
+    starts, ends = _group_bounds(ids)
+    flat = coords.tolist()
+    return pd.DataFrame({
+        "mmsi": pd.array(ids[starts], dtype="Int64"),
+        "path": [flat[a:b + 1] for a, b in zip(starts.tolist(), ends.tolist())],
+    })
+
+
+def bucket_mask(ts, seconds):
+    """Keep the last fix of every `seconds`-long time bucket (ts ascending)."""
+    b = np.asarray(ts, dtype=np.int64) // max(1, int(seconds))
+    keep = np.ones(len(b), dtype=bool)
+    keep[:-1] = b[1:] != b[:-1]
+    return keep
+
+
+def lttb_mask(x, y, n):
+    """
+    Keep-mask of n points picked Largest-Triangle-Three-Buckets style: first and last
+    point plus, per bucket of the interior, the point forming the largest triangle with
+    the neighbouring buckets' centroids. Using the previous bucket's centroid instead of
+    its selected point (as classic LTTB does) makes every bucket independent, so the
+    whole selection is a few array ops.
+    """
+    x = np.asarray(x, dtype="float64"); y = np.asarray(y, dtype="float64")
+    m = len(x)
+    keep = np.zeros(m, dtype=bool)
+    if m <= max(n, 2):
+        keep[:] = True
+        return keep
+    keep[[0, m - 1]] = True
+    if n <= 2:
+        return keep
+    bounds = np.floor(np.linspace(1, m - 1, n - 1)).astype(np.int64)  # n-2 buckets over 1 .. m-2
+    starts, counts = bounds[:-1], np.diff(bounds)
+    cx = np.add.reduceat(x, starts) / counts
+    cy = np.add.reduceat(y, starts) / counts
+    cx[-1] = x[starts[-1]:m - 1].mean(); cy[-1] = y[starts[-1]:m - 1].mean()  # reduceat runs to the array end
+    ax = np.concatenate(([x[0]], cx[:-1])); ay = np.concatenate(([y[0]], cy[:-1]))
+    bx = np.concatenate((cx[1:], [x[-1]])); by = np.concatenate((cy[1:], [y[-1]]))
+    bucket = np.repeat(np.arange(len(starts)), counts)
+    pts = np.arange(1, m - 1)
+    area = np.abs((ax[bucket] - bx[bucket]) * (y[pts] - ay[bucket])
+                  - (ax[bucket] - x[pts]) * (by[bucket] - ay[bucket]))
+    best = np.maximum.reduceat(area, starts - 1)
+    hit = np.flatnonzero(area == best[bucket])
+    hit = hit[np.concatenate(([True], bucket[hit][1:] != bucket[hit][:-1]))]  # first maximum per bucket
+    keep[pts[hit]] = True
+    return keep
+
+
+def downsample(ts, lat, lon, resolution=None, max_points=None):
+    """
+    Indices (ascending) of the fixes to return for one track sorted by ts: the last
+    fix per `resolution` seconds, then at most max_points chosen by shape (lttb_mask).
+    Fixes without a position are left out of the shape selection.
+    """
+    idx = np.arange(len(ts))
+    if resolution:
+        idx = idx[bucket_mask(ts, resolution)]
+    if max_points and len(idx) > max_points:
+        la, lo = np.asarray(lat, dtype="float64")[idx], np.asarray(lon, dtype="float64")[idx]
+        ok = np.isfinite(la) & np.isfinite(lo)  # a NaN would spread through unwrap and void its bucket
+        idx, la, lo = idx[ok], la[ok], lo[ok]
+        lon_u = np.unwrap(lo, period=360.0)  # no jumps at the antimeridian
+        idx = idx[lttb_mask(lon_u, la, max_points)]
+    return idx
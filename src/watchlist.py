@@ -0,0 +1,113 @@
+# src/watchlist.py
+"""
+Bulk watchlist import for the dashboard.
+
+Input (pasted text or an uploaded CSV/Parquet file) is parsed and validated in one
+pass, the class of every MMSI is resolved with one merge against ships, and all rows
+are upserted in a single transaction. Nothing is done per line.
+"""
+import io, json, re
+
+import pandas as pd
+
+from .classify import classify, classify_series
+
+CLASSES = ("Cargo", "Tanker", "Other")
+MMSI_RE = re.compile(r"^\d{9}$")
+CHUNK = 5000
+
+
+def parse_text(text):
+    """DataFrame(mmsi) from pasted text (one MMSI per line; commas/semicolons/spaces also split)."""
+    tokens = pd.Series(re.split(r"[\s,;]+", text or ""), dtype=object)
+    return pd.DataFrame({"mmsi": tokens[tokens != ""]})
+
+
+def read_upload(data, filename):
+    """DataFrame from an uploaded .csv/.txt or .parquet file; needs an 'mmsi' column (any case)."""
+    raw = data.read() if hasattr(data, "read") else data
+    if filename.lower().endswith(".parquet"):
+        df = pd.read_parquet(io.BytesIO(raw))
+    else:
+        first = raw.split(b"\n", 1)[0]
+        sep = next((d for d in (";", "\t") if d.encode() in first), ",")
+        df = pd.read_csv(io.BytesIO(raw), dtype=str, sep=sep)
+    df = df.rename(columns={c: c.strip().lower() for c in df.columns})
+    if "mmsi" not in df.columns:
+        if len(df.columns) == 1:  # headerless single column: the header line was an MMSI too
+            col = df.columns[0]
+            df = pd.concat([pd.DataFrame({"mmsi": [col]}), df.rename(columns={col: "mmsi"})], ignore_index=True)
+        else:
+            raise ValueError("upload needs an 'mmsi' column")
+    return df[[c for c in ("mmsi", "name", "class", "favorite") if c in df.columns]]
+
+
+def validate(df):
+    """(valid rows with int mmsi, deduplicated keeping the last; rejected raw values)."""
+    raw = df["mmsi"].astype(str).str.strip().str.replace(r"\.0$", "", regex=True)
+    ok = raw.str.match(MMSI_RE)
+    rejected = df.loc[~ok, "mmsi"].astype(str).tolist()
+    good = df[ok].copy()
+    good["mmsi"] = raw[ok].astype("int64")
+    return good.drop_duplicates("mmsi", keep="last").reset_index(drop=True), rejected
+
+
+def _row_class(v):
+    if v is None or (isinstance(v, float) and v != v) or str(v).strip() == "":
+        return None
+    t = str(v).strip().title()
+    return t if t in CLASSES else classify(v)
+
+
+def resolve(con, df, clazz="Auto", favorite=None):
+    """
+    Final (mmsi, name, class, favorite) frame. clazz other than 'Auto' is applied to all;
+    otherwise a per-row class column wins, then the class inferred from ships.ship_type.
+    favorite None leaves existing favorites alone (new rows get 0).
+    """
+    out = pd.DataFrame({"mmsi": df["mmsi"]})
+    out["name"] = df["name"].where(df["name"].notna(), None) if "name" in df.columns else None
+    if clazz != "Auto":
+        out["class"] = clazz
+    else:
+        ships = pd.read_sql_query(
+            "SELECT s.mmsi, s.ship_type FROM json_each(?) j JOIN ships s ON s.mmsi = j.value",
+            con, params=(json.dumps(out["mmsi"].tolist()),))
+        inferred = out[["mmsi"]].merge(ships.drop_duplicates("mmsi"), on="mmsi", how="left")
+        out["class"] = classify_series(inferred["ship_type"]).to_numpy()
+        if "class" in df.columns:
+            given = df["class"].map(_row_class)
+            out["class"] = given.where(given.notna(), out["class"])
+    if "favorite" in df.columns and favorite is None:
+        fav = df["favorite"].astype(str).str.strip().str.lower()
+        out["favorite"] = fav.map({"1": 1, "true": 1, "yes": 1, "0": 0, "false": 0, "no": 0})
+    else:
+        out["favorite"] = favorite
+    return out.astype(object).where(out.notna(), None)
+
+
+def import_rows(con, df, progress=None):
+    """
+    Upsert a resolve()d frame in one transaction; progress(done, total) is called per chunk.
+    Returns {"inserted", "updated"}.
+    """
+    ids = json.dumps(df["mmsi"].tolist())
+    existing = {m for (m,) in con.execute(
+        "SELECT w.mmsi FROM json_each(?) j JOIN watchlist w ON w.mmsi = j.value", (ids,))}
+    rows = [(m, n, c, f, f) for m, n, c, f in df[["mmsi", "name", "class", "favorite"]].itertuples(index=False, name=None)]
+    try:
+        for i in range(0, len(rows), CHUNK):
+            con.executemany("""
+                INSERT INTO watchlist(mmsi, name, class, favorite) VALUES (?, ?, ?, COALESCE(?, 0))
+                ON CONFLICT(mmsi) DO UPDATE SET
+                  name = COALESCE(excluded.name, name),
+                  class = COALESCE(excluded.class, class),
+                  favorite = COALESCE(?, favorite)
+            """, rows[i:i + CHUNK])
+            if progress:
+                progress(min(i + CHUNK, len(rows)), len(rows))
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+    return {"inserted": len(rows) - len(existing), "updated": len(existing)}
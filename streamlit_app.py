@@ -3,11 +3,21 @@ import time
 from pathlib import Path
 import sqlite3
 import pandas as pd
+import numpy as np
 import pydeck as pdk
 import streamlit as st
+import yaml
+
+from src import migrations, profiling, queries, spatial
+from src.backend import get_backend
+from src import watchlist as wl_import
+from src.ingest.writer_client import get_client
+from src.classify import CARGO, TANKER, classify, classify_series
+from src.tracks import build_paths, zoom_tolerance
 
 DB_PATH = Path("tanker.db")
 st.set_page_config(page_title="Oil & Cargo Ship Tracker — Live", layout="wide")
+prof = profiling.StageTimer()  # stage breakdown, shown when profiling is on
 
 # ------------------------------------------------------------
 # DB helpers & schema guards
@@ -15,17 +25,11 @@ st.set_page_config(page_title="Oil & Cargo Ship Tracker — Live", layout="wide"
 def conn():
     return sqlite3.connect(DB_PATH)
 
-def ensure_watchlist_table():
+@st.cache_resource
+def migrate_db():
+    """Schema migrations (src/migrations.py), once per dashboard process rather than per rerun."""
     with conn() as con:
-        con.execute("""
-        CREATE TABLE IF NOT EXISTS watchlist (
-            mmsi INTEGER PRIMARY KEY,
-            name TEXT,
-            class TEXT,             -- 'Cargo' | 'Tanker' | 'Other' | NULL
-            favorite INTEGER DEFAULT 0
-        )
-        """)
-        con.commit()
+        return migrations.migrate(con)
 
 def load_tables():
     with conn() as con:
@@ -33,53 +37,48 @@ def load_tables():
             ships = pd.read_sql_query("SELECT * FROM ships", con)
         except Exception:
             ships = pd.DataFrame(columns=["mmsi","imo","name","ship_type","dwt","max_draught","company","cargo"])
-        try:
-            pos = pd.read_sql_query(
-                "SELECT mmsi, ts, lat, lon, sog, cog, heading, draught, nav_status, source FROM positions", con
-            )
-        except Exception:
-            pos = pd.DataFrame(columns=["mmsi","ts","lat","lon","sog","cog","heading","draught","nav_status","source"])
         try:
             wl = pd.read_sql_query("SELECT * FROM watchlist", con)
         except Exception:
             wl = pd.DataFrame(columns=["mmsi","name","class","favorite"])
-    for df in (ships, pos, wl):
+    for df in (ships, wl):
         if not df.empty and "mmsi" in df.columns:
             df["mmsi"] = pd.to_numeric(df["mmsi"], errors="coerce").astype("Int64")
-    return ships, pos, wl
+    return ships, wl
+
+# Window-wide reads (positions in the window, latest per MMSI, alert deltas, rollups)
+# run on the engine picked by backend.engine in config.yaml (src/backend.py)
+@st.cache_resource
+def query_backend():
+    return get_backend(path=DB_PATH)
+
+# Small writes go through the single-writer service (direct to tanker.db if it isn't running)
+writer = get_client("dashboard")
 
 def upsert_watchlist_row(mmsi: int, name: str|None, clazz: str|None, favorite: int):
-    with conn() as con:
-        con.execute("INSERT OR IGNORE INTO watchlist(mmsi) VALUES(?)", (mmsi,))
-        con.execute("""
+    writer.execute([
+        ("INSERT OR IGNORE INTO watchlist(mmsi) VALUES(?)", [(mmsi,)]),
+        ("""
             UPDATE watchlist SET
               name = COALESCE(?, name),
               class = COALESCE(?, class),
               favorite = COALESCE(?, favorite)
             WHERE mmsi = ?
-        """, (name, clazz, favorite, mmsi))
-        con.commit()
+        """, [(name, clazz, favorite, mmsi)]),
+    ])
 
 def delete_watchlist_rows(mmsis):
     if not mmsis: return
-    with conn() as con:
-        con.executemany("DELETE FROM watchlist WHERE mmsi = ?", [(int(m),) for m in mmsis])
-        con.commit()
+    writer.execute([("DELETE FROM watchlist WHERE mmsi = ?", [(int(m),) for m in mmsis])])
 
-def insert_alert(ts, mmsi, kind, message):
-    with conn() as con:
-        con.execute("""
-        CREATE TABLE IF NOT EXISTS alerts(
-          id INTEGER PRIMARY KEY AUTOINCREMENT,
-          ts INTEGER, mmsi INTEGER, kind TEXT, message TEXT
-        )""")
-        con.execute("INSERT INTO alerts(ts, mmsi, kind, message) VALUES(?,?,?,?)", (ts, mmsi, kind, message))
-        con.commit()
+def insert_alerts(rows):
+    """rows: (ts, mmsi, kind, message) tuples, stored in one transaction."""
+    writer.execute([("INSERT INTO alerts(ts, mmsi, kind, message) VALUES(?,?,?,?)", rows)])
 
 # ------------------------------------------------------------
 # Sidebar controls (no scrapers started; just UI)
 # ------------------------------------------------------------
-ensure_watchlist_table()
+migrate_db()
 st.sidebar.header("Controls")
 
 if st.sidebar.button("Refresh now"):
@@ -111,6 +110,20 @@ stop_speed = st.sidebar.slider("Stop if SOG ≤", 0.0, 2.0, 0.5)
 
 search_q = st.sidebar.text_input("Search (MMSI or name)").strip()
 
+def load_regions():
+    try:
+        return (yaml.safe_load(open("config.yaml", "r", encoding="utf-8")) or {}).get("regions") or {}
+    except Exception:
+        return {}
+
+regions = load_regions()
+region = st.sidebar.selectbox("Region", ["Anywhere"] + list(regions), index=0)
+map_points = st.sidebar.radio("Map points", ["Auto", "Individual", "Aggregated"], index=0,
+                              help="Auto bins vessels into grid cells when zoomed out over a large fleet")
+profile_on = st.sidebar.checkbox("Profile reruns", value=profiling.enabled(),
+                                 help="Time each stage of the rerun (also on with TRACKER_PROFILE=1)")
+prof.mark("sidebar")
+
 # ------------------------------------------------------------
 # Load data (light cache)
 # ------------------------------------------------------------
@@ -118,28 +131,34 @@ search_q = st.sidebar.text_input("Search (MMSI or name)").strip()
 def _load_cached():
     return load_tables()
 
-ships, pos, watchlist = _load_cached()
+@st.cache_data(ttl=5)
+def _load_window(win_seconds):
+    """(positions in the window, latest fix per MMSI, last-two-fix deltas) from the query backend."""
+    backend = query_backend()
+    since = int(time.time()) - win_seconds if win_seconds is not None else None
+    return backend.window(since), backend.latest(since), backend.deltas(since)
 
-if pos.empty:
-    st.info("No positions yet. Keep your data source running, then press **Refresh now**.")
-    st.stop()
+ships, watchlist = _load_cached()
+prof.mark("load_tables")
 
-# time filter
 now_ts = int(time.time())
-pos_win = pos.copy()
-if win_seconds is not None:
-    pos_win = pos_win[pos_win["ts"] >= now_ts - win_seconds]
+pos_win, latest, deltas = _load_window(win_seconds)
+prof.mark("load_window")
 
-# latest per MMSI + merge names/types
-latest = pos_win.sort_values("ts").groupby("mmsi").tail(1).reset_index(drop=True)
+if latest.empty:
+    st.info("No positions in this window yet. Keep your data source running, then press **Refresh now**.")
+    st.stop()
+
+# merge names/types into the latest fixes
 if not ships.empty:
     latest = latest.merge(ships[["mmsi","name","ship_type"]], on="mmsi", how="left")
+prof.mark("latest_per_mmsi")
 
 # vessel class filter
 if mode != "All":
     want = "Cargo" if "Cargo" in mode else "Tanker"
     if "ship_type" in latest.columns:
-        latest = latest[(latest["ship_type"] == want) | (~latest["ship_type"].notna())]
+        latest = latest[(classify_series(latest["ship_type"]) == want) | (~latest["ship_type"].notna())]
         pos_win = pos_win[pos_win["mmsi"].isin(latest["mmsi"].unique())]
 
 # watchlist/favorites filters
@@ -163,6 +182,18 @@ if search_q:
             latest = latest[latest["name"].fillna("").str.contains(search_q, case=False)]
             pos_win = pos_win[pos_win["mmsi"].isin(latest["mmsi"].unique())]
 
+# region (spatial index on latest_positions instead of scanning every position)
+if region != "Anywhere":
+    since = now_ts - win_seconds if win_seconds is not None else None
+    with conn() as con:
+        try:
+            in_area = {r[0] for r in spatial.latest_in_bbox(con, *regions[region], since=since)}
+        except sqlite3.OperationalError:
+            in_area = set()  # index not built yet: scripts/build_spatial_index.py
+    latest = latest[latest["mmsi"].isin(in_area)]
+    pos_win = pos_win[pos_win["mmsi"].isin(in_area)]
+prof.mark("filters")
+
 if latest.empty:
     st.warning("No ships match the current filters.")
     st.stop()
@@ -183,61 +214,51 @@ try:
 except Exception:
     fav_set = set()
 
-def classify_ship_type(val):
-    if isinstance(val, str):
-        s = val.strip().lower()
-        if "tanker" in s: return "tanker"
-        if "cargo" in s:  return "cargo"
-        return "other"
-    try:
-        t = int(val)
-        if 80 <= t <= 89: return "tanker"
-        if 70 <= t <= 79: return "cargo"
-    except Exception:
-        pass
-    return "other"
-
-def _assign_color(row):
-    try:
-        m = int(row["mmsi"])
-    except Exception:
-        m = 0
-    if m in fav_set:
-        return COLOR_FAVORITE
-    stype = classify_ship_type(row.get("ship_type"))
-    if stype == "tanker": return COLOR_TANKER
-    if stype == "cargo":  return COLOR_CARGO
-    return COLOR_OTHER
+def _rgba(conds, colors, index):
+    """First matching color per row as four uint8 columns (cr, cg, cb, ca)."""
+    rgba = np.select(
+        [np.asarray(c, dtype=bool)[:, None] for c in conds],
+        [np.array([c]) for c in colors],
+        default=np.array([COLOR_OTHER]),
+    ).astype("uint8")
+    return pd.DataFrame(rgba, index=index, columns=["cr", "cg", "cb", "ca"])
+
+def _assign_color(df):
+    """RGBA per row as four int columns (pydeck reads them via an accessor expression)."""
+    fav = df["mmsi"].isin(fav_set).to_numpy(dtype=bool) if fav_set else np.zeros(len(df), dtype=bool)
+    return _rgba([fav, df["vclass"] == TANKER, df["vclass"] == CARGO],
+                 [COLOR_FAVORITE, COLOR_TANKER, COLOR_CARGO], df.index)
 
 latest_plot = latest.copy()
 for c in ["lat", "lon", "sog", "cog"]:
     if c in latest_plot.columns:
         latest_plot[c] = pd.to_numeric(latest_plot[c], errors="coerce")
-latest_plot["color"] = latest_plot.apply(_assign_color, axis=1)
-
-# ---------- Build path polylines SAFELY ----------
-pos_for_paths = (
-    pos_win[["mmsi", "ts", "lon", "lat"]]
-    .dropna()
-    .sort_values(["mmsi", "ts"])
-)
-if pos_for_paths.empty:
-    pathdf = pd.DataFrame({"mmsi": pd.Series(dtype="Int64"), "path": pd.Series(dtype="object")})
-else:
-    pathdf = (
-        pos_for_paths
-        .groupby("mmsi")[["lon", "lat"]]
-        .apply(lambda d: d.values.tolist())
-        .reset_index(name="path")
-    )
-track_df = pathdf.merge(
-    latest_plot[["mmsi", "name", "ship_type"]], on="mmsi", how="left"
-)
+latest_plot["vclass"] = (classify_series(latest_plot["ship_type"]) if "ship_type" in latest_plot.columns
+                         else pd.Series(None, index=latest_plot.index, dtype=object))
+latest_plot[["cr", "cg", "cb", "ca"]] = _assign_color(latest_plot)
+prof.mark("classify_colors")
+
+# Zoomed-out views bin vessels into grid cells server-side (see src.spatial.bin_vessels)
+AGG_MAX_ZOOM = 5          # aggregate at or below this zoom ...
+AGG_MIN_VESSELS = 2000    # ... when there are at least this many vessels
+
+def aggregate_cells(df, zoom):
+    cell_deg = zoom_tolerance(zoom, pixels=24)
+    cells = spatial.bin_vessels(df["lat"], df["lon"], df["vclass"], df["mmsi"].isin(fav_set), cell_deg)
+    dominant_other = (cells["other"] > cells["tankers"]) & (cells["other"] > cells["cargo"])
+    cells[["cr", "cg", "cb", "ca"]] = _rgba(
+        [~dominant_other & (cells["tankers"] >= cells["cargo"]), ~dominant_other],
+        [COLOR_TANKER, COLOR_CARGO], cells.index)
+    cell_m = cell_deg * 111_000
+    cells["radius"] = (cell_m * 0.5 * np.sqrt(cells["count"] / max(1, cells["count"].max()))).clip(lower=cell_m * 0.12)
+    cells["fav_line"] = np.where(cells["favorites"] > 0, 2, 0)
+    return cells
 
 # ------------------------------------------------------------
 # Tabs
 # ------------------------------------------------------------
-tab_map, tab_notif, tab_explorer, tab_watch = st.tabs(["🗺️ Map", "🔔 Notifications", "🔎 Explorer", "⭐ Watchlist"])
+tab_map, tab_notif, tab_explorer, tab_watch, tab_trends = st.tabs(
+    ["🗺️ Map", "🔔 Notifications", "🔎 Explorer", "⭐ Watchlist", "📊 Trends"])
 
 # persistent focus state (for clicking alerts -> center map)
 if "focus" not in st.session_state:
@@ -264,38 +285,77 @@ with tab_map:
 
     view = pdk.ViewState(latitude=center_lat, longitude=center_lon, zoom=zoom)
 
-    tooltip = {
-        "html": (
-            "MMSI <b>{mmsi}</b><br/>"
-            "Name <b>{name}</b><br/>"
-            "Type <b>{ship_type}</b><br/>"
-            "SOG <b>{sog}</b> kn<br/>"
-            "COG <b>{cog}</b>°<br/>"
-            "Source <b>{source}</b><br/>"
-            "TS <b>{ts}</b>"
-        ),
-        "style": {"color": "white"},
-    }
-
-    layer_lines = pdk.Layer(
-        "PathLayer",
-        data=track_df,
-        get_path="path",
-        width_scale=1,
-        width_min_pixels=2,
-        get_width=3,
-        pickable=True,
-    )
-    layer_points = pdk.Layer(
-        "ScatterplotLayer",
-        data=latest_plot,
-        get_position="[lon, lat]",
-        get_radius=25000,
-        pickable=True,
-        get_fill_color="color",
-    )
+    aggregated = (map_points == "Aggregated" or
+                  (map_points == "Auto" and not focus and zoom <= AGG_MAX_ZOOM and len(latest_plot) >= AGG_MIN_VESSELS))
+
+    if aggregated:
+        cells = aggregate_cells(latest_plot, zoom)
+        st.caption(f"{len(latest_plot):,} vessels in {len(cells):,} cells — focus an alert or pick "
+                   "“Individual” in the sidebar for single vessels and tracks.")
+        tooltip = {
+            "html": (
+                "Vessels <b>{count}</b><br/>"
+                "Tanker <b>{tankers}</b> · Cargo <b>{cargo}</b> · Other <b>{other}</b><br/>"
+                "Favorites <b>{favorites}</b>"
+            ),
+            "style": {"color": "white"},
+        }
+        layers = [pdk.Layer(
+            "ScatterplotLayer",
+            data=cells,
+            get_position="[lon, lat]",
+            get_radius="radius",
+            pickable=True,
+            get_fill_color="[cr, cg, cb, ca]",
+            stroked=True,
+            get_line_color=COLOR_FAVORITE,
+            get_line_width="fav_line",
+            line_width_units="pixels",
+        )]
+    else:
+        # ---------- Path polylines, simplified to what this zoom can show ----------
+        pos_for_paths = (
+            pos_win[["mmsi", "ts", "lon", "lat"]]
+            .dropna()
+            .sort_values(["mmsi", "ts"])
+        )
+        pathdf = build_paths(pos_for_paths, zoom_tolerance(zoom))
+        track_df = pathdf.merge(
+            latest_plot[["mmsi", "name", "ship_type"]], on="mmsi", how="left"
+        )
+
+        tooltip = {
+            "html": (
+                "MMSI <b>{mmsi}</b><br/>"
+                "Name <b>{name}</b><br/>"
+                "Type <b>{ship_type}</b><br/>"
+                "SOG <b>{sog}</b> kn<br/>"
+                "COG <b>{cog}</b>°<br/>"
+                "Source <b>{source}</b><br/>"
+                "TS <b>{ts}</b>"
+            ),
+            "style": {"color": "white"},
+        }
+
+        layer_lines = pdk.Layer(
+            "PathLayer",
+            data=track_df,
+            get_path="path",
+            width_scale=1,
+            width_min_pixels=2,
+            get_width=3,
+            pickable=True,
+        )
+        layer_points = pdk.Layer(
+            "ScatterplotLayer",
+            data=latest_plot.drop(columns=["vclass"]),
+            get_position="[lon, lat]",
+            get_radius=25000,
+            pickable=True,
+            get_fill_color="[cr, cg, cb, ca]",
+        )
 
-    layers = [layer_lines, layer_points]
+        layers = [layer_lines, layer_points]
 
     # If focusing a specific alert, render a highlight ring on top
     if focus:
@@ -312,6 +372,8 @@ with tab_map:
             )
         )
 
+    prof.mark("map_layers")
+
     left, right = st.columns([4,1])
     with left:
         st.pydeck_chart(
@@ -323,6 +385,7 @@ with tab_map:
             ),
             use_container_width=True,
         )
+    prof.mark("pydeck_render")
     with right:
         st.markdown("**Legend**")
         st.markdown(
@@ -341,40 +404,23 @@ with tab_map:
 with tab_notif:
     st.header("🔔 Notification Center")
 
-    # Build alerts for **current time window**
-    alerts = []
-    for mmsi, grp in pos_win.sort_values("ts").groupby("mmsi"):
-        if len(grp) < 2: 
-            continue
-        last = grp.iloc[-1]; prev = grp.iloc[-2]
-        try:
-            sog_now = float(last["sog"]) if pd.notna(last["sog"]) else None
-            sog_prev = float(prev["sog"]) if pd.notna(prev["sog"]) else None
-            cog_now = float(last["cog"]) if pd.notna(last["cog"]) else None
-            cog_prev = float(prev["cog"]) if pd.notna(prev["cog"]) else None
-        except Exception:
-            continue
-
-        # Course change
-        if cog_now is not None and cog_prev is not None:
-            dcog = abs((cog_now - cog_prev + 180) % 360 - 180)
-            if dcog >= course_thresh:
-                alerts.append({"ts": int(last["ts"]), "mmsi": int(mmsi), "kind": "Course change",
-                               "value": round(dcog,1), "lat": last["lat"], "lon": last["lon"]})
-
-        # Speed drop
-        if sog_now is not None and sog_prev is not None:
-            if (sog_prev - sog_now) >= float(speed_drop):
-                alerts.append({"ts": int(last["ts"]), "mmsi": int(mmsi), "kind": "Speed drop",
-                               "value": round(sog_prev - sog_now,1), "lat": last["lat"], "lon": last["lon"]})
-
-        # Stop
-        if sog_now is not None and sog_now <= float(stop_speed):
-            alerts.append({"ts": int(last["ts"]), "mmsi": int(mmsi), "kind": "Stop",
-                           "value": round(sog_now,1), "lat": last["lat"], "lon": last["lon"]})
+    # Build alerts for **current time window**: last vs previous fix of every shown vessel
+    d = deltas[deltas["mmsi"].isin(latest["mmsi"])]
+    sog, sog_prev = pd.to_numeric(d["sog"], errors="coerce"), pd.to_numeric(d["prev_sog"], errors="coerce")
+    cog, cog_prev = pd.to_numeric(d["cog"], errors="coerce"), pd.to_numeric(d["prev_cog"], errors="coerce")
+    dcog = ((cog - cog_prev + 180) % 360 - 180).abs()
+    parts = [
+        (dcog >= course_thresh, "Course change", dcog),        # NaN compares False
+        ((sog_prev - sog) >= float(speed_drop), "Speed drop", sog_prev - sog),
+        (sog <= float(stop_speed), "Stop", sog),
+    ]
+    alerts = [pd.DataFrame({"ts": d["ts"][hit].astype("int64"), "mmsi": d["mmsi"][hit].astype("int64"), "kind": kind,
+                            "value": value[hit].round(1), "lat": d["lat"][hit], "lon": d["lon"][hit]})
+              for hit, kind, value in parts if hit.any()]
+    prof.mark("alert_loop")
 
     if alerts:
-        adf = pd.DataFrame(alerts).sort_values("ts", ascending=False).reset_index(drop=True)
+        adf = pd.concat(alerts).sort_values("ts", ascending=False).reset_index(drop=True)
         st.dataframe(adf, use_container_width=True, height=360)
         # Selector to focus the map on an alert
         choices = [f"{i}: {row.kind} • MMSI {row.mmsi} • Δ={row.value} @ {row.lat:.3f},{row.lon:.3f}" 
@@ -386,24 +432,66 @@ with tab_notif:
             st.session_state["focus"] = {"lat": float(row["lat"]), "lon": float(row["lon"]), "mmsi": int(row["mmsi"])}
             st.success("Centered map on selected alert. Switch to the **Map** tab.")
             # persist (optional)
-            for a in adf.head(50).itertuples():
-                insert_alert(int(a.ts), int(a.mmsi), str(a.kind), f"{a.kind} value={a.value} at {a.lat},{a.lon}")
+            insert_alerts([(int(a.ts), int(a.mmsi), str(a.kind), f"{a.kind} value={a.value} at {a.lat},{a.lon}")
+                           for a in adf.head(50).itertuples()])
     else:
         st.info("No alerts in the selected window with current thresholds.")
+    prof.mark("notifications")
 
 # ---------------- EXPLORER TAB ----------------
+# Paged straight from SQLite (src.queries): only the visible page and the picked track are loaded
 with tab_explorer:
     st.header("🔎 Ship Explorer")
-    show_cols = [c for c in ["mmsi","name","ts","lat","lon","sog","cog","ship_type","source"] if c in latest_plot.columns]
-    st.dataframe(latest_plot.sort_values("ts", ascending=False)[show_cols].head(500),
-                 use_container_width=True, height=420)
+    xfilters = dict(
+        since=now_ts - win_seconds if win_seconds is not None else None,
+        vclass=None if mode == "All" else ("Cargo" if "Cargo" in mode else "Tanker"),
+        mmsi=int(search_q) if search_q.isdigit() else None,
+        name_like=search_q if search_q and not search_q.isdigit() else None,
+        watchlist_only=track_watchlist_only and not watchlist.empty,
+        favorites_only=favorites_only and not watchlist.empty,
+        bbox=regions[region] if region != "Anywhere" else None,
+    )
+    page_size = st.selectbox("Rows per page", [50, 100, 250, 500], index=1, key="xp_size")
+    sig = (win_label, mode, search_q, track_watchlist_only, favorites_only, region, page_size)
+    if st.session_state.get("xp_sig") != sig:  # filters changed: back to the first page
+        st.session_state["xp_sig"] = sig
+        st.session_state["xp_pages"] = [None]
+    pages = st.session_state["xp_pages"]   # keyset cursor (last MMSI) of every page so far
 
-    mmsis = latest_plot.sort_values("ts", ascending=False)["mmsi"].astype("Int64").astype(str).unique().tolist()
+    with conn() as con:
+        total = queries.vessel_count(con, **xfilters)
+        page = pd.DataFrame(queries.vessel_page(con, after=pages[-1], limit=page_size, **xfilters),
+                            columns=queries.VESSEL_COLS)
+    if total == 0:
+        st.info("No vessels match. Databases that predate the spatial index need "
+                "`python scripts/build_spatial_index.py` once.")
+    st.caption(f"{total:,} vessels · page {len(pages)} of {max(1, -(-total // page_size))}")
+    st.dataframe(page, use_container_width=True, height=420)
+    c1, c2, _ = st.columns([1, 1, 6])
+    if c1.button("◀ Previous", disabled=len(pages) == 1, key="xp_prev"):
+        pages.pop(); st.rerun()
+    if c2.button("Next ▶", disabled=len(page) < page_size, key="xp_next"):
+        pages.append(int(page["mmsi"].iloc[-1])); st.rerun()
+
+    mmsis = page["mmsi"].astype(str).tolist()
     pick = st.selectbox("Select MMSI for recent track", mmsis, index=0 if mmsis else None)
     if pick:
         m = int(pick)
-        recent = pos_win[pos_win["mmsi"] == m].sort_values("ts", ascending=False).head(500).reset_index(drop=True)
+        trk = st.session_state.get("xp_track")
+        if not trk or trk["mmsi"] != m or trk["sig"] != sig:
+            trk = st.session_state["xp_track"] = {"mmsi": m, "sig": sig, "pages": [None]}
+        with conn() as con:
+            recent = pd.DataFrame(queries.track_page(con, m, before=trk["pages"][-1], limit=500,
+                                                     since=xfilters["since"]),
+                                  columns=queries.TRACK_COLS)
         st.dataframe(recent, use_container_width=True)
+        t1, t2, _ = st.columns([1, 1, 6])
+        if t1.button("◀ Newer", disabled=len(trk["pages"]) == 1, key="xp_newer"):
+            trk["pages"].pop(); st.rerun()
+        if t2.button("Older ▶", disabled=len(recent) < 500, key="xp_older"):
+            last = recent.iloc[-1]
+            trk["pages"].append((int(last["ts"]), last["source"])); st.rerun()
+    prof.mark("explorer")
 
 # ---------------- WATCHLIST TAB ----------------
 with tab_watch:
@@ -428,7 +516,7 @@ with tab_watch:
                 if clazz_in == "Auto":
                     row = ships[ships["mmsi"] == m]
                     if not row.empty:
-                        inferred = row["ship_type"].iloc[0]
+                        inferred = classify(row["ship_type"].iloc[0])
                 final_class = inferred if inferred else (None if clazz_in == "Auto" else clazz_in)
                 upsert_watchlist_row(m, name_in.strip() or None, final_class, 1 if fav_in else 0)
                 st.success(f"Saved MMSI {m} to watchlist.")
@@ -436,27 +524,33 @@ with tab_watch:
             except Exception as e:
                 st.error(f"Failed to save: {e}")
 
-    with st.expander("Bulk import MMSIs (one per line)"):
-        bulk = st.text_area("Paste MMSIs here", height=120, key="wl_bulk_text")
+    with st.expander("Bulk import MMSIs (paste or upload)"):
+        bulk = st.text_area("Paste MMSIs here (one per line)", height=120, key="wl_bulk_text")
+        upload = st.file_uploader("…or upload CSV/Parquet (column 'mmsi'; optional 'name', 'class', 'favorite')",
+                                  type=["csv", "txt", "parquet"], key="wl_bulk_file")
         clazz_bulk = st.selectbox("Assign class to all", ["Auto", "Cargo", "Tanker", "Other"], index=0, key="wl_bulk_class")
         fav_bulk = st.checkbox("Mark all as favorite", value=False, key="wl_bulk_fav")
         if st.button("Import list"):
-            count = 0
-            for line in bulk.splitlines():
-                t = line.strip()
-                if not t or not t.isdigit(): 
-                    continue
-                m = int(t)
-                inferred = None
-                if clazz_bulk == "Auto":
-                    row = ships[ships["mmsi"] == m]
-                    if not row.empty:
-                        inferred = row["ship_type"].iloc[0]
-                final_class = inferred if inferred else (None if clazz_bulk == "Auto" else clazz_bulk)
-                upsert_watchlist_row(m, None, final_class, 1 if fav_bulk else 0)
-                count += 1
-            st.success(f"Imported {count} MMSIs.")
-            st.cache_data.clear(); st.rerun()
+            try:
+                frames = [wl_import.parse_text(bulk)]
+                if upload is not None:
+                    frames.append(wl_import.read_upload(upload, upload.name))
+                valid, rejected = wl_import.validate(pd.concat(frames, ignore_index=True))
+                bar = st.progress(0.0, text=f"Importing {len(valid):,} MMSIs …")
+                with conn() as con:
+                    final = wl_import.resolve(con, valid, clazz_bulk, 1 if fav_bulk else None)
+                    counts = wl_import.import_rows(
+                        con, final, progress=lambda done, total: bar.progress(done / total, text=f"{done:,}/{total:,}"))
+                st.session_state["wl_import_result"] = dict(counts, rejected=len(rejected), sample=rejected[:10])
+                st.cache_data.clear(); st.rerun()
+            except Exception as e:
+                st.error(f"Import failed: {e}")
+        res = st.session_state.pop("wl_import_result", None)
+        if res:
+            st.success(f"Imported: {res['inserted']:,} new, {res['updated']:,} updated, {res['rejected']:,} rejected.")
+            if res["sample"]:
+                st.warning("Rejected (not a 9-digit MMSI): " + ", ".join(res["sample"]) +
+                           (" …" if res["rejected"] > len(res["sample"]) else ""))
 
     with st.expander("Delete from watchlist"):
         if watchlist.empty:
@@ -471,6 +565,37 @@ with tab_watch:
                 except Exception as e:
                     st.error(f"Delete failed: {e}")
 
+prof.mark("watchlist")
+
+# ---------------- TRENDS TAB ----------------
+@st.cache_data(ttl=60)
+def load_trends(res, start, bbox):
+    return query_backend().rollups(res, start, None, bbox=bbox)
+
+with tab_trends:
+    st.header("📊 Trends")
+    st.caption("From the hourly/daily rollups kept at ingest (src/rollups.py); "
+               "the region from the sidebar is snapped to whole grid cells.")
+    tc1, tc2 = st.columns(2)
+    t_res = tc1.radio("Resolution", ["Hourly", "Daily"], horizontal=True)
+    t_days = tc2.selectbox("Last", [2, 7, 30, 90, 365], index=1, format_func=lambda d: f"{d} days")
+    trends = load_trends("h" if t_res == "Hourly" else "d", now_ts - t_days * 86400,
+                         tuple(regions[region]) if region != "Anywhere" else None)
+    if trends.empty:
+        st.info("No rollups for this window yet. Older databases: run scripts/build_rollups.py --rebuild.")
+    else:
+        trends["time"] = pd.to_datetime(trends["bucket"], unit="s", utc=True)
+        st.subheader("Distinct vessels by class")
+        st.line_chart(trends.pivot_table(index="time", columns="class", values="vessels"))
+        st.subheader("Mean SOG (kn) by class")
+        st.line_chart(trends.pivot_table(index="time", columns="class", values="mean_sog"))
+        with st.expander("Table"):
+            st.dataframe(trends[["time", "class", "vessels", "fixes", "mean_sog"]], use_container_width=True)
+prof.mark("trends")
+
+if profile_on:
+    prof.render(st.sidebar.expander("⏱️ Rerun profile", expanded=True))
+
 # Auto-refresh (optional)
 if auto_refresh:
     st.caption(f"Auto-refreshing every {int(refresh_sec)}s …")
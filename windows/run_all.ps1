@@ -12,6 +12,8 @@ function Launch($title, $cmd) {
 # 1) API (FastAPI) — adjust module/port if yours is different
 Launch "API :$ApiPort" "uvicorn api.main:app --reload --host 0.0.0.0 --port $ApiPort"
 
+# 2) Writer service — the only process that writes tanker.db; start it before the producers
+Launch "Writer" "python scripts/run_writer_service.py"
 
 # 4) Locator loop (poll your local API for positions of watchlist MMSIs)
 Launch "Locator (loop)" "python scripts/locate_from_watchlist.py --base http://localhost:$ApiPort --loop --interval 180"
@@ -21,5 +23,11 @@ if (-not $NoAIS) {
   Launch "AISStream" "python scripts/ingest_stream_aisstream.py"
 }
 
+# 5b) Ship-to-ship proximity scanner
+Launch "Proximity" "python scripts/run_proximity.py --loop"
+
+# 5c) AIS gap ("going dark") detection
+Launch "Gaps" "python scripts/run_gaps.py --loop"
+
 # 6) Dashboard
 Launch "Dashboard" "python -m streamlit run streamlit_app.py"